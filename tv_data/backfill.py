@@ -0,0 +1,347 @@
+import csv
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import frappe
+from frappe import _
+from frappe.utils import get_datetime, now_datetime
+
+from tv_data.bar_cache import hot_bars
+from tv_data.indicators import reset_indicators
+from tv_data.metrics import metrics
+from tv_data.series import DATE_STRING_FORMAT, timestamp_to_date_string
+from tv_data.tv_data.doctype.datafield.datafield import bump_change_counter
+
+STATUS_KEY = "tv_data:backfill:{}"
+STATUS_TTL = 24 * 3600
+CHUNK_SIZE = 5000
+MAX_ERRORS = 20
+PROGRESS_INTERVAL = 1.0
+SERIES_FIELDS = (
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "docstatus",
+    "idx",
+    "parent",
+    "parenttype",
+    "parentfield",
+    "date_string",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+)
+COLUMN_ALIASES = {
+    "t": "time",
+    "timestamp": "time",
+    "date": "date_string",
+    "o": "open",
+    "h": "high",
+    "l": "low",
+    "c": "close",
+    "v": "volume",
+}
+
+Bar = Tuple[str, float, float, float, float, float]
+
+
+def iter_lines(path: str, progress: Dict) -> Iterator[str]:
+    # Binary reads keep an exact byte count for progress while decoding line by line
+    with open(path, "rb") as f:
+        for line in f:
+            progress["bytes"] += len(line)
+            yield line.decode("utf-8-sig")
+
+
+def iter_records(path: str, fmt: str, progress: Dict) -> Iterator[Union[Dict, str]]:
+    lines = iter_lines(path, progress)
+    if fmt == "csv":
+        yield from csv.DictReader(lines)
+    else:
+        # Decoded in parse_bar, so a malformed line counts as an invalid row
+        yield from (line for line in lines if line.strip())
+
+
+def parse_bar(record: Union[Dict, str]) -> Bar:
+    """Validate one input record and return it as a Datafield Series bar.
+
+    Records carry `date_string` (or an ISO `date`) or `time` in epoch seconds
+    or milliseconds, plus open/high/low/close and an optional volume; the
+    short `t/o/h/l/c/v` names are accepted too.
+    """
+    if isinstance(record, str):
+        record = json.loads(record)
+    record = {
+        COLUMN_ALIASES.get(k.strip().lower(), k.strip().lower()): v
+        for k, v in record.items()
+        if k
+    }
+
+    if record.get("time") not in (None, ""):
+        timestamp = float(record["time"])
+        # Anything past the year 5000 in seconds is a millisecond timestamp
+        date_string = timestamp_to_date_string(
+            timestamp / 1000 if timestamp > 1e11 else timestamp
+        )
+    elif record.get("date_string"):
+        value = str(record["date_string"])
+        try:
+            time.strptime(value, DATE_STRING_FORMAT)
+            date_string = value
+        except ValueError:
+            date_string = get_datetime(value).strftime(DATE_STRING_FORMAT)
+    else:
+        raise ValueError("missing time or date_string")
+
+    try:
+        _open, _high, _low, _close = (
+            float(record[column]) for column in ("open", "high", "low", "close")
+        )
+    except KeyError as e:
+        raise ValueError(f"missing {e.args[0]}")
+    volume = float(record.get("volume") or 0)
+
+    if _high < max(_open, _close, _low) or _low > min(_open, _close):
+        raise ValueError("high/low do not enclose open and close")
+    if volume < 0:
+        raise ValueError("negative volume")
+    return date_string, _open, _high, _low, _close, volume
+
+
+class Backfill:
+    """Streams bars from a CSV or NDJSON file into `Datafield Series`.
+
+    Rows are validated one at a time and inserted with one multi-row insert
+    per chunk, so memory stays flat regardless of file size. Bars whose
+    date_string already exists on the Datafield, or appeared earlier in the
+    file, are skipped; each chunk is checked with one indexed lookup of its
+    own date_strings, so no set of the whole history is held.
+    """
+
+    def __init__(
+        self,
+        datafield: str,
+        path: str,
+        fmt: Optional[str] = None,
+        job_id: Optional[str] = None,
+        user: Optional[str] = None,
+    ):
+        self.datafield = datafield
+        self.path = path
+        self.fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        self.job_id = job_id
+        self.user = user or frappe.session.user
+        self.size = os.path.getsize(path)
+        self.progress = {
+            "bytes": 0,
+            "rows": 0,
+            "inserted": 0,
+            "duplicates": 0,
+            "invalid": 0,
+            "errors": [],
+        }
+        self._last_publish = 0.0
+
+    def get_last_idx(self) -> int:
+        rows = frappe.db.sql(
+            """
+            select max(idx)
+            from `tabDatafield Series`
+            where parent = %s and parentfield = 'datafield_series_table'
+            """,
+            self.datafield,
+        )
+        return rows[0][0] or 0
+
+    def renumber(self) -> None:
+        """Number the series rows in date order, so the last row is the latest bar.
+
+        Backfilled bars are older than the series but are appended after it.
+        """
+        frappe.db.sql(
+            """
+            update `tabDatafield Series` series
+            join (
+                select name, row_number() over (order by date_string, idx) as position
+                from `tabDatafield Series`
+                where parent = %s and parentfield = 'datafield_series_table'
+            ) ordered on ordered.name = series.name
+            set series.idx = ordered.position
+            """,
+            self.datafield,
+        )
+        frappe.db.commit()
+
+    def get_existing(self, date_strings: Iterable[str]) -> Set[str]:
+        """The given date_strings the Datafield already has bars for."""
+        rows = frappe.db.sql(
+            """
+            select distinct date_string
+            from `tabDatafield Series`
+            where parent = %(parent)s and parentfield = 'datafield_series_table'
+                and date_string in %(date_strings)s
+            """,
+            {"parent": self.datafield, "date_strings": tuple(date_strings)},
+        )
+        return {row[0] for row in rows}
+
+    def insert_chunk(self, chunk: List[Bar], idx: int) -> int:
+        # Earlier chunks are committed, so this also catches repeats across the file
+        existing = self.get_existing({bar[0] for bar in chunk})
+        if existing:
+            self.progress["duplicates"] += sum(bar[0] in existing for bar in chunk)
+            chunk = [bar for bar in chunk if bar[0] not in existing]
+        if not chunk:
+            return idx
+
+        now = now_datetime()
+        values = []
+        for bar in chunk:
+            idx += 1
+            values.append(
+                (
+                    frappe.generate_hash(length=10),
+                    now,
+                    now,
+                    self.user,
+                    self.user,
+                    0,
+                    idx,
+                )
+                + (self.datafield, "Datafield", "datafield_series_table")
+                + bar
+            )
+        frappe.db.bulk_insert("Datafield Series", SERIES_FIELDS, values)
+        frappe.db.commit()
+        self.progress["inserted"] += len(chunk)
+        metrics.inc("backfill_bars", len(chunk))
+        self.publish()
+        return idx
+
+    def publish(self, status: str = "Running", force: bool = False) -> None:
+        if not force and time.monotonic() - self._last_publish < PROGRESS_INTERVAL:
+            return
+        self._last_publish = time.monotonic()
+        progress = dict(
+            self.progress,
+            status=status,
+            datafield=self.datafield,
+            percent=(
+                round(100 * self.progress["bytes"] / self.size, 1) if self.size else 100
+            ),
+        )
+        if self.job_id:
+            frappe.cache.set(
+                frappe.cache.make_key(STATUS_KEY.format(self.job_id)),
+                json.dumps(progress),
+                ex=STATUS_TTL,
+            )
+        frappe.publish_realtime(
+            "tv_data_backfill_progress",
+            dict(progress, job_id=self.job_id),
+            user=self.user,
+        )
+
+    def record_error(self, line: int, error: Exception) -> None:
+        self.progress["invalid"] += 1
+        if len(self.progress["errors"]) < MAX_ERRORS:
+            self.progress["errors"].append(f"Row {line}: {error}")
+
+    def run(self) -> Dict:
+        idx = self.get_last_idx()
+        chunk: List[Bar] = []
+        # date_strings of the chunk being collected
+        seen: Set[str] = set()
+
+        try:
+            with metrics.timer("backfill"):
+                for record in iter_records(self.path, self.fmt, self.progress):
+                    self.progress["rows"] += 1
+                    try:
+                        bar = parse_bar(record)
+                    except (ValueError, TypeError, AttributeError) as e:
+                        self.record_error(self.progress["rows"], e)
+                        continue
+                    if bar[0] in seen:
+                        self.progress["duplicates"] += 1
+                        continue
+                    seen.add(bar[0])
+                    chunk.append(bar)
+                    if len(chunk) >= CHUNK_SIZE:
+                        idx = self.insert_chunk(chunk, idx)
+                        chunk = []
+                        seen.clear()
+                if chunk:
+                    self.insert_chunk(chunk, idx)
+        except Exception as e:
+            frappe.db.rollback()
+            self.publish("Failed", force=True)
+            frappe.log_error(
+                f"Error in backfill of {self.datafield}: {str(e)}",
+                "Datafield Backfill Error",
+            )
+            raise
+        finally:
+            if self.progress["inserted"]:
+                self.renumber()
+                hot_bars.invalidate(self.datafield)
+                reset_indicators(self.datafield)
+                bump_change_counter()
+
+        self.publish("Completed", force=True)
+        return self.progress
+
+
+def backfill(
+    datafield: str,
+    path: str,
+    fmt: Optional[str] = None,
+    backfill_id: Optional[str] = None,
+    user: Optional[str] = None,
+) -> Dict:
+    # Not `job_id`: frappe.enqueue takes that one as the id of the RQ job
+    return Backfill(datafield, path, fmt, backfill_id, user).run()
+
+
+@frappe.whitelist()
+def enqueue_backfill(datafield: str, file_url: str, fmt: Optional[str] = None) -> str:
+    """Start a backfill of an uploaded File into a Datafield as a long-queue job."""
+    frappe.get_doc("Datafield", datafield).check_permission("write")
+    file_doc = frappe.get_doc("File", {"file_url": file_url})
+    file_doc.check_permission("read")
+    if fmt and fmt not in ("csv", "ndjson"):
+        frappe.throw(_("Backfill format must be csv or ndjson"))
+
+    job_id = frappe.generate_hash(length=12)
+    frappe.cache.set(
+        frappe.cache.make_key(STATUS_KEY.format(job_id)),
+        json.dumps({"status": "Queued", "datafield": datafield}),
+        ex=STATUS_TTL,
+    )
+    frappe.enqueue(
+        "tv_data.backfill.backfill",
+        queue="long",
+        timeout=3600 * 4,
+        datafield=datafield,
+        path=file_doc.get_full_path(),
+        fmt=fmt,
+        backfill_id=job_id,
+        user=frappe.session.user,
+    )
+    return job_id
+
+
+@frappe.whitelist()
+def get_backfill_status(job_id: str) -> Dict:
+    status = frappe.cache.get(frappe.cache.make_key(STATUS_KEY.format(job_id)))
+    if not status:
+        frappe.throw(_("Unknown backfill job {0}").format(job_id))
+    status = json.loads(status)
+    frappe.get_doc("Datafield", status["datafield"]).check_permission("read")
+    return status
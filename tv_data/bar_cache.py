@@ -0,0 +1,174 @@
+import math
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import frappe
+from frappe.utils import cint
+
+from tv_data.metrics import metrics
+from tv_data.series import BAR_COLUMNS, get_bars
+
+BARS_KEY = "tv_data:bars:{}:{}"
+VERSION_KEY = "tv_data:bars:version:{}"
+BARS_TTL = 24 * 60 * 60
+DEFAULT_BAR_COUNT = 500
+DEFAULT_LOCAL_CACHE_MB = 16
+HEADER = struct.Struct("<I?")
+TYPECODES = {"t": "q"}
+
+
+def pack_bars(bars: Dict[str, List], complete: bool) -> bytes:
+    """Pack columns into `header + t (int64) + o/h/l/c/v (float64)`.
+
+    `complete` records whether the bars are the whole series rather than just
+    its tail, which decides if range queries before the first bar can be served.
+    NULL prices and volumes are packed as NaN and unpacked as None again.
+    """
+    count = len(bars["t"])
+    parts = [HEADER.pack(count, complete)]
+    for column in BAR_COLUMNS:
+        typecode = TYPECODES.get(column, "d")
+        missing = 0 if typecode == "q" else math.nan
+        parts.append(
+            array(
+                typecode,
+                (missing if value is None else value for value in bars[column]),
+            ).tobytes()
+        )
+    return b"".join(parts)
+
+
+def unpack_bars(packed: bytes) -> Tuple[Dict[str, List], bool]:
+    count, complete = HEADER.unpack_from(packed)
+    offset = HEADER.size
+    bars = {}
+    for column in BAR_COLUMNS:
+        data = array(TYPECODES.get(column, "d"))
+        size = count * data.itemsize
+        data.frombytes(packed[offset : offset + size])
+        values = data.tolist()
+        if data.typecode == "d" and any(map(math.isnan, values)):
+            values = [None if math.isnan(value) else value for value in values]
+        bars[column] = values
+        offset += size
+    return bars, complete
+
+
+class HotBarCache:
+    """Most recent bars per Datafield, in `frappe.cache` and a per-process LRU.
+
+    Every Datafield has a version counter in Redis and the packed bars are
+    stored under their version. The local LRU keeps the packed bars together
+    with the version they were read at, so a local hit costs one small Redis
+    GET and never a database query; writers bump the version to invalidate
+    every process at once, and superseded blobs simply expire.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_LOCAL_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._local: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+        self._local_bytes = 0
+
+    @property
+    def bar_count(self) -> int:
+        settings = frappe.get_cached_doc("TV Data Settings")
+        return cint(settings.defaults.hot_bar_count) or DEFAULT_BAR_COUNT
+
+    def get_version(self, datafield: str) -> int:
+        key = frappe.cache.make_key(VERSION_KEY.format(datafield))
+        version = frappe.cache.get(key)
+        if version is None:
+            # Seed with the current time so a flushed Redis never revives a stale local entry
+            frappe.cache.set(key, int(time.time() * 1000), nx=True)
+            version = frappe.cache.get(key)
+        return cint(version)
+
+    def _get_local(self, datafield: str, version: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._local.get(datafield)
+            if not entry:
+                return None
+            if entry[0] != version:
+                self._evict(datafield)
+                return None
+            self._local.move_to_end(datafield)
+            return entry[1]
+
+    def _set_local(self, datafield: str, version: int, packed: bytes) -> None:
+        with self._lock:
+            self._evict(datafield)
+            self._local[datafield] = (version, packed)
+            self._local_bytes += len(packed)
+            while self._local_bytes > self.max_bytes and self._local:
+                self._evict(next(iter(self._local)))
+
+    def _evict(self, datafield: str) -> None:
+        entry = self._local.pop(datafield, None)
+        if entry:
+            self._local_bytes -= len(entry[1])
+
+    def load(self, datafield: str) -> Tuple[Dict[str, List], bool]:
+        version = self.get_version(datafield)
+
+        packed = self._get_local(datafield, version)
+        if packed is not None:
+            metrics.inc("bar_cache_local_hits")
+            return unpack_bars(packed)
+
+        key = frappe.cache.make_key(BARS_KEY.format(datafield, version))
+        packed = frappe.cache.get(key)
+        if packed is not None:
+            metrics.inc("bar_cache_redis_hits")
+        else:
+            metrics.inc("bar_cache_misses")
+            bar_count = self.bar_count
+            # Read one extra bar to learn whether the tail is the whole series
+            bars = get_bars(datafield, countback=bar_count + 1)
+            complete = len(bars["t"]) <= bar_count
+            bars = {column: data[-bar_count:] for column, data in bars.items()}
+            packed = pack_bars(bars, complete)
+            frappe.cache.set(key, packed, ex=BARS_TTL)
+
+        self._set_local(datafield, version, packed)
+        return unpack_bars(packed)
+
+    def get_bars(
+        self,
+        datafield: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        countback: Optional[int] = None,
+    ) -> Dict[str, List]:
+        """Same contract as `tv_data.series.get_bars`, served from the cache when it covers the request."""
+        bars, complete = self.load(datafield)
+        t = bars["t"]
+
+        if start is not None and not complete and (not t or start < t[0]):
+            return get_bars(datafield, start=start, end=end, countback=countback)
+        if start is None and not countback and not complete:
+            # The whole series was asked for and the cache only has its tail
+            return get_bars(datafield, end=end)
+
+        lo = 0 if start is None else bisect_left(t, start)
+        hi = len(t) if end is None else bisect_left(t, end + 1)
+        if countback:
+            lo = max(lo, hi - countback)
+            if start is None and lo == 0 and hi < countback and not complete:
+                return get_bars(datafield, end=end, countback=countback)
+
+        return {column: data[lo:hi] for column, data in bars.items()}
+
+    def invalidate(self, datafield: str) -> None:
+        self.get_version(datafield)
+        frappe.cache.incr(frappe.cache.make_key(VERSION_KEY.format(datafield)))
+        with self._lock:
+            self._evict(datafield)
+
+
+hot_bars = HotBarCache()
@@ -0,0 +1,246 @@
+"""Synthetic-load benchmarks for ingestion, merge and export.
+
+Run against a local test site, never production: the workload creates and
+deletes its own Datafields, but `extend_all_series` and `generate_files`
+process every Datafield on the site.
+
+    bench --site test_site execute tv_data.benchmark.run \
+        --kwargs "{'datafields': 100, 'updates': 50, 'bars': 365}"
+
+Pass `baseline` (a previous result file) to fail the run when an operation's
+p95 latency or throughput regresses by more than `threshold`.
+"""
+
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import click
+import frappe
+from frappe import _
+
+from tv_data.github import GithubManager
+from tv_data.purge import Purge, create_purge
+from tv_data.tv_data.doctype.datafield.datafield import (
+    append_update,
+    extend_all_series,
+    get_doc_from_user_key,
+)
+
+KEY_PREFIX = "BENCH_"
+DEFAULT_THRESHOLD = 0.2
+
+
+class BenchmarkRegression(frappe.ValidationError):
+    pass
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index]
+
+
+def summarize(samples: List[float], items: Optional[int] = None) -> Dict[str, float]:
+    """Latency percentiles of `samples` and throughput in items per second.
+
+    `items` defaults to one per sample; pass it for operations that process
+    many items per call, like `extend_all_series`.
+    """
+    total = sum(samples)
+    items = len(samples) if items is None else items
+    return {
+        "count": len(samples),
+        "total": total,
+        "throughput": items / total if total else 0.0,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples),
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Return a message for every operation that regressed beyond `threshold`."""
+    regressions = []
+    for operation, current in results["operations"].items():
+        previous = baseline.get("operations", {}).get(operation)
+        if not previous:
+            continue
+        if current["p95"] > previous["p95"] * (1 + threshold):
+            regressions.append(
+                f"{operation}: p95 {current['p95']:.4f}s > {previous['p95']:.4f}s"
+            )
+        if current["throughput"] < previous["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{operation}: throughput {current['throughput']:.1f}/s "
+                f"< {previous['throughput']:.1f}/s"
+            )
+    return regressions
+
+
+class Workload:
+    def __init__(
+        self, datafields: int, updates: int, bars: int, user: str, seed: int = 0
+    ):
+        self.datafields = datafields
+        self.updates = updates
+        self.bars = bars
+        self.user = user
+        self.random = random.Random(seed)
+        self.names: List[str] = []
+        self.samples: Dict[str, List[float]] = {}
+        self.items: Dict[str, int] = {}
+
+    def measure(self, operation: str, func, *args, items: Optional[int] = None):
+        start = time.perf_counter()
+        result = func(*args)
+        self.samples.setdefault(operation, []).append(time.perf_counter() - start)
+        if items is not None:
+            self.items[operation] = self.items.get(operation, 0) + items
+        return result
+
+    def key(self, i: int) -> str:
+        return f"{KEY_PREFIX}{i}"
+
+    def create_datafields(self) -> None:
+        for i in range(self.datafields):
+            df = frappe._dict(
+                key=self.key(i), value=self.random.uniform(1, 100), n=0, insert=True
+            )
+            doc = self.measure("create_datafield", get_doc_from_user_key, self.user, df)
+            self.names.append(doc.name)
+        frappe.db.commit()
+
+    def seed_bars(self) -> None:
+        today = datetime.now()
+        for name in self.names:
+            close = self.random.uniform(1, 100)
+            for day in range(self.bars, 0, -1):
+                open_, close = close, close * self.random.uniform(0.95, 1.05)
+                frappe.get_doc(
+                    {
+                        "doctype": "Datafield Series",
+                        "date_string": (today - timedelta(days=day)).strftime(
+                            "%Y%m%dT"
+                        ),
+                        "open": open_,
+                        "high": max(open_, close) * 1.01,
+                        "low": min(open_, close) * 0.99,
+                        "close": close,
+                        "volume": self.random.randint(1, self.updates or 1),
+                        "idx": self.bars - day + 1,
+                        "parent": name,
+                        "parenttype": "Datafield",
+                        "parentfield": "datafield_series_table",
+                    }
+                ).db_insert()
+        frappe.db.commit()
+
+    def lookup_datafields(self) -> None:
+        for i in range(self.datafields):
+            df = frappe._dict(key=self.key(i), insert=False)
+            self.measure("get_doc_from_user_key", get_doc_from_user_key, self.user, df)
+
+    def seed_updates(self) -> None:
+        for _round in range(self.updates):
+            for name in self.names:
+                value = self.random.uniform(1, 100)
+                self.measure("append_update", append_update, name, value, _round)
+        frappe.db.commit()
+
+    def merge(self) -> None:
+        for name in self.names:
+            doc = frappe.get_doc("Datafield", name)
+            self.measure("merge_updates", doc.merge_updates)
+
+    def extend(self) -> None:
+        self.measure("extend_all_series", extend_all_series, items=self.datafields)
+
+    def export(self) -> None:
+        self.measure(
+            "generate_files", GithubManager.generate_files, items=self.datafields
+        )
+
+    def cleanup(self) -> None:
+        if not self.names:
+            return
+        # Every step commits; what is left belongs to an operation that failed
+        frappe.db.rollback()
+        # Through the purge, so the Datafields' caches and indicators go too
+        purge = Purge(create_purge(self.names))
+        purge.pause = 0
+        purge.run()
+
+    def results(self) -> Dict:
+        return {
+            "workload": {
+                "datafields": self.datafields,
+                "updates": self.updates,
+                "bars": self.bars,
+            },
+            "operations": {
+                operation: summarize(samples, self.items.get(operation))
+                for operation, samples in self.samples.items()
+            },
+        }
+
+
+def run(
+    datafields: int = 50,
+    updates: int = 20,
+    bars: int = 100,
+    output: Optional[str] = None,
+    baseline: Optional[str] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    export: bool = True,
+    keep: bool = False,
+    seed: int = 0,
+) -> Dict:
+    if frappe.db.exists("Datafield", {"key": ["like", f"{KEY_PREFIX}%"]}):
+        frappe.throw(_("Benchmark Datafields already exist on this site"))
+
+    workload = Workload(
+        int(datafields), int(updates), int(bars), frappe.session.user, int(seed)
+    )
+    try:
+        workload.create_datafields()
+        workload.seed_bars()
+        workload.lookup_datafields()
+        workload.seed_updates()
+        workload.merge()
+        # merge_updates consumed the first round; extend_all_series gets a fresh one
+        workload.seed_updates()
+        workload.extend()
+        if export:
+            workload.export()
+    finally:
+        if not keep:
+            workload.cleanup()
+
+    results = workload.results()
+    results.update({"site": frappe.local.site, "timestamp": datetime.now().isoformat()})
+
+    output = output or frappe.get_site_path(
+        "private", "files", f"benchmark-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    click.echo(f"Benchmark results written to {output}")
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), float(threshold))
+        if regressions:
+            frappe.throw(
+                _("Benchmark regressed against {0}:").format(baseline)
+                + "\n"
+                + "\n".join(regressions),
+                BenchmarkRegression,
+            )
+
+    return results
@@ -0,0 +1,120 @@
+import glob
+import heapq
+import os
+import socket
+import struct
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import frappe
+from frappe.utils import cint
+
+from tv_data.metrics import metrics
+
+# timestamp, value, n, insert, len(user), len(key); user and key follow as UTF-8
+RECORD = struct.Struct("<ddq?HH")
+NO_N = -(2**63)
+CAPTURE_DIR = "tv_data_capture"
+
+_files: Dict[str, int] = {}
+
+
+def is_enabled() -> bool:
+    return bool(
+        cint(frappe.get_cached_doc("TV Data Settings").defaults.capture_updates)
+    )
+
+
+def get_capture_dir() -> str:
+    return frappe.get_site_path("private", CAPTURE_DIR)
+
+
+def get_capture_path(moment: datetime) -> str:
+    # One file per process and day: appends never interleave and files rotate daily
+    return os.path.join(
+        get_capture_dir(),
+        f"capture-{moment.strftime('%Y%m%d')}-{socket.gethostname()}-{os.getpid()}.bin",
+    )
+
+
+def pack_record(
+    user: str, key: str, value: float, n: Optional[int], insert: bool, timestamp: float
+) -> bytes:
+    user, key = user.encode(), key.encode()
+    header = RECORD.pack(
+        timestamp, value, NO_N if n is None else n, insert, len(user), len(key)
+    )
+    return header + user + key
+
+
+def capture(
+    user: str,
+    key: str,
+    value: float,
+    n: Optional[int] = None,
+    insert: bool = False,
+    timestamp: Optional[datetime] = None,
+) -> None:
+    """Append an incoming update to this process's capture log when capture is enabled.
+
+    Capturing must never fail an update, so errors only count the
+    `capture_errors` metric.
+    """
+    if not is_enabled():
+        return
+
+    timestamp = timestamp or datetime.now()
+    try:
+        path = get_capture_path(timestamp)
+        fd = _files.get(path)
+        if fd is None:
+            for stale in _files.values():
+                os.close(stale)
+            _files.clear()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = _files[path] = os.open(
+                path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640
+            )
+        os.write(
+            fd,
+            pack_record(
+                user, key, float(value), n, bool(insert), timestamp.timestamp()
+            ),
+        )
+        metrics.inc("capture_records")
+    except Exception:
+        metrics.inc("capture_errors")
+
+
+def read_log(path: str) -> Iterator[Dict]:
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            timestamp, value, n, insert, user_len, key_len = RECORD.unpack(header)
+            strings = f.read(user_len + key_len)
+            if len(strings) < user_len + key_len:
+                # Truncated tail of a log that is still being written
+                return
+            yield {
+                "timestamp": timestamp,
+                "user": strings[:user_len].decode(),
+                "key": strings[user_len:].decode(),
+                "value": value,
+                "n": None if n == NO_N else n,
+                "insert": insert,
+            }
+
+
+def read_logs(paths: Union[str, Iterable[str]]) -> Iterator[Dict]:
+    """Records of several capture logs (or a glob pattern) merged in timestamp order."""
+    if isinstance(paths, str):
+        paths = sorted(glob.glob(paths))
+    return heapq.merge(
+        *(read_log(path) for path in paths), key=lambda record: record["timestamp"]
+    )
+
+
+def list_logs() -> List[str]:
+    return sorted(glob.glob(os.path.join(get_capture_dir(), "capture-*.bin")))
@@ -0,0 +1,26 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("tv-data-line-daemon")
+@click.option("--host", default="127.0.0.1", help="Address to bind")
+@click.option("--tcp-port", type=int, default=8094, help="TCP port, 0 to disable")
+@click.option("--udp-port", type=int, default=8094, help="UDP port, 0 to disable")
+@click.option("--batch-size", type=int, help="Points per database write")
+@click.option("--interval", type=float, help="Seconds between writes")
+@pass_context
+def line_daemon(context, host, tcp_port, udp_port, batch_size, interval):
+    "Run the line-protocol ingestion daemon for a site"
+    from tv_data.line_daemon import run
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        run(host, tcp_port, udp_port, batch_size, interval)
+    finally:
+        frappe.destroy()
+
+
+commands = [line_daemon]
@@ -1,13 +1,31 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, Optional, Tuple
 import re
 
 
 class CycleManager:
-    def __init__(self, timeframe, daily_updates, scheduler_pre_runtime):
+    """Cycle boundaries of the TV Data Settings schedule.
+
+    Each day is split into timeframe windows aligned with midnight, and every
+    window into `daily_updates` cycles. A boundary is therefore
+    `midnight + window * timeframe + (index - 1) * cycle_duration`, truncated at
+    the next midnight, and every lookup is plain arithmetic on that formula.
+    """
+
+    def __init__(
+        self,
+        timeframe,
+        daily_updates,
+        scheduler_pre_runtime,
+        clock: Callable[[], datetime] = datetime.now,
+    ):
         self.timeframe = self._parse_timeframe(timeframe)
-        self.daily_updates = daily_updates
-        self.cycle_duration = self.timeframe / daily_updates
+        self.daily_updates = int(daily_updates)
+        self.cycle_duration = self.timeframe / self.daily_updates
         self.scheduler_pre_runtime = timedelta(seconds=int(scheduler_pre_runtime))
+        self.clock = clock
+        self._window_cache: Dict[datetime, Tuple[datetime, ...]] = {}
 
     def _parse_timeframe(self, timeframe):
         if isinstance(timeframe, (int, float)):
@@ -32,75 +50,127 @@ class CycleManager:
         else:
             raise ValueError(f"Invalid timeframe type: {type(timeframe)}")
 
-    def get_cycles(self):
-        now = datetime.now()
-        timeframe_start = self._get_timeframe_start(now)
-        current_time = now.time()
-
-        past_cycles, future_cycles = self._compute_cycles(timeframe_start, current_time)
-
-        if not future_cycles and past_cycles:
-            future_cycles.append(past_cycles.pop(0))
-
-        return {"past": past_cycles, "future": future_cycles}
+    @staticmethod
+    def _midnight(moment: datetime) -> datetime:
+        return datetime.combine(moment.date(), time.min, tzinfo=moment.tzinfo)
+
+    def _boundary(self, midnight: datetime, window: int, index: int) -> datetime:
+        return midnight + window * self.timeframe + index * self.cycle_duration
+
+    def _locate(self, moment: datetime) -> Tuple[datetime, int, int]:
+        """Return `(midnight, window, index)` of the last boundary at or before `moment`."""
+        midnight = self._midnight(moment)
+        offset = moment - midnight
+        window = offset // self.timeframe
+        index = min(
+            (offset - window * self.timeframe) // self.cycle_duration,
+            self.daily_updates - 1,
+        )
+        return midnight, window, index
 
-    def _compute_cycles(self, timeframe_start, current_time):
+    def _step_forward(self, midnight: datetime, window: int, index: int):
+        if index + 1 < self.daily_updates:
+            window, index = window, index + 1
+        else:
+            window, index = window + 1, 0
+        if self._boundary(midnight, window, index) >= midnight + timedelta(days=1):
+            return midnight + timedelta(days=1), 0, 0
+        return midnight, window, index
+
+    def _step_back(self, midnight: datetime, window: int, index: int):
+        if index > 0:
+            return midnight, window, index - 1
+        if window > 0:
+            return midnight, window - 1, self.daily_updates - 1
+        return self._locate(midnight - timedelta(microseconds=1))
+
+    def _cycle(self, midnight: datetime, window: int, index: int) -> Dict:
+        boundary = self._boundary(midnight, window, index)
+        return {
+            "index": index + 1,
+            "time": boundary.time().strftime("%H:%M:%S"),
+            "datetime": boundary,
+        }
+
+    def get_timeframe_start(self, now: Optional[datetime] = None) -> datetime:
+        midnight, window, _ = self._locate(now or self.clock())
+        return self._boundary(midnight, window, 0)
+
+    def get_next_cycle(self, now: Optional[datetime] = None) -> Dict:
+        return self._cycle(*self._step_forward(*self._locate(now or self.clock())))
+
+    def get_previous_cycle(self, now: Optional[datetime] = None) -> Dict:
+        now = now or self.clock()
+        position = self._locate(now)
+        if self._boundary(*position) == now:
+            position = self._step_back(*position)
+        return self._cycle(*position)
+
+    def get_last_trigger(self, now: Optional[datetime] = None) -> datetime:
+        """When the scheduler last launched a cycle: its boundary minus the pre-runtime."""
+        now = now or self.clock()
+        cycle = self.get_previous_cycle(now + self.scheduler_pre_runtime)
+        return cycle["datetime"] - self.scheduler_pre_runtime
+
+    def iter_cycles(
+        self, start: Optional[datetime] = None, reverse: bool = False
+    ) -> Iterator[Dict]:
+        """Yield cycles strictly after `start` (or before it with `reverse`), across day edges."""
+        start = start or self.clock()
+        if reverse:
+            cycle = self.get_previous_cycle(start)
+            position = self._locate(cycle["datetime"])
+            step = self._step_back
+        else:
+            position = self._step_forward(*self._locate(start))
+            step = self._step_forward
+        while True:
+            yield self._cycle(*position)
+            position = step(*position)
+
+    def get_window(self, now: Optional[datetime] = None) -> Tuple[datetime, ...]:
+        """Boundaries of the timeframe window containing `now`, memoized per window."""
+        window_start = self.get_timeframe_start(now)
+        boundaries = self._window_cache.get(window_start)
+        if boundaries is None:
+            next_midnight = self._midnight(window_start) + timedelta(days=1)
+            boundaries = tuple(
+                boundary
+                for boundary in (
+                    window_start + i * self.cycle_duration
+                    for i in range(self.daily_updates)
+                )
+                if boundary < next_midnight
+            )
+            # Only the current and neighbouring windows are ever asked for
+            if len(self._window_cache) > 4:
+                self._window_cache.clear()
+            self._window_cache[window_start] = boundaries
+        return boundaries
+
+    def get_cycles(self, now: Optional[datetime] = None) -> Dict:
+        now = now or self.clock()
         past_cycles = []
         future_cycles = []
 
-        for i in range(self.daily_updates):
-            cycle_time = (
-                timeframe_start + i * self.cycle_duration - self.scheduler_pre_runtime
-            ).time()
-
+        for i, boundary in enumerate(self.get_window(now)):
+            trigger_at = boundary - self.scheduler_pre_runtime
             cycle_info = {
                 "index": i + 1,
-                "time": cycle_time.strftime("%H:%M:%S"),
+                "time": trigger_at.time().strftime("%H:%M:%S"),
             }
-
-            if cycle_time < current_time:
+            if trigger_at < now:
                 past_cycles.append(cycle_info)
-            elif cycle_time > current_time:
+            elif trigger_at > now:
                 future_cycles.append(cycle_info)
 
-        return past_cycles, future_cycles
+        if not future_cycles and past_cycles:
+            future_cycles.append(past_cycles.pop(0))
+
+        return {"past": past_cycles, "future": future_cycles}
+
 
-    def _get_timeframe_start(self, now):
-        # Calculate the start of the timeframe, aligned with the beginning of the day
-        midnight = datetime.combine(now.date(), datetime.min.time())
-        timeframe_start = (
-            midnight + ((now - midnight) // self.timeframe) * self.timeframe
-        )
-        return timeframe_start
-
-    def get_next_cycle(self):
-        now = datetime.now()
-        timeframe_start = self._get_timeframe_start(now)
-
-        # Calculate the time of the next cycle
-        for i in range(self.daily_updates):
-            next_cycle_time = timeframe_start + i * self.cycle_duration
-            if next_cycle_time > now:
-                return {
-                    "index": i + 1,
-                    "time": next_cycle_time.time().strftime("%H:%M:%S"),
-                    "datetime": next_cycle_time,
-                }
-
-        return None
-
-    def get_previous_cycle(self):
-        now = datetime.now()
-        timeframe_start = self._get_timeframe_start(now)
-
-        # Calculate the time of the previous cycle
-        for i in range(self.daily_updates - 1, -1, -1):
-            prev_cycle_time = timeframe_start + i * self.cycle_duration
-            if prev_cycle_time < now:
-                return {
-                    "index": i + 1,
-                    "time": prev_cycle_time.time().strftime("%H:%M:%S"),
-                    "datetime": prev_cycle_time,
-                }
-
-        return None
+@lru_cache(maxsize=8)
+def get_cycle_manager(timeframe, daily_updates, scheduler_pre_runtime) -> CycleManager:
+    """Shared CycleManager per configuration, so its window cache survives settings reloads."""
+    return CycleManager(timeframe, daily_updates, scheduler_pre_runtime)
@@ -0,0 +1,207 @@
+import ast
+import math
+from collections import defaultdict
+from functools import lru_cache
+from graphlib import CycleError, TopologicalSorter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import frappe
+from frappe import _
+
+GRAPH_VERSION_KEY = "tv_data:formula:version"
+FUNCTIONS = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "round": round,
+    "sqrt": math.sqrt,
+    "log": math.log,
+    "exp": math.exp,
+}
+ALLOWED_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Call,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.UAdd,
+    ast.USub,
+)
+
+
+class Formula:
+    """Arithmetic expression over Datafield keys, validated and compiled once.
+
+    Only numbers, `+ - * / // % **`, and the functions in `FUNCTIONS` are
+    allowed; every other name is the key of an input Datafield of the same
+    user, case-insensitive like keys themselves.
+    """
+
+    def __init__(self, expression: str):
+        tree = ast.parse(expression.strip(), mode="eval")
+        inputs = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, ALLOWED_NODES):
+                raise ValueError(f"{type(node).__name__} is not allowed in formulas")
+            if isinstance(node, ast.Constant):
+                if isinstance(node.value, bool) or not isinstance(
+                    node.value, (int, float)
+                ):
+                    raise ValueError("Only numeric constants are allowed in formulas")
+                # Float arithmetic overflows instead of building huge integers
+                node.value = float(node.value)
+            if isinstance(node, ast.Call) and (
+                not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS
+            ):
+                raise ValueError(f"Unknown function in formula: {ast.unparse(node)}")
+            if isinstance(node, ast.Name) and node.id not in FUNCTIONS:
+                node.id = node.id.upper()
+                inputs.add(node.id)
+
+        self.expression = expression
+        self.inputs = tuple(sorted(inputs))
+        self.code = compile(tree, "<formula>", "eval")
+
+    def evaluate(self, values: Dict[str, float]) -> float:
+        return float(eval(self.code, {"__builtins__": {}, **FUNCTIONS}, values))
+
+
+@lru_cache(maxsize=1024)
+def compile_formula(expression: str) -> Formula:
+    return Formula(expression)
+
+
+class FormulaGraph:
+    """Derived Datafields and their inputs, in topological order.
+
+    `affected` returns every derived Datafield downstream of the changed
+    ones, ordered so inputs are always computed before the formulas that
+    read them.
+    """
+
+    def __init__(self, derived: List[Dict], names: Dict[Tuple[str, str], str]):
+        self.formulas: Dict[str, Formula] = {}
+        self.inputs: Dict[str, Dict[str, str]] = {}
+        self.dependents: Dict[str, set] = defaultdict(set)
+
+        for datafield in derived:
+            formula = compile_formula(datafield["formula"])
+            inputs = {
+                key: names.get((datafield["user"], key)) for key in formula.inputs
+            }
+            # Formulas with a deleted input are not evaluated until fixed
+            if not all(inputs.values()):
+                continue
+            self.formulas[datafield["name"]] = formula
+            self.inputs[datafield["name"]] = inputs
+            for name in inputs.values():
+                self.dependents[name].add(datafield["name"])
+
+        sorter = TopologicalSorter(
+            {name: set(inputs.values()) for name, inputs in self.inputs.items()}
+        )
+        self.order = {name: i for i, name in enumerate(sorter.static_order())}
+
+    @classmethod
+    def load(cls, override: Optional[Dict] = None) -> "FormulaGraph":
+        """Build the graph from the database, with `override` replacing or adding one Datafield."""
+        derived = frappe.get_all(
+            "Datafield",
+            filters={"formula": ["is", "set"]},
+            fields=["name", "user", "key", "formula"],
+        )
+        if override:
+            derived = [d for d in derived if d["name"] != override["name"]]
+            if override.get("formula"):
+                derived.append(override)
+
+        keys = {
+            key
+            for datafield in derived
+            for key in compile_formula(datafield["formula"]).inputs
+        }
+        users = {datafield["user"] for datafield in derived}
+        names = {}
+        if keys:
+            for row in frappe.get_all(
+                "Datafield",
+                filters={"user": ["in", list(users)], "key": ["in", list(keys)]},
+                fields=["name", "user", "key"],
+            ):
+                names[(row.user, row.key)] = row.name
+        if override:
+            names[(override["user"], override["key"])] = override["name"]
+        return cls(derived, names)
+
+    def affected(self, changed: Iterable[str]) -> List[str]:
+        pending, seen = list(changed), set()
+        while pending:
+            for name in self.dependents.get(pending.pop(), ()):
+                if name not in seen:
+                    seen.add(name)
+                    pending.append(name)
+        return sorted(seen, key=self.order.__getitem__)
+
+
+_graphs: Dict[str, Tuple[bytes, FormulaGraph]] = {}
+
+
+def get_graph() -> FormulaGraph:
+    """The graph of the current site, rebuilt only when a formula or Datafield changed."""
+    key = frappe.cache.make_key(GRAPH_VERSION_KEY)
+    frappe.cache.set(key, 0, nx=True)
+    version = frappe.cache.get(key)
+    cached = _graphs.get(frappe.local.site)
+    if not cached or cached[0] != version:
+        cached = _graphs[frappe.local.site] = (version, FormulaGraph.load())
+    return cached[1]
+
+
+def bump_graph_version() -> None:
+    key = frappe.cache.make_key(GRAPH_VERSION_KEY)
+    frappe.cache.set(key, 0, nx=True)
+    frappe.cache.incr(key)
+
+
+def check_formula(doc) -> Formula:
+    """Validate the formula of a Datafield document against its inputs and the graph."""
+    try:
+        formula = compile_formula(doc.formula)
+    except (SyntaxError, ValueError) as e:
+        frappe.throw(_("Invalid formula: {0}").format(e))
+
+    if doc.key in formula.inputs:
+        frappe.throw(_("A formula cannot refer to its own key"))
+    missing = [
+        key
+        for key in formula.inputs
+        if not frappe.db.exists("Datafield", {"user": doc.user, "key": key})
+    ]
+    if missing:
+        frappe.throw(
+            _("Unknown Datafield keys in formula: {0}").format(", ".join(missing))
+        )
+
+    try:
+        FormulaGraph.load(
+            {
+                "name": doc.name,
+                "user": doc.user,
+                "key": doc.key,
+                "formula": doc.formula,
+            }
+        )
+    except CycleError as e:
+        frappe.throw(
+            _("Formula creates a dependency cycle: {0}").format(" -> ".join(e.args[1]))
+        )
+    return formula
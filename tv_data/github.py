@@ -9,8 +9,15 @@ from datetime import datetime
 
 import frappe
 from frappe import _
+from frappe.utils import cint
 from frappe.utils.password import get_decrypted_password
 
+from tv_data.indicators import align_indicators, get_indicator_data
+from tv_data.metrics import metrics
+from tv_data.replica import replica_read
+from tv_data.runtime_estimator import runtime_estimator
+from tv_data.series import DATE_STRING_FORMAT, fill_gaps
+
 
 class GithubManager:
     @staticmethod
@@ -68,7 +75,8 @@ class GithubManager:
 
             return f"Files generated successfully in {base_dir}"
 
-        return GithubManager.run_with_logging("generate_files", _generate_files)
+        with runtime_estimator.measure("generate_files"):
+            return GithubManager.run_with_logging("generate_files", _generate_files)
 
     @staticmethod
     def update_repository():
@@ -82,12 +90,7 @@ class GithubManager:
 
             if not os.path.exists(repo_dir):
                 logging.info(f"Cloning repository to {repo_dir}...")
-                subprocess.run(
-                    ["git", "clone", remote_url, repo_dir],
-                    check=True,
-                    capture_output=True,
-                    text=True,
-                )
+                GithubManager._run_step("clone", ["git", "clone", remote_url, repo_dir])
 
             with GithubManager._change_dir(repo_dir):
                 logging.info("Setting up git config...")
@@ -97,7 +100,10 @@ class GithubManager:
 
             return "Repository updated successfully"
 
-        return GithubManager.run_with_logging("update_repository", _update_repository)
+        with runtime_estimator.measure("update_repository"):
+            return GithubManager.run_with_logging(
+                "update_repository", _update_repository
+            )
 
     @staticmethod
     def _clear_directories(dirs: Dict[str, str]):
@@ -114,9 +120,25 @@ class GithubManager:
             os.makedirs(directory, exist_ok=True)
 
     @staticmethod
+    def _run_step(step: str, cmd: List[str]) -> subprocess.CompletedProcess:
+        with metrics.timer(f"git_{step}"):
+            return subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+    @staticmethod
+    @metrics.timed()
+    # The export follows the merge, so only a replica that has caught up will do
+    @replica_read(max_lag=0)
     def _process_datafields(data_dir: str) -> Dict[str, List[str]]:
         storage_data = {"description": [], "pricescale": [], "symbol": []}
         datafields = frappe.get_all("Datafield", fields=["name", "key", "scale"])
+        settings = frappe.get_cached_doc("TV Data Settings")
+        export_indicators = cint(settings.export_indicators)
+        # Days up to the last merge get a bar even if no update arrived
+        fill_until = (
+            settings.cycle_manager.get_last_trigger().strftime(DATE_STRING_FORMAT)
+            if cint(settings.export_fill_gaps)
+            else None
+        )
 
         for datafield in datafields:
             csv_file_path = os.path.join(data_dir, f"{datafield['name']}.csv")
@@ -125,9 +147,17 @@ class GithubManager:
                 "Datafield Series",
                 filters={"parent": datafield["name"]},
                 fields=["date_string", "open", "high", "low", "close", "volume"],
+                order_by="date_string asc, idx asc",
             )
+            if fill_until:
+                series_data = fill_gaps(series_data, fill_until)
 
             GithubManager._write_csv(csv_file_path, series_data)
+            if export_indicators:
+                GithubManager._write_indicators_csv(
+                    os.path.join(data_dir, f"{datafield['name']}.indicators.csv"),
+                    get_indicator_data(datafield["name"]),
+                )
             storage_data["description"].append(datafield["key"])
             storage_data["pricescale"].append(datafield["scale"])
             storage_data["symbol"].append(datafield["name"])
@@ -136,50 +166,35 @@ class GithubManager:
 
     @staticmethod
     def _setup_git_config(settings):
-        subprocess.run(
-            ["git", "config", "user.name", settings.github_username],
-            check=True,
-            capture_output=True,
-            text=True,
+        GithubManager._run_step(
+            "config", ["git", "config", "user.name", settings.github_username]
         )
-        subprocess.run(
-            ["git", "config", "user.email", settings.github_email],
-            check=True,
-            capture_output=True,
-            text=True,
+        GithubManager._run_step(
+            "config", ["git", "config", "user.email", settings.github_email]
         )
 
     @staticmethod
     def _update_repo(settings):
         try:
-            subprocess.run(["git", "pull"], check=True, capture_output=True, text=True)
-            subprocess.run(
-                ["cp", "-r", "../tv_data/.", "."],
-                check=True,
-                capture_output=True,
-                text=True,
-            )
-            subprocess.run(
-                ["git", "add", "."], check=True, capture_output=True, text=True
-            )
+            GithubManager._run_step("pull", ["git", "pull"])
+            GithubManager._run_step("copy", ["cp", "-r", "../tv_data/.", "."])
+            GithubManager._run_step("add", ["git", "add", "."])
             commit_message = settings.daily_commit_message or "Planned Daily Updates"
 
-            result = subprocess.run(
-                ["git", "commit", "-m", commit_message],
-                check=True,
-                capture_output=True,
-                text=True,
+            result = GithubManager._run_step(
+                "commit", ["git", "commit", "-m", commit_message]
             )
 
             frappe.logger().info(f"Git commit output: {result.stdout}")
 
-            subprocess.run(["git", "push"], check=True, capture_output=True, text=True)
+            GithubManager._run_step("push", ["git", "push"])
         except subprocess.CalledProcessError as e:
             error_msg = f"Git operation failed: {e.cmd}. Error: {e.stderr}"
             frappe.log_error(error_msg, _("GitHub Manager Error"))
             raise
 
     @staticmethod
+    @metrics.timed()
     def _write_csv(file_path: str, data: List[Dict]):
         try:
             with open(file_path, mode="w", newline="") as file:
@@ -205,6 +220,26 @@ class GithubManager:
             )
             raise
 
+    @staticmethod
+    def _write_indicators_csv(file_path: str, data: Dict[str, Dict]):
+        if not data:
+            return
+        aligned = align_indicators(data)
+        names = sorted(data)
+        try:
+            with open(file_path, mode="w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(["time"] + names)
+                for i, t in enumerate(aligned["t"]):
+                    values = [aligned[name][i] for name in names]
+                    writer.writerow([t] + ["" if v is None else v for v in values])
+        except IOError as e:
+            frappe.log_error(
+                f"Error writing CSV file {file_path}: {str(e)}",
+                _("GitHub Manager Error"),
+            )
+            raise
+
     @staticmethod
     def _write_json(file_path: str, data: Dict):
         try:
@@ -135,8 +135,15 @@ doctype_js = {"TV Data Settings": "public/js/tv_data_settings.js"}
 
 scheduler_events = {
     "cron": {
-        "45 * * * *": ["tv_data.tv_data.doctype.datafield.datafield.extend_all_series"]
-    }
+        # Merge and export are launched at the cycle boundaries of TV Data Settings
+        "* * * * *": [
+            "tv_data.scheduler.tick",
+            "tv_data.onchain.poll",
+            # Values left pending after the last update of a burst
+            "tv_data.realtime.flush_updates",
+        ]
+    },
+    "daily_long": ["tv_data.retention.run_retention"],
 }
 # 		"tv_data.tasks.all"
 # 	],
@@ -184,13 +191,13 @@ scheduler_events = {
 
 # Request Events
 # ----------------
-# before_request = ["tv_data.utils.before_request"]
-# after_request = ["tv_data.utils.after_request"]
+before_request = ["tv_data.profiler.before_request"]
+after_request = ["tv_data.profiler.after_request", "tv_data.metrics.flush"]
 
 # Job Events
 # ----------
-# before_job = ["tv_data.utils.before_job"]
-# after_job = ["tv_data.utils.after_job"]
+before_job = ["tv_data.profiler.before_job"]
+after_job = ["tv_data.profiler.after_job", "tv_data.metrics.flush"]
 
 # User Data Protection
 # --------------------
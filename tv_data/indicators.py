@@ -0,0 +1,358 @@
+import json
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+import frappe
+import numpy as np
+from frappe import _
+from frappe.utils import now_datetime
+
+from tv_data.metrics import metrics
+from tv_data.replica import replica_read
+from tv_data.series import get_bars
+
+INDICATOR_PATTERN = re.compile(r"^(sma|ema|rsi|atr)[:_ ]?(\d+)$")
+# Keeps d ** -k in the block scan of `smooth` far from float overflow
+MAX_SCALE_EXPONENT = 500.0
+VALUE_FIELDS = (
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "docstatus",
+    "idx",
+    "datafield_indicator",
+    "datafield",
+    "time",
+    "value",
+)
+
+State = Dict[str, float]
+
+
+def smooth(values: np.ndarray, alpha: float, initial: float) -> np.ndarray:
+    """`y[i] = (1 - alpha) * y[i - 1] + alpha * values[i]` with `y[-1] = initial`, vectorized.
+
+    The recurrence has the closed form `y[j] = d^(j+1) * (initial + alpha *
+    cumsum(values[i] / d^(i+1)))` with `d = 1 - alpha`; it is evaluated in
+    blocks short enough for `d^-(i+1)` to stay finite.
+    """
+    d = 1.0 - alpha
+    if d <= 0:
+        return values.astype(float)
+
+    out = np.empty(len(values))
+    block = max(1, min(4096, int(MAX_SCALE_EXPONENT / -math.log(d))))
+    state = initial
+    for start in range(0, len(values), block):
+        x = values[start : start + block]
+        scale = d ** np.arange(1, len(x) + 1)
+        y = scale * (state + alpha * np.cumsum(x / scale))
+        out[start : start + len(x)] = y
+        state = y[-1]
+    return out
+
+
+class Indicator:
+    """One indicator over bars, computed in full with NumPy or advanced one bar at a time.
+
+    `compute` returns the values (NaN during warm-up) and the states after
+    the last two bars; `step` turns such a state and one more bar into the
+    next value and state. Keeping the state before the last bar lets a merge
+    that folds into the current bar replace its value instead of appending.
+    """
+
+    def __init__(self, kind: str, period: int):
+        self.kind = kind
+        self.period = period
+        self.name = f"{kind}_{period}"
+
+    def compute(
+        self, bars: Dict[str, List]
+    ) -> Tuple[np.ndarray, Optional[List[State]]]:
+        close = np.asarray(bars["c"], dtype=float)
+        n, count = self.period, len(close)
+        values = np.full(count, np.nan)
+        if count < n + 2:
+            return values, None
+
+        if self.kind == "sma":
+            sums = np.cumsum(np.insert(close, 0, 0.0))
+            values[n - 1 :] = (sums[n:] - sums[:-n]) / n
+            # The last n - 1 closes, which the next bar completes to a full window
+            states = [
+                {"window": close[count - n : count - 1].tolist()},
+                {"window": close[count - n + 1 :].tolist()},
+            ]
+
+        elif self.kind == "ema":
+            seed = close[:n].mean()
+            values[n - 1] = seed
+            values[n:] = smooth(close[n:], 2.0 / (n + 1), seed)
+            states = [{"ema": values[i]} for i in (-2, -1)]
+
+        elif self.kind == "rsi":
+            delta = np.diff(close)
+            gains, losses = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+            gain = np.concatenate(
+                ([gains[:n].mean()], smooth(gains[n:], 1.0 / n, gains[:n].mean()))
+            )
+            loss = np.concatenate(
+                ([losses[:n].mean()], smooth(losses[n:], 1.0 / n, losses[:n].mean()))
+            )
+            values[n:] = self._rsi(gain, loss)
+            states = [
+                {"gain": gain[i], "loss": loss[i], "close": close[i]} for i in (-2, -1)
+            ]
+
+        else:
+            high = np.asarray(bars["h"], dtype=float)
+            low = np.asarray(bars["l"], dtype=float)
+            previous = np.concatenate(([close[0]], close[:-1]))
+            true_range = np.maximum(
+                high - low,
+                np.maximum(np.abs(high - previous), np.abs(low - previous)),
+            )
+            true_range[0] = high[0] - low[0]
+            seed = true_range[:n].mean()
+            values[n - 1] = seed
+            values[n:] = smooth(true_range[n:], 1.0 / n, seed)
+            states = [{"atr": values[i], "close": close[i]} for i in (-2, -1)]
+
+        return values, [
+            {k: v if isinstance(v, list) else float(v) for k, v in s.items()}
+            for s in states
+        ]
+
+    @staticmethod
+    def _rsi(gain, loss):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+
+    def step(self, state: State, bar: Dict[str, float]) -> Tuple[float, State]:
+        n, close = self.period, bar["c"]
+        if self.kind == "sma":
+            window = state["window"] + [close]
+            return sum(window) / n, {"window": window[1:]}
+        if self.kind == "ema":
+            alpha = 2.0 / (n + 1)
+            value = (1 - alpha) * state["ema"] + alpha * close
+            return value, {"ema": value}
+        if self.kind == "rsi":
+            delta = close - state["close"]
+            gain = (state["gain"] * (n - 1) + max(delta, 0.0)) / n
+            loss = (state["loss"] * (n - 1) + max(-delta, 0.0)) / n
+            value = float(self._rsi(np.float64(gain), np.float64(loss)))
+            return value, {"gain": gain, "loss": loss, "close": close}
+        true_range = max(
+            bar["h"] - bar["l"],
+            abs(bar["h"] - state["close"]),
+            abs(bar["l"] - state["close"]),
+        )
+        value = (state["atr"] * (n - 1) + true_range) / n
+        return value, {"atr": value, "close": close}
+
+
+def parse_indicators(config: Optional[str]) -> List[Indicator]:
+    """Parse a list like `sma:20, ema:50, rsi:14, atr:14`."""
+    indicators = []
+    for item in re.split(r"[,;\n]+", config or ""):
+        item = item.strip().lower()
+        if not item:
+            continue
+        match = INDICATOR_PATTERN.match(item)
+        if not match or int(match.group(2)) < 1:
+            frappe.throw(_("Invalid indicator {0}").format(item))
+        indicators.append(Indicator(match.group(1), int(match.group(2))))
+    return indicators
+
+
+def get_configured(datafield: str) -> List[Indicator]:
+    config = frappe.db.get_value("Datafield", datafield, "indicators")
+    if not config:
+        config = frappe.get_cached_doc("TV Data Settings").defaults.indicators
+    return parse_indicators(config)
+
+
+def get_record_name(datafield: str, indicator: Indicator) -> str:
+    return f"{datafield}-{indicator.name}"
+
+
+def save_record(
+    datafield: str, indicator: Indicator, last_time: int, states: Optional[List]
+) -> str:
+    name = get_record_name(datafield, indicator)
+    values = {
+        "last_time": last_time,
+        "state": json.dumps(states, separators=(",", ":")) if states else None,
+    }
+    if frappe.db.exists("Datafield Indicator", name):
+        frappe.db.set_value("Datafield Indicator", name, values)
+    else:
+        frappe.get_doc(
+            {
+                "doctype": "Datafield Indicator",
+                "datafield": datafield,
+                "indicator": indicator.name,
+                **values,
+            }
+        ).insert(ignore_permissions=True)
+    return name
+
+
+def insert_values(record: str, datafield: str, points: List[Tuple[int, float]]) -> None:
+    if not points:
+        return
+    now = now_datetime()
+    user = frappe.session.user
+    frappe.db.bulk_insert(
+        "Datafield Indicator Value",
+        VALUE_FIELDS,
+        [
+            (frappe.generate_hash(length=10), now, now, user, user, 0, 0)
+            + (record, datafield, t, value)
+            for t, value in points
+        ],
+    )
+
+
+def compute_indicator(datafield: str, indicator: Indicator, bars: Dict) -> None:
+    values, states = indicator.compute(bars)
+    record = save_record(
+        datafield, indicator, bars["t"][-1] if bars["t"] else 0, states
+    )
+    frappe.db.delete("Datafield Indicator Value", {"datafield_indicator": record})
+    # Warm-up values are not stored
+    insert_values(
+        record,
+        datafield,
+        [
+            (t, round(float(v), 10))
+            for t, v in zip(bars["t"], values)
+            if not math.isnan(v)
+        ],
+    )
+
+
+def update_indicator(datafield: str, indicator: Indicator) -> bool:
+    """Advance a stored indicator by the bars since its last one; False if it needs a full compute.
+
+    Only the value of the last stored bar is rewritten and the values of new
+    bars are appended, so a merge costs the same whatever the history length.
+    """
+    record = frappe.db.get_value(
+        "Datafield Indicator",
+        get_record_name(datafield, indicator),
+        ["name", "last_time", "state"],
+        as_dict=True,
+    )
+    if not record or not record.state:
+        return False
+
+    bars = get_bars(datafield, start=record.last_time)
+    if not bars["t"] or bars["t"][0] != record.last_time:
+        return False
+
+    previous, last = json.loads(record.state)
+    points = []
+    # The stored last bar may have grown since; recompute it from the state before it
+    for i, t in enumerate(bars["t"]):
+        bar = {column: bars[column][i] for column in ("o", "h", "l", "c")}
+        if i > 0:
+            previous = last
+        value, last = indicator.step(previous, bar)
+        points.append((t, round(value, 10)))
+
+    frappe.db.set_value(
+        "Datafield Indicator Value",
+        {"datafield_indicator": record.name, "time": record.last_time},
+        "value",
+        points[0][1],
+    )
+    insert_values(record.name, datafield, points[1:])
+    save_record(datafield, indicator, bars["t"][-1], [previous, last])
+    return True
+
+
+@metrics.timed()
+def update_indicators(datafield: str, full: bool = False) -> None:
+    """Bring the configured indicators of a Datafield up to date after a merge."""
+    indicators = get_configured(datafield)
+    bars = None
+    for indicator in indicators:
+        if not full and update_indicator(datafield, indicator):
+            continue
+        if bars is None:
+            bars = get_bars(datafield)
+        compute_indicator(datafield, indicator, bars)
+
+    # Indicators no longer configured
+    names = [get_record_name(datafield, indicator) for indicator in indicators]
+    frappe.db.delete(
+        "Datafield Indicator Value",
+        {"datafield": datafield, "datafield_indicator": ["not in", names or [""]]},
+    )
+    frappe.db.delete(
+        "Datafield Indicator",
+        {"datafield": datafield, "name": ["not in", names or [""]]},
+    )
+
+
+def delete_indicators(datafield: str) -> None:
+    frappe.db.delete("Datafield Indicator Value", {"datafield": datafield})
+    frappe.db.delete("Datafield Indicator", {"datafield": datafield})
+
+
+def reset_indicators(datafield: str) -> None:
+    """Forget stored states after bars were rewritten, so the next update recomputes."""
+    frappe.db.set_value("Datafield Indicator", {"datafield": datafield}, "state", None)
+
+
+def get_indicator_data(datafield: str) -> Dict[str, Dict]:
+    """Stored points `t` and `v` of each indicator of a Datafield."""
+    records = dict(
+        frappe.get_all(
+            "Datafield Indicator",
+            filters={"datafield": datafield},
+            fields=["name", "indicator"],
+            as_list=True,
+        )
+    )
+    data = {indicator: {"t": [], "v": []} for indicator in records.values()}
+    for record, t, value in frappe.get_all(
+        "Datafield Indicator Value",
+        filters={"datafield": datafield},
+        fields=["datafield_indicator", "time", "value"],
+        order_by="time asc",
+        as_list=True,
+    ):
+        points = data[records[record]]
+        points["t"].append(t)
+        points["v"].append(value)
+    return {indicator: points for indicator, points in data.items() if points["t"]}
+
+
+def align_indicators(data: Dict[str, Dict]) -> Dict[str, List]:
+    """Columns of indicator values over all their bar times `t`, null where one has no value."""
+    times = sorted(set().union(*(points["t"] for points in data.values())))
+    result = {"t": times}
+    for name, points in data.items():
+        by_time = dict(zip(points["t"], points["v"]))
+        result[name] = [by_time.get(t) for t in times]
+    return result
+
+
+@frappe.whitelist()
+@replica_read()
+def get_indicators(datafield: str, names: Optional[str] = None) -> Dict:
+    """Indicator values of a Datafield aligned to its bar times `t`."""
+    if not frappe.has_permission("Datafield", "read", doc=datafield):
+        frappe.throw(_("No permission for Datafield"), frappe.PermissionError)
+    with metrics.timer("get_indicators"):
+        data = get_indicator_data(datafield)
+        if names:
+            wanted = {indicator.name for indicator in parse_indicators(names)}
+            data = {name: d for name, d in data.items() if name in wanted}
+        return align_indicators(data)
@@ -0,0 +1,204 @@
+import json
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Optional
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from tv_data.capture import capture
+from tv_data.metrics import metrics
+from tv_data.rate_limit import rate_limited_response, rate_limiter
+from tv_data.tv_data.doctype.datafield.datafield import (
+    append_update,
+    get_doc_from_user_key,
+)
+
+QUEUE_KEY = "tv_data:ingest:{}"
+LOCK_KEY = "tv_data:ingest:lock:{}"
+DEFAULT_PARTITIONS = 8
+LOCK_TIMEOUT = 300
+DRAIN_BATCH = 100
+
+
+def get_partitions() -> int:
+    settings = frappe.get_cached_doc("TV Data Settings")
+    return cint(settings.defaults.ingest_partitions) or DEFAULT_PARTITIONS
+
+
+def get_partition(user: str, key: str, partitions: Optional[int] = None) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(f"{user}|{key.upper()}".encode()) % (
+        partitions or get_partitions()
+    )
+
+
+def resolve_datafield(user: str, key: str, value: float, n: int, insert: bool):
+    """Return `(name, created)` for the Datafield of (user, key), creating it if allowed."""
+    name = frappe.db.get_value("Datafield", {"key": key.upper(), "user": user}, "name")
+    if name:
+        return name, False
+    if not insert:
+        return None, False
+
+    doc = get_doc_from_user_key(
+        user, frappe._dict(key=key, value=value, n=n, insert=True)
+    )
+    return (doc.name if doc else None), True
+
+
+@metrics.timed()
+def process_update(
+    user: str,
+    key: str,
+    value: float,
+    n: Optional[int] = None,
+    insert: bool = False,
+    time_received: Optional[datetime] = None,
+) -> Optional[str]:
+    value = flt(value)
+    name, created = resolve_datafield(user, key, value, cint(n), insert)
+    if name and not created:
+        append_update(name, value, n, time_received)
+    return name
+
+
+def enqueue_update(
+    user: str, key: str, value: float, n: Optional[int], insert: bool
+) -> int:
+    """Push an update onto its (user, key) partition and make sure the partition is drained.
+
+    All updates of one key land in the same Redis list, and at most one drain
+    job per partition runs at a time, so they are applied in arrival order.
+    Different partitions are drained by different workers in parallel.
+    """
+    partition = get_partition(user, key)
+    payload = json.dumps(
+        {
+            "user": user,
+            "key": key,
+            "value": value,
+            "n": n,
+            "insert": insert,
+            "received": time.time(),
+        }
+    )
+    pipe = frappe.cache.pipeline()
+    pipe.rpush(frappe.cache.make_key(QUEUE_KEY.format(partition)), payload)
+    pipe.execute()
+    metrics.inc("ingest_enqueued")
+
+    schedule_drain(partition)
+    return partition
+
+
+def schedule_drain(partition: int) -> None:
+    lock = frappe.cache.make_key(LOCK_KEY.format(partition))
+    if frappe.cache.set(lock, 1, nx=True, ex=LOCK_TIMEOUT):
+        frappe.enqueue(
+            "tv_data.ingest.drain_partition",
+            queue="default",
+            partition=partition,
+        )
+
+
+def drain_partition(partition: int) -> int:
+    queue = frappe.cache.make_key(QUEUE_KEY.format(partition))
+    lock = frappe.cache.make_key(LOCK_KEY.format(partition))
+    processed = 0
+
+    while True:
+        while True:
+            pipe = frappe.cache.pipeline()
+            pipe.lrange(queue, 0, DRAIN_BATCH - 1)
+            pipe.expire(lock, LOCK_TIMEOUT)
+            batch = pipe.execute()[0]
+            if not batch:
+                break
+
+            for payload in batch:
+                apply_payload(json.loads(payload))
+            frappe.db.commit()
+            # Only drop the batch once it is committed, so a crash replays instead of losing it
+            frappe.cache.pipeline().ltrim(queue, len(batch), -1).execute()
+            processed += len(batch)
+
+        frappe.cache.delete(lock)
+        # An update pushed between the last read and the release found the lock
+        # held and scheduled nothing; pick it up here unless another drain already did
+        pending = frappe.cache.pipeline().llen(queue).execute()[0]
+        if not pending or not frappe.cache.set(lock, 1, nx=True, ex=LOCK_TIMEOUT):
+            return processed
+
+
+def apply_payload(payload: Dict) -> None:
+    metrics.observe("ingest_queue_lag", max(time.time() - payload["received"], 0))
+    frappe.db.savepoint("tv_data_ingest")
+    try:
+        process_update(
+            payload["user"],
+            payload["key"],
+            payload["value"],
+            payload.get("n"),
+            payload.get("insert"),
+            datetime.fromtimestamp(payload["received"]),
+        )
+    except Exception as e:
+        frappe.db.rollback(save_point="tv_data_ingest")
+        metrics.inc("ingest_failed")
+        frappe.log_error(
+            f"Error ingesting {payload['user']}/{payload['key']}: {str(e)}",
+            "Datafield Ingest Error",
+        )
+
+
+def get_queue_depth() -> Dict[int, int]:
+    pipe = frappe.cache.pipeline()
+    partitions = get_partitions()
+    for partition in range(partitions):
+        pipe.llen(frappe.cache.make_key(QUEUE_KEY.format(partition)))
+    return dict(enumerate(pipe.execute()))
+
+
+@frappe.whitelist()
+def ingest(
+    key: str, value: float, n: Optional[int] = None, insert: int = 0, mode: str = None
+):
+    user = frappe.session.user
+    if user == "Guest":
+        frappe.throw(_("Login required"), frappe.PermissionError)
+
+    retry_after = rate_limiter.check(user, key)
+    if retry_after:
+        return rate_limited_response(retry_after)
+
+    mode = mode or (
+        "async"
+        if cint(frappe.get_cached_doc("TV Data Settings").defaults.async_ingestion)
+        else "sync"
+    )
+    value, insert = flt(value), bool(cint(insert))
+    n = cint(n) if n not in (None, "") else None
+    capture(user, key, value, n, insert)
+    if mode == "async":
+        return {
+            "queued": True,
+            "partition": enqueue_update(user, key, value, n, insert),
+        }
+
+    name = process_update(user, key, value, n, insert)
+    if not name:
+        frappe.throw(
+            _("No Datafield {0} for user {1}").format(key, user),
+            frappe.DoesNotExistError,
+        )
+    return {"queued": False, "datafield": name}
+
+
+@frappe.whitelist()
+def get_ingest_status() -> Dict:
+    frappe.only_for("System Manager")
+    depth = get_queue_depth()
+    return {"partitions": depth, "total": sum(depth.values())}
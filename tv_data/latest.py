@@ -0,0 +1,145 @@
+import json
+from datetime import datetime
+from typing import Dict, Optional
+
+import frappe
+from frappe import _
+
+from tv_data.matrix import parse_symbols
+from tv_data.metrics import metrics
+
+LATEST_KEY = "tv_data:latest"
+# Set once the map is complete; evicted together with it, never a Datafield name
+BUILT_FIELD = "__built__"
+REBUILD_LOCK_KEY = "tv_data:latest:rebuild"
+REBUILD_LOCK_TIMEOUT = 300
+REBUILD_CHUNK = 1000
+MAX_KEYS = 5000
+
+
+def encode(value: float, n: Optional[int], timestamp: Optional[datetime]) -> str:
+    timestamp = timestamp or datetime.now()
+    return json.dumps({"value": value, "n": n, "timestamp": timestamp.timestamp()})
+
+
+def stage_latest(
+    pipe, datafield: str, value: float, n: Optional[int], timestamp: Optional[datetime]
+) -> None:
+    """Add the write of a latest value to `pipe`, so it lands with the pipeline's other writes.
+
+    Callers execute the pipeline after the database commit.
+    """
+    # Raw pipeline: RedisWrapper.hset would pickle the payload
+    pipe.hset(frappe.cache.make_key(LATEST_KEY), datafield, encode(value, n, timestamp))
+
+
+def set_latest(
+    datafield: str,
+    value: float,
+    n: Optional[int],
+    timestamp: Optional[datetime] = None,
+) -> None:
+    """Write the latest value once the transaction commits; a rollback leaves the map alone."""
+
+    def write():
+        pipe = frappe.cache.pipeline()
+        stage_latest(pipe, datafield, value, n, timestamp)
+        pipe.execute()
+
+    frappe.db.after_commit.add(write)
+
+
+def delete_latest(datafield: str) -> None:
+    def delete():
+        pipe = frappe.cache.pipeline()
+        pipe.hdel(frappe.cache.make_key(LATEST_KEY), datafield)
+        pipe.execute()
+
+    frappe.db.after_commit.add(delete)
+
+
+@metrics.timed()
+def rebuild_latest() -> int:
+    """Fill the map from the database after Redis lost it.
+
+    Entries are only added where missing, so values written by updates
+    while the rebuild reads the table are not overwritten by older rows.
+    """
+    key = frappe.cache.make_key(LATEST_KEY)
+    rows = frappe.get_all("Datafield", fields=["name", "value", "n", "modified"])
+    for i in range(0, len(rows), REBUILD_CHUNK):
+        pipe = frappe.cache.pipeline()
+        for row in rows[i : i + REBUILD_CHUNK]:
+            pipe.hsetnx(key, row.name, encode(row.value, row.n, row.modified))
+        pipe.execute()
+    pipe = frappe.cache.pipeline()
+    pipe.hset(key, BUILT_FIELD, 1)
+    pipe.execute()
+    metrics.inc("latest_rebuilds")
+    return len(rows)
+
+
+def ensure_latest() -> bool:
+    """Rebuild the lost map; False if another worker is already rebuilding it."""
+    lock = frappe.cache.make_key(REBUILD_LOCK_KEY)
+    if not frappe.cache.set(lock, 1, nx=True, ex=REBUILD_LOCK_TIMEOUT):
+        return False
+    try:
+        rebuild_latest()
+    finally:
+        frappe.cache.delete(lock)
+    return True
+
+
+def read_latest(names) -> Optional[Dict[str, Optional[Dict]]]:
+    """Entries of `names`, or None if the map was lost, e.g. evicted by Redis.
+
+    Updates recreate the hash without `BUILT_FIELD`, so a lost map is told
+    from the hash itself, in the same HMGET.
+    """
+    pipe = frappe.cache.pipeline()
+    pipe.hmget(frappe.cache.make_key(LATEST_KEY), [BUILT_FIELD, *names])
+    built, *payloads = pipe.execute()[0]
+    if not built:
+        return None
+    return {
+        name: json.loads(payload) if payload else None
+        for name, payload in zip(names, payloads)
+    }
+
+
+def read_from_db(names) -> Dict[str, Optional[Dict]]:
+    latest = dict.fromkeys(names)
+    for row in frappe.get_all(
+        "Datafield",
+        filters={"name": ["in", names]},
+        fields=["name", "value", "n", "modified"],
+    ):
+        latest[row.name] = json.loads(encode(row.value, row.n, row.modified))
+    return latest
+
+
+@frappe.whitelist(allow_guest=True)
+def get_latest(keys) -> Dict[str, Optional[Dict]]:
+    """Latest `value`, `n` and `timestamp` (epoch seconds) of each symbol, null if unknown.
+
+    Served from one Redis hash with a single HMGET, whatever the number of
+    symbols.
+    """
+    if not frappe.has_permission("Datafield", "read"):
+        frappe.throw(_("No permission for Datafield"), frappe.PermissionError)
+    names = parse_symbols(keys)
+    if len(names) > MAX_KEYS:
+        frappe.throw(_("At most {0} keys per request").format(MAX_KEYS))
+    if not names:
+        return {}
+
+    with metrics.timer("get_latest"):
+        latest = read_latest(names)
+        if latest is None and ensure_latest():
+            latest = read_latest(names)
+        if latest is None:
+            # Another worker is still rebuilding
+            metrics.inc("latest_db_reads")
+            return read_from_db(names)
+        return latest
@@ -0,0 +1,381 @@
+"""Line-protocol ingestion daemon.
+
+Accepts one point per line over TCP and UDP:
+
+    user,key value [n] [ts]
+
+`ts` is epoch seconds or milliseconds and defaults to the arrival time.
+Points are buffered and written in batches, one multi-row insert into
+`Datafield Update Table` per batch, so the cost of a point is a few parsed
+bytes instead of a request. Only existing Datafields are updated; points for
+unknown keys are counted and dropped. A batch that fails to write stays
+buffered and is retried with backoff, reconnecting to the database first if
+the connection was lost. Batches are written on a worker thread, so the
+event loop keeps reading sockets while the database is slow.
+
+The daemon trusts its peers and binds to localhost by default. Run it with
+`bench --site <site> tv-data-line-daemon`, or under supervisor:
+
+    [program:frappe-bench-tv-data-line-daemon]
+    command=bench --site <site> tv-data-line-daemon --tcp-port 8094 --udp-port 8094
+    directory=/home/frappe/frappe-bench/sites
+    autorestart=true
+"""
+
+import asyncio
+import contextvars
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import frappe
+from frappe.utils import now_datetime
+
+from tv_data.metrics import metrics
+from tv_data.realtime import queue_update
+from tv_data.series import DATE_STRING_FORMAT
+from tv_data.tv_data.doctype.datafield.datafield import (
+    bump_change_counter,
+    propagate_formulas,
+)
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_BATCH_INTERVAL = 0.5
+MAX_LINE = 1024
+NAME_TTL = 60
+# A failed batch is retried after 1, 2, 4, ... seconds, at most MAX_RETRY_DELAY
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+MAX_RETRIES = 8
+# Points kept while the database is unavailable, in batches; the oldest go first
+MAX_BUFFERED_BATCHES = 20
+UPDATE_FIELDS = (
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "docstatus",
+    "idx",
+    "parent",
+    "parenttype",
+    "parentfield",
+    "date_string",
+    "time_received",
+    "value",
+    "n",
+)
+
+Point = Tuple[str, str, float, Optional[int], float]
+
+
+def parse_line(line: bytes) -> Point:
+    """Parse `user,key value [n] [ts]` into `(user, KEY, value, n, timestamp)`."""
+    ident, _, fields = line.strip().partition(b" ")
+    user, _, key = ident.partition(b",")
+    if not user or not key:
+        raise ValueError("expected user,key")
+
+    fields = fields.split()
+    if not fields:
+        raise ValueError("missing value")
+    value = float(fields[0])
+    n = int(fields[1]) if len(fields) > 1 else None
+    timestamp = float(fields[2]) if len(fields) > 2 else time.time()
+    if timestamp > 1e11:
+        timestamp /= 1000
+    return user.decode(), key.decode().upper(), value, n, timestamp
+
+
+def log_error(message: str) -> None:
+    try:
+        frappe.log_error(message, "Datafield Line Daemon Error")
+    except Exception:
+        # The database may be the thing that is down
+        frappe.logger("tv_data").exception(message)
+
+
+class PointWriter:
+    """Buffers points and writes them in batches of `batch_size` or every `interval`.
+
+    `add` may run on another thread than `flush`; `on_full` is called once a
+    batch is buffered and flushes in place unless the caller schedules it.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        interval: float,
+        on_full: Optional[Callable[[], None]] = None,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_full = on_full or self.flush
+        self.lock = threading.Lock()
+        self.buffer: List[Point] = []
+        self.names: Dict[Tuple[str, str], Optional[str]] = {}
+        self.names_loaded = time.monotonic()
+        self.invalid = 0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.committed = False
+
+    def add(self, line: bytes) -> None:
+        try:
+            point = parse_line(line)
+        except (ValueError, UnicodeDecodeError):
+            self.invalid += 1
+            metrics.inc("line_daemon_invalid")
+            return
+        with self.lock:
+            self.buffer.append(point)
+            overflow = len(self.buffer) - self.batch_size * MAX_BUFFERED_BATCHES
+            if overflow > 0:
+                del self.buffer[:overflow]
+                metrics.inc("line_daemon_dropped", overflow)
+            full = len(self.buffer) >= self.batch_size
+        if full:
+            self.on_full()
+
+    def resolve(self, points: List[Point]) -> None:
+        """Resolve unseen (user, key) pairs the same way `get_doc_from_user_key` does."""
+        # Forget unknown and deleted keys now and then so new Datafields are picked up
+        if time.monotonic() - self.names_loaded > NAME_TTL:
+            self.names.clear()
+            self.names_loaded = time.monotonic()
+        missing = {(user, key) for user, key, *_ in points} - self.names.keys()
+        for user in {user for user, _key in missing}:
+            keys = [key for u, key in missing if u == user]
+            rows = frappe.get_all(
+                "Datafield",
+                filters={"user": user, "key": ["in", keys]},
+                fields=["name", "key"],
+            )
+            found = {row.key: row.name for row in rows}
+            for key in keys:
+                self.names[(user, key)] = found.get(key)
+
+    def get_next_idx(self, parents: Tuple[str, ...]) -> Dict[str, int]:
+        rows = frappe.db.sql(
+            """
+            select parent, max(idx)
+            from `tabDatafield Update Table`
+            where parent in %(parents)s and parentfield = 'datafield_update_table'
+            group by parent
+            """,
+            {"parents": parents},
+        )
+        return {parent: idx for parent, idx in rows}
+
+    def recover(self) -> None:
+        """Roll back a failed batch, reconnecting if the connection itself is gone."""
+        try:
+            frappe.db.rollback()
+            return
+        except Exception:
+            pass
+        try:
+            frappe.db.close()
+        except Exception:
+            pass
+        frappe.connect()
+
+    def flush(self, force: bool = False) -> int:
+        """Write the buffer in batches; a failed batch is put back and retried later."""
+        if not force and time.monotonic() < self.retry_at:
+            return 0
+
+        written = 0
+        try:
+            while True:
+                # Taken out of the buffer, so `add` can trim it meanwhile
+                with self.lock:
+                    points = self.buffer[: self.batch_size]
+                    del self.buffer[: len(points)]
+                if not points:
+                    break
+                self.committed = False
+                try:
+                    with metrics.timer("line_daemon_flush"):
+                        written += self.write(points)
+                except Exception as e:
+                    if not self.committed:
+                        self.retry(points, e)
+                        break
+                    # The points are stored; writing them again would duplicate them
+                    log_error(f"Error after writing {len(points)} points: {str(e)}")
+                self.failures = 0
+        finally:
+            metrics.maybe_flush()
+        return written
+
+    def retry(self, points: List[Point], error: Exception) -> None:
+        self.failures += 1
+        # Deleted Datafields would keep failing the batch; resolve them again
+        self.names.clear()
+        try:
+            self.recover()
+        except Exception:
+            # Still unavailable: the next retry reconnects again
+            pass
+
+        if self.failures > MAX_RETRIES:
+            self.failures = 0
+            metrics.inc("line_daemon_dropped", len(points))
+        else:
+            with self.lock:
+                self.buffer[:0] = points
+            delay = min(RETRY_DELAY * 2 ** (self.failures - 1), MAX_RETRY_DELAY)
+            self.retry_at = time.monotonic() + delay
+            metrics.inc("line_daemon_retries")
+        log_error(f"Error writing {len(points)} points: {str(error)}")
+
+    def mark_committed(self) -> None:
+        self.committed = True
+
+    def write(self, points: List[Point]) -> int:
+        self.resolve(points)
+        now = now_datetime()
+        user = frappe.session.user
+        latest: Dict[str, Point] = {}
+        rows = []
+
+        parents = {self.names[(point[0], point[1])] for point in points} - {None}
+        idx = self.get_next_idx(tuple(parents)) if parents else {}
+        for point in points:
+            name = self.names[(point[0], point[1])]
+            if not name:
+                metrics.inc("line_daemon_unknown")
+                continue
+            idx[name] = idx.get(name, 0) + 1
+            latest[name] = point
+            time_received = datetime.fromtimestamp(point[4])
+            rows.append(
+                (frappe.generate_hash(length=10), now, now, user, user, 0, idx[name])
+                + (name, "Datafield", "datafield_update_table")
+                + (
+                    time_received.strftime(DATE_STRING_FORMAT),
+                    time_received,
+                    point[2],
+                    point[3],
+                )
+            )
+
+        if rows:
+            # Runs first after the commit, ahead of the callbacks added below
+            frappe.db.after_commit.add(self.mark_committed)
+            frappe.db.bulk_insert("Datafield Update Table", UPDATE_FIELDS, rows)
+            for name, (_user, _key, value, n, timestamp) in latest.items():
+                values = {"value": value}
+                if n is not None:
+                    values["n"] = n
+                frappe.db.set_value("Datafield", name, values, update_modified=False)
+                queue_update(name, value, n, datetime.fromtimestamp(timestamp))
+            propagate_formulas(latest)
+            frappe.db.after_commit.add(bump_change_counter)
+            frappe.db.commit()
+
+        metrics.inc("line_daemon_points", len(rows))
+        return len(rows)
+
+
+class LineProtocol(asyncio.Protocol):
+    def __init__(self, writer: PointWriter):
+        self.writer = writer
+        self.pending = b""
+
+    def data_received(self, data: bytes) -> None:
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+        if len(self.pending) > MAX_LINE:
+            self.pending = b""
+            self.writer.invalid += 1
+        for line in lines:
+            if line:
+                self.writer.add(line)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if self.pending:
+            self.writer.add(self.pending)
+
+
+class DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, writer: PointWriter):
+        self.writer = writer
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        for line in data.split(b"\n"):
+            if line:
+                self.writer.add(line)
+
+
+async def serve(
+    host: str,
+    tcp_port: Optional[int],
+    udp_port: Optional[int],
+    batch_size: int,
+    interval: float,
+) -> None:
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    writer = PointWriter(batch_size, interval, on_full=wake.set)
+    # One thread, so the site's database connection is never used concurrently;
+    # the copied context carries `frappe.local` over to it
+    executor = ThreadPoolExecutor(max_workers=1)
+    context = contextvars.copy_context()
+
+    def in_worker(func, *args):
+        return loop.run_in_executor(executor, context.run, func, *args)
+
+    stop = loop.create_future()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+
+    servers = []
+    if tcp_port:
+        servers.append(
+            await loop.create_server(lambda: LineProtocol(writer), host, tcp_port)
+        )
+    if udp_port:
+        transport, _protocol = await loop.create_datagram_endpoint(
+            lambda: DatagramProtocol(writer), local_addr=(host, udp_port)
+        )
+        servers.append(transport)
+    print(f"Listening on {host} (tcp: {tcp_port}, udp: {udp_port})")
+
+    try:
+        while not stop.done():
+            woken = loop.create_task(wake.wait())
+            await asyncio.wait([stop, woken], timeout=interval)
+            woken.cancel()
+            wake.clear()
+            await in_worker(writer.flush)
+    finally:
+        for server in servers:
+            server.close()
+        await in_worker(writer.flush, True)
+        await in_worker(metrics.flush)
+        executor.shutdown()
+
+
+def run(
+    host: str = "127.0.0.1",
+    tcp_port: Optional[int] = 8094,
+    udp_port: Optional[int] = 8094,
+    batch_size: Optional[int] = None,
+    interval: Optional[float] = None,
+) -> None:
+    """Serve until SIGINT/SIGTERM; expects `frappe.connect()` to have been called."""
+    defaults = frappe.get_single("TV Data Settings").defaults
+    asyncio.run(
+        serve(
+            host,
+            tcp_port,
+            udp_port,
+            batch_size or defaults.line_daemon_batch_size or DEFAULT_BATCH_SIZE,
+            interval or defaults.line_daemon_interval or DEFAULT_BATCH_INTERVAL,
+        )
+    )
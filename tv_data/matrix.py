@@ -0,0 +1,159 @@
+"""Time-aligned bars of several Datafields as one matrix.
+
+`get_matrix` answers with a shared time axis `t` and `values[i][j]`, the
+field of symbol `j` at `t[i]`, so dashboards comparing symbols need one
+request instead of one per symbol plus a client-side join on date_string.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import frappe
+import numpy as np
+from frappe import _
+from frappe.utils import cint
+
+from tv_data.metrics import metrics
+from tv_data.replica import replica_read
+from tv_data.series import date_string_to_timestamp, timestamp_to_date_string
+
+MAX_SYMBOLS = 100
+FIELDS = ("open", "high", "low", "close", "volume")
+FILLS = ("ffill", "nan")
+
+
+def fold_days(
+    columns: np.ndarray, times: np.ndarray, values: np.ndarray, field: str
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fold rows sharing a (column, time) into one bar value, like `rows_to_bars`.
+
+    Rows must be ordered by column, then time.
+    """
+    if not len(values):
+        return columns, times, values
+    starts = np.flatnonzero(
+        np.concatenate(
+            ([True], (columns[1:] != columns[:-1]) | (times[1:] != times[:-1]))
+        )
+    )
+    if field == "open":
+        folded = values[starts]
+    elif field == "close":
+        folded = values[np.append(starts[1:], len(values)) - 1]
+    elif field == "high":
+        folded = np.maximum.reduceat(values, starts)
+    elif field == "low":
+        folded = np.minimum.reduceat(values, starts)
+    else:
+        folded = np.add.reduceat(values, starts)
+    return columns[starts], times[starts], folded
+
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """Replace NaN cells with the last value above them in the same column."""
+    rows = np.arange(len(matrix))[:, None]
+    last = np.maximum.accumulate(np.where(np.isnan(matrix), 0, rows), axis=0)
+    return matrix[last, np.arange(matrix.shape[1])]
+
+
+def align(
+    count: int,
+    columns: np.ndarray,
+    times: np.ndarray,
+    values: np.ndarray,
+    fill: str = "ffill",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge-join per-column series into a matrix over the union of their times."""
+    axis, rows = np.unique(times, return_inverse=True)
+    matrix = np.full((len(axis), count), np.nan)
+    matrix[rows, columns] = values
+    if fill == "ffill" and len(axis):
+        matrix = forward_fill(matrix)
+    return axis, matrix
+
+
+def get_rows(
+    symbols: List[str], field: str, start: Optional[int], end: Optional[int]
+) -> List[Tuple]:
+    conditions = ["parent in %(symbols)s", "parentfield = 'datafield_series_table'"]
+    values = {"symbols": tuple(symbols)}
+    if start is not None:
+        conditions.append("date_string >= %(start)s")
+        values["start"] = timestamp_to_date_string(start)
+    if end is not None:
+        conditions.append("date_string <= %(end)s")
+        values["end"] = timestamp_to_date_string(end)
+
+    return frappe.db.sql(
+        f"""
+        select parent, date_string, {field}
+        from `tabDatafield Series`
+        where {" and ".join(conditions)}
+        order by parent asc, date_string asc, idx asc
+        """,
+        values,
+    )
+
+
+def parse_symbols(symbols) -> List[str]:
+    if isinstance(symbols, str):
+        symbols = (
+            frappe.parse_json(symbols)
+            if symbols.lstrip().startswith("[")
+            else symbols.split(",")
+        )
+    return list(dict.fromkeys(s.strip() for s in symbols if s and s.strip()))
+
+
+@frappe.whitelist(allow_guest=True)
+@replica_read()
+def get_matrix(
+    symbols,
+    field: str = "close",
+    fill: str = "ffill",
+    **kwargs,
+) -> Dict:
+    """One bar field of several Datafields on a shared daily time axis.
+
+    Gaps are forward-filled (`fill=ffill`, leading gaps stay empty) or left
+    empty (`fill=nan`); empty cells are returned as null. `from`/`to` bound
+    the range in epoch seconds like the UDF `history` endpoint.
+    """
+    symbols = parse_symbols(symbols)
+    if not symbols:
+        frappe.throw(_("At least one symbol is required"))
+    if len(symbols) > MAX_SYMBOLS:
+        frappe.throw(_("At most {0} symbols per request").format(MAX_SYMBOLS))
+    if field not in FIELDS:
+        frappe.throw(_("Field must be one of {0}").format(", ".join(FIELDS)))
+    if fill not in FILLS:
+        frappe.throw(_("Fill must be one of {0}").format(", ".join(FILLS)))
+    for symbol in symbols:
+        if not frappe.has_permission("Datafield", "read", doc=symbol):
+            frappe.throw(_("No permission for Datafield"), frappe.PermissionError)
+
+    start, end = cint(kwargs.get("from")) or None, cint(kwargs.get("to")) or None
+    with metrics.timer("get_matrix"):
+        rows = get_rows(symbols, field, start, end)
+        if not rows:
+            return {"symbols": symbols, "field": field, "t": [], "values": []}
+        index = {symbol: i for i, symbol in enumerate(symbols)}
+        columns = np.fromiter((index[row[0]] for row in rows), int, len(rows))
+        # Days are joined on their index among the distinct date_strings,
+        # which sort like the dates themselves
+        dates, days = np.unique([row[1] for row in rows], return_inverse=True)
+        # NULLs are gaps, like days without rows, not zeros
+        values = np.fromiter(
+            (np.nan if row[2] is None else row[2] for row in rows), float, len(rows)
+        )
+
+        axis, matrix = align(
+            len(symbols), *fold_days(columns, days, values, field), fill=fill
+        )
+        cells = matrix.astype(object)
+        cells[np.isnan(matrix)] = None
+        return {
+            "symbols": symbols,
+            "field": field,
+            "t": [date_string_to_timestamp(date) for date in dates[axis]],
+            "values": cells.tolist(),
+        }
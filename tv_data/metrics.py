@@ -0,0 +1,197 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+import frappe
+
+METRICS_CACHE_KEY = "tv_data:metrics"
+METRICS_PREFIX = "tv_data"
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+
+class MetricsRegistry:
+    """In-process counters and latency histograms, flushed into `frappe.cache`.
+
+    Observations only touch a local dict under a lock; `flush` pushes the
+    accumulated deltas to a Redis hash with one pipelined round trip so all
+    workers aggregate into the same totals.
+    """
+
+    def __init__(
+        self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, flush_interval: int = 10
+    ):
+        self.buckets = tuple(sorted(buckets))
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._sums: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+
+    def inc(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            field = f"counter|{name}"
+            self._counters[field] = self._counters.get(field, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        index = bisect_left(self.buckets, seconds)
+        le = str(self.buckets[index]) if index < len(self.buckets) else "+Inf"
+        with self._lock:
+            for field in (f"hist|{name}|count", f"hist|{name}|le={le}"):
+                self._counters[field] = self._counters.get(field, 0) + 1
+            field = f"hist|{name}|sum"
+            self._sums[field] = self._sums.get(field, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(f"{name}_errors")
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start)
+            self.maybe_flush()
+
+    def timed(self, name: Optional[str] = None):
+        def decorator(func):
+            metric_name = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(metric_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def maybe_flush(self) -> None:
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            counters, sums = self._counters, self._sums
+            self._counters, self._sums = {}, {}
+            self._last_flush = time.monotonic()
+
+        if not counters and not sums:
+            return
+
+        try:
+            key = frappe.cache.make_key(METRICS_CACHE_KEY)
+            pipe = frappe.cache.pipeline()
+            for field, value in counters.items():
+                pipe.hincrby(key, field, value)
+            for field, value in sums.items():
+                pipe.hincrbyfloat(key, field, value)
+            pipe.execute()
+        except Exception as e:
+            # Metrics must never break the caller; keep the deltas for the next flush
+            with self._lock:
+                for field, value in counters.items():
+                    self._counters[field] = self._counters.get(field, 0) + value
+                for field, value in sums.items():
+                    self._sums[field] = self._sums.get(field, 0.0) + value
+            frappe.logger("tv_data").warning(f"Failed to flush metrics: {str(e)}")
+
+    def collect(self) -> Dict[str, Dict]:
+        self.flush()
+        # Read through a raw pipeline: RedisWrapper.hgetall expects pickled values
+        pipe = frappe.cache.pipeline()
+        pipe.hgetall(frappe.cache.make_key(METRICS_CACHE_KEY))
+        raw = pipe.execute()[0] or {}
+
+        counters: Dict[str, int] = {}
+        histograms: Dict[str, Dict] = {}
+        for field, value in raw.items():
+            field = frappe.safe_decode(field)
+            value = frappe.safe_decode(value)
+            parts = field.split("|")
+            if parts[0] == "counter":
+                counters[parts[1]] = int(value)
+            elif parts[0] == "hist":
+                hist = histograms.setdefault(
+                    parts[1], {"count": 0, "sum": 0.0, "buckets": {}}
+                )
+                if parts[2] == "count":
+                    hist["count"] = int(value)
+                elif parts[2] == "sum":
+                    hist["sum"] = float(value)
+                else:
+                    hist["buckets"][parts[2][3:]] = int(value)
+
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self, data: Optional[Dict[str, Dict]] = None) -> str:
+        data = data or self.collect()
+        lines = []
+
+        for name, value in sorted(data["counters"].items()):
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        for name, hist in sorted(data["histograms"].items()):
+            metric = f"{METRICS_PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound in [str(b) for b in self.buckets] + ["+Inf"]:
+                cumulative += hist["buckets"].get(bound, 0)
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum {hist['sum']}")
+            lines.append(f"{metric}_count {hist['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters, self._sums = {}, {}
+        frappe.cache.delete(frappe.cache.make_key(METRICS_CACHE_KEY))
+
+
+metrics = MetricsRegistry()
+
+
+def flush() -> None:
+    metrics.flush()
+
+
+@frappe.whitelist()
+def get_metrics(fmt: str = "json"):
+    frappe.only_for("System Manager")
+
+    if fmt == "prometheus":
+        from werkzeug.wrappers import Response
+
+        return Response(
+            metrics.to_prometheus(),
+            mimetype="text/plain; version=0.0.4",
+        )
+
+    return metrics.collect()
+
+
+@frappe.whitelist()
+def reset_metrics() -> None:
+    frappe.only_for("System Manager")
+    metrics.reset()
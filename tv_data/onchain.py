@@ -0,0 +1,310 @@
+"""On-chain ingestion bridge for the data point contract (`poc/abstract/smart_contract.md`).
+
+Instead of one `getDataPoints` call per user and poll, the bridge reads the
+contract's `DataPointAdded` events for all configured addresses at once:
+the block range since the last checkpoint is split into `eth_getLogs`
+windows, windows are sent as JSON-RPC batches, and batches are fetched
+concurrently over a pooled HTTP session. Decoded points are written with
+the line daemon's `PointWriter`, one multi-row insert per poll, and the
+last processed block is checkpointed in the same transaction.
+"""
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import frappe
+import requests
+from frappe.utils import cint
+from requests.adapters import HTTPAdapter
+
+from tv_data.line_daemon import Point, PointWriter
+from tv_data.metrics import metrics
+
+# keccak256("DataPointAdded(address,int256,int256,uint256)"), emitted as
+# DataPointAdded(address indexed user, int256 integerValue, int256 floatValue, uint256 timestamp)
+DATA_POINT_ADDED_TOPIC = (
+    "0x38cb696c9cb1ad343242892d9d095cc1c1753dfd51c6656f009d16f34d21ee27"
+)
+FIXED_POINT = 10**18
+LOCK_KEY = "tv_data:onchain:lock"
+LOCK_TIMEOUT = 600
+DEFAULT_WINDOW = 2000
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_BLOCKS = 200_000
+# Nodes reject a log query over their result or block-range limit under codes
+# they also use for other errors; only the message tells the two apart
+RANGE_ERROR_CODES = (-32000, -32005, -32602, -32614)
+RANGE_ERROR_MESSAGES = (
+    "more than",
+    "too many results",
+    "too many logs",
+    "block range",
+    "range is too",
+    "range too",
+    "response size",
+)
+
+
+class RpcError(Exception):
+    def __init__(self, error):
+        super().__init__(error)
+        error = error if isinstance(error, dict) else {}
+        self.code = error.get("code")
+        self.message = str(error.get("message") or "")
+
+    def is_range_error(self) -> bool:
+        """Whether the node refused the query for returning too many logs."""
+        message = self.message.lower()
+        return self.code in RANGE_ERROR_CODES and any(
+            text in message for text in RANGE_ERROR_MESSAGES
+        )
+
+
+class RpcClient:
+    """Minimal JSON-RPC 2.0 client sending batched calls over one pooled session."""
+
+    def __init__(self, url: str, pool_size: int = DEFAULT_CONCURRENCY, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        self.ids = itertools.count(1)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def batch(self, calls: List[Tuple[str, list]]) -> List:
+        """Send `(method, params)` calls as one request.
+
+        Results come back in call order; a failed call yields an `RpcError`
+        in its place so the caller can retry it alone.
+        """
+        payload = [
+            {"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": params}
+            for method, params in calls
+        ]
+        with metrics.timer("onchain_rpc"):
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        if isinstance(body, dict):
+            # Some nodes answer a rejected batch with a single error object
+            raise RpcError(body.get("error") or body)
+
+        # Replies may come in any order
+        replies = {reply.get("id"): reply for reply in body}
+        results = []
+        for request in payload:
+            reply = replies.get(request["id"])
+            if reply is None:
+                results.append(RpcError(f"No reply to {request['method']}"))
+            elif reply.get("error"):
+                results.append(RpcError(reply["error"]))
+            else:
+                results.append(reply.get("result"))
+        metrics.inc("onchain_rpc_calls", len(calls))
+        return results
+
+    def call(self, method: str, params: list):
+        result = self.batch([(method, params)])[0]
+        if isinstance(result, RpcError):
+            raise result
+        return result
+
+
+def get_windows(start: int, end: int, size: int) -> List[Tuple[int, int]]:
+    """Split the inclusive block range `[start, end]` into windows of `size` blocks."""
+    return [(a, min(a + size - 1, end)) for a in range(start, end + 1, size)]
+
+
+def to_signed(word: str) -> int:
+    value = int(word, 16)
+    return value - 2**256 if value >= 2**255 else value
+
+
+def decode_log(log: Dict) -> Tuple[str, int, float, float]:
+    """Decode a `DataPointAdded` log into `(address, integer, float, timestamp)`."""
+    address = "0x" + log["topics"][1][-40:].lower()
+    data = log["data"][2:]
+    integer, fixed, timestamp = (data[i : i + 64] for i in range(0, 192, 64))
+    return (
+        address,
+        to_signed(integer),
+        to_signed(fixed) / FIXED_POINT,
+        float(int(timestamp, 16)),
+    )
+
+
+def address_topic(address: str) -> str:
+    return "0x" + address.lower()[2:].rjust(64, "0")
+
+
+class Bridge:
+    """Fetches and decodes the contract's data point events for a set of addresses."""
+
+    def __init__(
+        self,
+        client: RpcClient,
+        contract: str,
+        addresses: List[str],
+        topic: str = DATA_POINT_ADDED_TOPIC,
+        window: int = DEFAULT_WINDOW,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ):
+        self.client = client
+        self.contract = contract
+        self.topics = [topic, [address_topic(address) for address in addresses]]
+        self.window = window
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+    def get_head(self) -> int:
+        return int(self.client.call("eth_blockNumber", []), 16)
+
+    def fetch_batch(self, windows: List[Tuple[int, int]]) -> List[Dict]:
+        results = self.client.batch(
+            [
+                (
+                    "eth_getLogs",
+                    [
+                        {
+                            "address": self.contract,
+                            "fromBlock": hex(start),
+                            "toBlock": hex(end),
+                            "topics": self.topics,
+                        }
+                    ],
+                )
+                for start, end in windows
+            ]
+        )
+        logs = []
+        for (start, end), result in zip(windows, results):
+            if not isinstance(result, RpcError):
+                logs.extend(result)
+            elif end > start and result.is_range_error():
+                # Nodes cap the logs per response; retry the window in halves
+                middle = (start + end) // 2
+                logs.extend(self.fetch_batch([(start, middle), (middle + 1, end)]))
+            else:
+                raise result
+        return logs
+
+    def fetch_logs(self, start: int, end: int) -> List[Dict]:
+        windows = get_windows(start, end, self.window)
+        batches = [
+            windows[i : i + self.batch_size]
+            for i in range(0, len(windows), self.batch_size)
+        ]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            logs = [
+                log for batch in pool.map(self.fetch_batch, batches) for log in batch
+            ]
+        return sorted(
+            (log for log in logs if not log.get("removed")),
+            key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)),
+        )
+
+
+def get_points(logs: List[Dict], datafields: Dict[str, Tuple[str, str]]) -> List[Point]:
+    """Turn logs into line daemon points for the Datafield `(user, key)` of each address."""
+    points = []
+    for log in logs:
+        address, integer, value, timestamp = decode_log(log)
+        if address in datafields:
+            user, key = datafields[address]
+            points.append((user, key, value, integer, timestamp))
+    return points
+
+
+def get_sources(settings) -> Dict[str, Tuple[str, str]]:
+    names = {
+        source.address.lower(): source.datafield for source in settings.onchain_sources
+    }
+    rows = frappe.get_all(
+        "Datafield",
+        filters={"name": ["in", list(set(names.values()))]},
+        fields=["name", "user", "key"],
+    )
+    datafields = {row.name: (row.user, row.key) for row in rows}
+    return {
+        address: datafields[name]
+        for address, name in names.items()
+        if name in datafields
+    }
+
+
+def sync(settings) -> Optional[Dict]:
+    defaults = settings.defaults
+    sources = get_sources(settings)
+    if not sources:
+        return None
+
+    concurrency = cint(defaults.onchain_concurrency) or DEFAULT_CONCURRENCY
+    bridge = Bridge(
+        RpcClient(settings.onchain_rpc_url, pool_size=concurrency),
+        settings.onchain_contract,
+        list(sources),
+        topic=settings.onchain_event_topic or DATA_POINT_ADDED_TOPIC,
+        window=cint(defaults.onchain_window) or DEFAULT_WINDOW,
+        batch_size=cint(defaults.onchain_batch_size) or DEFAULT_BATCH_SIZE,
+        concurrency=concurrency,
+    )
+
+    head = bridge.get_head() - cint(settings.onchain_confirmations)
+    start = (
+        cint(settings.onchain_last_block) + 1
+        if settings.onchain_last_block
+        else cint(settings.onchain_start_block)
+    )
+    end = min(
+        head, start + (cint(defaults.onchain_max_blocks) or DEFAULT_MAX_BLOCKS) - 1
+    )
+    if end < start:
+        return None
+
+    with metrics.timer("onchain_sync"):
+        logs = bridge.fetch_logs(start, end)
+        points = get_points(logs, sources)
+        # Committed together with the points by `PointWriter.write`
+        frappe.db.set_single_value("TV Data Settings", "onchain_last_block", end)
+        writer = PointWriter(len(points), 0)
+        try:
+            written = writer.write(points) if points else 0
+        except Exception as e:
+            if not writer.committed:
+                raise
+            # Points and checkpoint are stored; the next poll must not refetch them
+            written = len(points)
+            frappe.log_error(
+                f"Error after on-chain sync: {str(e)}", "On-chain Bridge Error"
+            )
+        frappe.db.commit()
+
+    metrics.inc("onchain_logs", len(logs))
+    metrics.observe("onchain_block_lag", head - end)
+    return {"from_block": start, "to_block": end, "logs": len(logs), "points": written}
+
+
+def poll() -> Optional[Dict]:
+    """Scheduled entry point; ingests new contract events if the bridge is enabled."""
+    settings = frappe.get_single("TV Data Settings")
+    if not cint(settings.enable_onchain) or not settings.onchain_rpc_url:
+        return None
+
+    lock = frappe.cache.make_key(LOCK_KEY)
+    if not frappe.cache.set(lock, 1, nx=True, ex=LOCK_TIMEOUT):
+        return None
+    try:
+        result = sync(settings)
+        if result:
+            frappe.logger("tv_data").info(f"On-chain sync: {result}")
+        return result
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Error in on-chain sync: {str(e)}", "On-chain Bridge Error")
+    finally:
+        frappe.cache.delete(lock)
+        metrics.maybe_flush()
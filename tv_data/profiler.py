@@ -0,0 +1,162 @@
+import re
+import sys
+import time
+import random
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+import frappe
+from frappe.utils import cint, flt
+
+APP_PREFIX = "tv_data."
+METHOD_PATH = re.compile(r"^/api/(?:v\d+/)?method/(?P<method>[\w.]+)")
+SCHEDULED_JOB_METHOD = (
+    "frappe.core.doctype.scheduled_job_type.scheduled_job_type.run_scheduled_job"
+)
+
+
+class SamplingProfiler:
+    """Samples the stack of a single thread from a daemon thread.
+
+    The target thread runs unmodified; every `interval` seconds its current
+    frame is walked and counted as a collapsed stack (`a;b;c count`), the
+    format consumed by flamegraph.pl and speedscope. With a `delay`, the
+    daemon thread only waits until then and sampling starts afterwards, so
+    calls that finish sooner cost no samples.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, delay: float = 0.0) -> "SamplingProfiler":
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, args=(delay,), name="tv_data-profiler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.perf_counter() - (self.started_at or time.perf_counter())
+        return self.stacks
+
+    def _run(self, delay: float) -> None:
+        if delay and self._stop.wait(delay):
+            return
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.items())
+
+
+def get_profiling_config() -> Optional[Dict[str, float]]:
+    settings = frappe.get_cached_doc("TV Data Settings")
+    if not cint(settings.enable_profiling):
+        return None
+    return {
+        "sample_rate": flt(settings.profiling_sample_rate),
+        "threshold": flt(settings.profiling_threshold),
+        "interval": max(cint(settings.profiling_interval), 1) / 1000,
+    }
+
+
+def start_profiling(target: str) -> None:
+    if not target or not target.startswith(APP_PREFIX) or target.startswith(__name__):
+        return
+
+    config = get_profiling_config()
+    if not config:
+        return
+
+    sampled = random.random() < config["sample_rate"]
+    if not sampled and config["threshold"] <= 0:
+        return
+
+    # Calls outside the sample are only sampled once they exceed the threshold
+    profiler = SamplingProfiler(interval=config["interval"])
+    frappe.local.tv_data_profile = {
+        "target": target,
+        "sampled": sampled,
+        "threshold": config["threshold"],
+        "profiler": profiler.start(delay=0.0 if sampled else config["threshold"]),
+    }
+
+
+def stop_profiling() -> None:
+    profile = getattr(frappe.local, "tv_data_profile", None)
+    if not profile:
+        return
+    frappe.local.tv_data_profile = None
+
+    profiler = profile["profiler"]
+    profiler.stop()
+
+    slow = 0 < profile["threshold"] <= profiler.duration
+    if (profile["sampled"] or slow) and profiler.stacks:
+        # Persist from a job so the profiled request's transaction is never committed here
+        frappe.enqueue(
+            "tv_data.profiler.save_profile",
+            queue="short",
+            target=profile["target"],
+            content=profiler.collapsed(),
+            duration_ms=int(profiler.duration * 1000),
+        )
+
+
+def save_profile(target: str, content: str, duration_ms: int) -> None:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    method = target.rsplit(".", 1)[-1]
+    frappe.get_doc(
+        {
+            "doctype": "File",
+            "file_name": f"profile_{method}_{timestamp}_{duration_ms}ms.folded",
+            "attached_to_doctype": "TV Data Settings",
+            "attached_to_name": "TV Data Settings",
+            "is_private": 1,
+            "content": content,
+        }
+    ).insert(ignore_permissions=True)
+
+
+def before_request() -> None:
+    match = METHOD_PATH.match(frappe.request.path)
+    if match:
+        start_profiling(match.group("method"))
+
+
+def after_request() -> None:
+    stop_profiling()
+
+
+def before_job(method: str = None, kwargs: dict = None) -> None:
+    # Scheduler jobs are enqueued through run_scheduled_job with the real method as job_type
+    if method == SCHEDULED_JOB_METHOD and kwargs:
+        method = kwargs.get("job_type")
+    start_profiling(method)
+
+
+def after_job() -> None:
+    stop_profiling()
@@ -0,0 +1,241 @@
+import json
+import time
+from typing import Dict, List, Optional
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from tv_data.metrics import metrics
+
+STATE_FIELDS = ("status", "user", "datafields", "done", "current", "deleted", "error")
+JSON_FIELDS = ("datafields", "done", "deleted")
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_PAUSE = 0.1
+PROGRESS_INTERVAL = 1.0
+# A running job that has not reported for this long was interrupted
+STALE_AFTER = 600
+# Linked rows first: `frappe.delete_doc` refuses Datafields that are still linked
+TABLES = (
+    ("Datafield Merged Update", "datafield"),
+    ("Datafield Indicator Value", "datafield"),
+    ("Datafield Indicator", "datafield"),
+    ("Datafield Update Table", "parent"),
+    ("Datafield Series", "parent"),
+)
+
+
+class Purge:
+    """Deletes Datafields and their history in short, throttled transactions.
+
+    Every table is emptied in chunks of `purge_chunk_size` rows (TV Data
+    Settings defaults), each chunk in its own transaction followed by a
+    `purge_pause` second sleep, so row locks are held briefly and ingestion
+    keeps its share of the database. The Datafield itself goes last, when
+    the cascade has nothing left to delete. The job state is a TV Data
+    Purge row written in the same transaction as each chunk, and every step
+    is idempotent, so an interrupted job is resumed by running it again.
+    """
+
+    def __init__(self, purge_id: str):
+        self.purge_id = purge_id
+        self.state = get_state(purge_id)
+        if not self.state:
+            frappe.throw(
+                _("Unknown purge job {0}").format(purge_id), frappe.DoesNotExistError
+            )
+        defaults = frappe.get_cached_doc("TV Data Settings").defaults
+        self.chunk_size = cint(defaults.purge_chunk_size) or DEFAULT_CHUNK_SIZE
+        self.pause = (
+            DEFAULT_PAUSE if defaults.purge_pause is None else flt(defaults.purge_pause)
+        )
+        self._last_publish = 0.0
+
+    def save(self, status: str = "Running", force: bool = False) -> None:
+        """Write the state into the current transaction and publish it now and then."""
+        self.state.update(status=status, updated_at=time.time())
+        set_state(self.purge_id, self.state)
+        if not force and time.monotonic() - self._last_publish < PROGRESS_INTERVAL:
+            return
+        self._last_publish = time.monotonic()
+        frappe.publish_realtime(
+            "tv_data_purge_progress",
+            dict(self.state, purge_id=self.purge_id),
+            user=self.state["user"],
+        )
+
+    def purge_table(self, datafield: str, doctype: str, field: str) -> None:
+        while True:
+            names = frappe.get_all(
+                doctype,
+                filters={field: datafield},
+                pluck="name",
+                limit_page_length=self.chunk_size,
+            )
+            if not names:
+                return
+            frappe.db.delete(doctype, {"name": ["in", names]})
+            deleted = self.state["deleted"]
+            deleted[doctype] = deleted.get(doctype, 0) + len(names)
+            self.save()
+            frappe.db.commit()
+
+            metrics.inc("purge_rows", len(names))
+            if self.pause:
+                time.sleep(self.pause)
+
+    def purge_datafield(self, datafield: str) -> None:
+        with metrics.timer("purge_datafield"):
+            for doctype, field in TABLES:
+                self.purge_table(datafield, doctype, field)
+            if frappe.db.exists("Datafield", datafield):
+                # Rows ingested since their table was emptied go with the cascade
+                frappe.delete_doc("Datafield", datafield, ignore_permissions=True)
+            self.state["done"].append(datafield)
+            self.save(force=True)
+            frappe.db.commit()
+
+    def run(self) -> Dict:
+        self.state["error"] = None
+        self.save(force=True)
+        frappe.db.commit()
+        try:
+            for datafield in self.state["datafields"]:
+                if datafield in self.state["done"]:
+                    continue
+                self.state["current"] = datafield
+                self.purge_datafield(datafield)
+        except Exception as e:
+            frappe.db.rollback()
+            # The rollback undid the last chunk's counts too
+            self.state = get_state(self.purge_id)
+            self.state["error"] = str(e)
+            self.save("Failed", force=True)
+            frappe.db.commit()
+            frappe.log_error(
+                f"Error in purge {self.purge_id}: {str(e)}", "Datafield Purge Error"
+            )
+            raise
+
+        self.state["current"] = None
+        self.save("Completed", force=True)
+        frappe.db.commit()
+        return self.state
+
+
+def get_state(purge_id: str) -> Optional[Dict]:
+    """The state of a purge from its TV Data Purge row, None if there is none."""
+    row = frappe.db.get_value(
+        "TV Data Purge", purge_id, [*STATE_FIELDS, "modified"], as_dict=True
+    )
+    if not row:
+        return None
+    state = {field: row[field] for field in STATE_FIELDS}
+    for field in JSON_FIELDS:
+        state[field] = json.loads(state[field])
+    # Heartbeat of a running job
+    state["updated_at"] = row.modified.timestamp()
+    return state
+
+
+def set_state(purge_id: str, state: Dict) -> None:
+    values = {field: state.get(field) for field in STATE_FIELDS}
+    for field in JSON_FIELDS:
+        values[field] = json.dumps(state[field])
+    frappe.db.set_value("TV Data Purge", purge_id, values)
+
+
+def purge(purge_id: str) -> Dict:
+    return Purge(purge_id).run()
+
+
+def enqueue(purge_id: str) -> None:
+    frappe.enqueue(
+        "tv_data.purge.purge",
+        queue="long",
+        timeout=3600 * 4,
+        # One worker per purge, even if it is resumed twice
+        job_id=f"tv_data_purge:{purge_id}",
+        deduplicate=True,
+        # The job reads the TV Data Purge row this request writes
+        enqueue_after_commit=True,
+        purge_id=purge_id,
+    )
+
+
+def get_status(state: Dict) -> str:
+    if state["status"] == "Running" and time.time() - state["updated_at"] > STALE_AFTER:
+        return "Interrupted"
+    return state["status"]
+
+
+@frappe.whitelist()
+def enqueue_purge(datafields=None, user: Optional[str] = None) -> str:
+    """Purge the given Datafields, or all Datafields of `user`, in the background."""
+    if user:
+        if user != frappe.session.user:
+            frappe.only_for("System Manager")
+        names = frappe.get_all("Datafield", filters={"user": user}, pluck="name")
+    else:
+        names = frappe.parse_json(datafields) if datafields else []
+    if not names:
+        frappe.throw(_("Nothing to purge"))
+    # Checked on the doctype: loading each Datafield would read its whole history
+    if not frappe.has_permission("Datafield", "delete"):
+        frappe.throw(_("No permission to delete Datafields"), frappe.PermissionError)
+    missing = set(names) - set(
+        frappe.get_all("Datafield", filters={"name": ["in", names]}, pluck="name")
+    )
+    if missing:
+        frappe.throw(
+            _("Datafield {0} not found").format(", ".join(sorted(missing))),
+            frappe.DoesNotExistError,
+        )
+
+    purge_id = create_purge(names)
+    enqueue(purge_id)
+    return purge_id
+
+
+def create_purge(names: List[str]) -> str:
+    """Insert the TV Data Purge row of a new job and return its name."""
+    return (
+        frappe.get_doc(
+            {
+                "doctype": "TV Data Purge",
+                "status": "Queued",
+                "user": frappe.session.user,
+                "datafields": json.dumps(names),
+                "done": "[]",
+                "deleted": "{}",
+            }
+        )
+        .insert(ignore_permissions=True)
+        .name
+    )
+
+
+def check_job(purge_id: str) -> Dict:
+    state = get_state(purge_id)
+    if not state:
+        frappe.throw(_("Unknown purge job {0}").format(purge_id))
+    if state["user"] != frappe.session.user:
+        frappe.only_for("System Manager")
+    return state
+
+
+@frappe.whitelist()
+def get_purge_status(purge_id: str) -> Dict:
+    state = check_job(purge_id)
+    state["status"] = get_status(state)
+    state["percent"] = round(100 * len(state["done"]) / len(state["datafields"]), 1)
+    return state
+
+
+@frappe.whitelist()
+def resume_purge(purge_id: str) -> None:
+    """Continue a failed or interrupted purge where it stopped."""
+    state = check_job(purge_id)
+    if get_status(state) not in ("Failed", "Interrupted"):
+        frappe.throw(_("Only failed or interrupted purges can be resumed"))
+    enqueue(purge_id)
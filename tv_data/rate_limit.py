@@ -0,0 +1,133 @@
+import math
+from typing import List, Optional, Tuple
+
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+from tv_data.metrics import metrics
+from tv_data.utils import json_response
+
+BUCKET_KEY = "tv_data:ratelimit:{}:{}"
+
+# Takes one token from every bucket in KEYS, or from none of them.
+# ARGV holds (rate, burst) per key; returns {allowed, retry_after} with the
+# wait as a string because Lua numbers are truncated to integers on return.
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens = {}
+local retry_after = 0
+
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or burst
+    local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+    available = math.min(burst, available + elapsed * rate)
+    tokens[i] = available
+    if available < 1 then
+        retry_after = math.max(retry_after, (1 - available) / rate)
+    end
+end
+
+if retry_after > 0 then
+    return {0, tostring(retry_after)}
+end
+
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return {1, '0'}
+"""
+
+
+class RateLimitExceeded(frappe.TooManyRequestsError):
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(
+            _("Too many updates, retry in {0}s").format(math.ceil(retry_after))
+        )
+
+
+class RateLimiter:
+    """Per-user and per-key token buckets in `frappe.cache`.
+
+    Both buckets are checked and debited by one Lua script, so a request costs
+    a single Redis round trip and concurrent workers never over-spend. Rates
+    are tokens per second from the TV Data Settings defaults table
+    (`rate_limit_user`, `rate_limit_key`); bursts default to one second of
+    tokens. A missing or zero rate disables that bucket.
+    """
+
+    def __init__(self):
+        self._script = None
+        self._script_client = None
+
+    @property
+    def script(self):
+        """The token bucket script, registered once per Redis client."""
+        if self._script is None or self._script_client is not frappe.cache:
+            self._script = frappe.cache.register_script(TOKEN_BUCKET_SCRIPT)
+            self._script_client = frappe.cache
+        return self._script
+
+    def get_buckets(
+        self, user: str, key: Optional[str]
+    ) -> List[Tuple[str, float, float]]:
+        defaults = frappe.get_cached_doc("TV Data Settings").defaults
+        buckets = []
+        for scope, identity in (
+            ("user", user),
+            ("key", key and f"{user}|{key.upper()}"),
+        ):
+            rate = flt(getattr(defaults, f"rate_limit_{scope}"))
+            if rate > 0 and identity:
+                burst = max(
+                    flt(getattr(defaults, f"rate_limit_{scope}_burst")) or rate, 1
+                )
+                buckets.append(
+                    (
+                        frappe.cache.make_key(BUCKET_KEY.format(scope, identity)),
+                        rate,
+                        burst,
+                    )
+                )
+        return buckets
+
+    def check(self, user: str, key: Optional[str] = None) -> float:
+        """Consume a token for the update; return 0 if allowed, else seconds to wait."""
+        buckets = self.get_buckets(user, key)
+        if not buckets:
+            return 0.0
+
+        args = [value for _key, rate, burst in buckets for value in (rate, burst)]
+        allowed, retry_after = self.script(keys=[b[0] for b in buckets], args=args)
+        if int(allowed):
+            return 0.0
+
+        metrics.inc("rate_limited")
+        return float(retry_after)
+
+    def enforce(self, user: str, key: Optional[str] = None) -> None:
+        retry_after = self.check(user, key)
+        if retry_after:
+            raise RateLimitExceeded(retry_after)
+
+
+def rate_limited_response(retry_after: float):
+    return json_response(
+        {
+            "error": _("Too many updates"),
+            "retry_after": round(retry_after, 3),
+        },
+        status=429,
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
+
+
+rate_limiter = RateLimiter()
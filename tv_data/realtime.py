@@ -0,0 +1,112 @@
+import json
+import time
+from datetime import datetime
+from typing import Optional
+
+import frappe
+from frappe.realtime import get_doctype_room
+from frappe.utils import flt
+
+from tv_data.latest import stage_latest
+
+PENDING_KEY = "tv_data:realtime:pending"
+FLUSH_LOCK_KEY = "tv_data:realtime:flush"
+TRAILING_LOCK_KEY = "tv_data:realtime:trailing"
+DEFAULT_INTERVAL = 1.0
+
+
+def get_interval() -> float:
+    settings = frappe.get_cached_doc("TV Data Settings")
+    return flt(settings.defaults.realtime_interval) or DEFAULT_INTERVAL
+
+
+def queue_update(
+    datafield: str, value: float, n: Optional[int], timestamp: Optional[datetime] = None
+) -> None:
+    """Record the latest value of a Datafield for the next realtime tick.
+
+    Pending values live in one Redis hash keyed by Datafield, so a burst of
+    updates to the same symbol overwrites itself and is pushed once per tick.
+    The first update of a tick enqueues the flush job and opens the tick;
+    the first later one enqueues a trailing flush for the end of the tick, so
+    the last value of a burst is never held back longer than one tick. The
+    latest-value map is written in the same Redis transaction, and both only
+    once the database transaction commits.
+    """
+    timestamp = timestamp or datetime.now()
+
+    def publish():
+        # Raw pipeline: RedisWrapper.hset would pickle the payload
+        pipe = frappe.cache.pipeline()
+        pipe.hset(
+            frappe.cache.make_key(PENDING_KEY),
+            datafield,
+            json.dumps({"value": value, "n": n, "timestamp": timestamp.isoformat()}),
+        )
+        stage_latest(pipe, datafield, value, n, timestamp)
+        pipe.execute()
+
+        # Expires by itself, so at most one flush is enqueued per tick
+        lock = frappe.cache.make_key(FLUSH_LOCK_KEY)
+        if frappe.cache.set(lock, 1, nx=True, px=int(get_interval() * 1000)):
+            frappe.enqueue("tv_data.realtime.flush_updates", queue="short")
+            return
+
+        # Gone with the tick, so each tick gets at most one trailing flush
+        remaining = max(frappe.cache.pttl(lock), 0)
+        trailing = frappe.cache.make_key(TRAILING_LOCK_KEY)
+        if frappe.cache.set(trailing, 1, nx=True, px=max(remaining, 1)):
+            frappe.enqueue(
+                "tv_data.realtime.flush_trailing",
+                queue="short",
+                wait=remaining / 1000,
+            )
+
+    frappe.db.after_commit.add(publish)
+
+
+def flush_trailing(wait: float) -> int:
+    """Flush at the end of the tick that enqueued this job.
+
+    `frappe.enqueue` cannot delay a job, so it waits out the rest of the
+    tick itself; that is at most one interval, once per tick.
+    """
+    time.sleep(min(wait, get_interval()))
+    return flush_updates()
+
+
+def flush_updates() -> int:
+    """Push the pending values to each Datafield's form.
+
+    Lists and dashboards get all of them in one message instead.
+    """
+    key = frappe.cache.make_key(PENDING_KEY)
+    pipe = frappe.cache.pipeline()
+    pipe.hgetall(key)
+    pipe.delete(key)
+    pending = pipe.execute()[0] or {}
+
+    updates = []
+    for datafield, payload in pending.items():
+        datafield = frappe.safe_decode(datafield)
+        data = json.loads(payload)
+        frappe.publish_realtime(
+            "datafield_update",
+            {
+                "doc_name": datafield,
+                "message": f"{datafield}: {data['value']}",
+                **data,
+            },
+            doctype="Datafield",
+            docname=datafield,
+        )
+        updates.append({"doc_name": datafield, **data})
+
+    if updates:
+        # Joined by lists and dashboards with frappe.realtime.doctype_subscribe
+        frappe.publish_realtime(
+            "datafield_updates",
+            {"updates": updates},
+            room=get_doctype_room("Datafield"),
+        )
+    return len(pending)
@@ -0,0 +1,163 @@
+"""Replay captured production updates against a local site.
+
+    bench --site test_site execute tv_data.replay.run \
+        --kwargs "{'paths': 'capture-20240805-*.bin', 'speed': 10}"
+
+`speed` is a multiple of real time (1, 10, ...) or "max" to replay without
+pacing. Logs are written by `tv_data.capture` when the `capture_updates`
+default is set.
+"""
+
+import json
+import time
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Union
+
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+from tv_data.benchmark import summarize
+from tv_data.capture import list_logs, read_logs
+from tv_data.ingest import enqueue_update, get_queue_depth, process_update
+from tv_data.tv_data.doctype.datafield.datafield import extend_all_series
+
+DEPTH_INTERVAL = 1.0
+
+
+class Replay:
+    def __init__(
+        self,
+        speed: Union[float, str] = 1,
+        mode: str = "sync",
+        merge_interval: Optional[timedelta] = None,
+        user: Optional[str] = None,
+    ):
+        self.speed = None if speed in ("max", 0, None) else flt(speed)
+        self.mode = mode
+        self.merge_interval = merge_interval
+        self.user = user
+        self.latencies: List[float] = []
+        self.schedule_lag: List[float] = []
+        self.queue_depth: List[int] = []
+        self.merge_durations: List[float] = []
+        self.failed = 0
+
+    def wait_for(self, record_time: float, first_time: float, started: float) -> None:
+        if self.speed is None:
+            return
+        target = started + (record_time - first_time) / self.speed
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self.schedule_lag.append(-delay)
+
+    def apply(self, record: Dict) -> None:
+        user = self.user or record["user"]
+        args = (user, record["key"], record["value"], record["n"], record["insert"])
+        start = time.perf_counter()
+        try:
+            if self.mode == "async":
+                enqueue_update(*args)
+            else:
+                process_update(*args)
+                frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            self.failed += 1
+        self.latencies.append(time.perf_counter() - start)
+
+    def merge(self) -> None:
+        start = time.perf_counter()
+        extend_all_series()
+        self.merge_durations.append(time.perf_counter() - start)
+
+    def run(self, records: Iterable[Dict], limit: Optional[int] = None) -> Dict:
+        started = time.perf_counter()
+        first_time = next_merge = None
+        last_depth = 0.0
+        count = 0
+
+        for record in records:
+            if limit and count >= limit:
+                break
+            if first_time is None:
+                first_time = record["timestamp"]
+                if self.merge_interval:
+                    next_merge = first_time + self.merge_interval.total_seconds()
+
+            self.wait_for(record["timestamp"], first_time, started)
+            if next_merge is not None and record["timestamp"] >= next_merge:
+                self.merge()
+                next_merge += self.merge_interval.total_seconds()
+
+            self.apply(record)
+            count += 1
+
+            if (
+                self.mode == "async"
+                and time.perf_counter() - last_depth >= DEPTH_INTERVAL
+            ):
+                self.queue_depth.append(sum(get_queue_depth().values()))
+                last_depth = time.perf_counter()
+
+        if next_merge is not None:
+            self.merge()
+
+        return self.report(count, time.perf_counter() - started)
+
+    def report(self, count: int, elapsed: float) -> Dict:
+        report = {
+            "records": count,
+            "failed": self.failed,
+            "elapsed": elapsed,
+            "speed": self.speed or "max",
+            "mode": self.mode,
+            "rate": count / elapsed if elapsed else 0.0,
+        }
+        if self.latencies:
+            report["latency"] = summarize(self.latencies)
+        if self.schedule_lag:
+            report["schedule_lag"] = summarize(self.schedule_lag)
+        if self.queue_depth:
+            report["queue_depth"] = {
+                "max": max(self.queue_depth),
+                "mean": sum(self.queue_depth) / len(self.queue_depth),
+                "last": self.queue_depth[-1],
+            }
+        if self.merge_durations:
+            report["merge"] = summarize(self.merge_durations)
+        return report
+
+
+def run(
+    paths: Optional[Union[str, List[str]]] = None,
+    speed: Union[float, str] = 1,
+    mode: str = "sync",
+    merge: bool = True,
+    user: Optional[str] = None,
+    limit: Optional[int] = None,
+    output: Optional[str] = None,
+) -> Dict:
+    """Replay capture logs, merging at the site's cycle duration unless `merge` is off.
+
+    `user` replays every record as that user, for sites that do not have
+    the captured users.
+    """
+    if mode not in ("sync", "async"):
+        frappe.throw(_("Replay mode must be sync or async"))
+
+    merge_interval = (
+        frappe.get_single("TV Data Settings").cycle_manager.cycle_duration
+        if merge
+        else None
+    )
+    replay = Replay(speed, mode, merge_interval, user)
+    report = replay.run(read_logs(paths or list_logs()), limit and int(limit))
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    return report
@@ -0,0 +1,127 @@
+"""Routing of read-only paths to the read replica.
+
+Uses Frappe's read-only mode, configured in site_config.json:
+
+    "read_from_replica": 1,
+    "replica_host": "10.0.0.2"
+
+`replica_read` runs a function on the replica while its lag, probed on the
+replica connection and cached for a few seconds, is within `replica_max_lag`
+seconds (TV Data Settings defaults, 10 by default); otherwise, or when
+replication is stopped, the function runs on the primary. The probe needs
+the REPLICATION CLIENT privilege; when it fails, the error is logged and
+reads stay on the primary for `ERROR_TTL` seconds. A server that is
+not replicating at all reports no lag, so a local stand-in can serve as the
+replica in development.
+"""
+
+from functools import wraps
+from typing import Optional
+
+import frappe
+from frappe.utils import flt
+
+from tv_data.metrics import metrics
+
+LAG_KEY = "tv_data:replica:lag"
+LAG_TTL = 5
+# After a failed probe, e.g. without the REPLICATION CLIENT privilege
+ERROR_TTL = 300
+DEFAULT_MAX_LAG = 10.0
+STOPPED = "stopped"
+
+
+def on_replica() -> bool:
+    db = getattr(frappe.local, "db", None)
+    return db is not None and db is getattr(frappe.local, "replica_db", None)
+
+
+def query_lag() -> Optional[float]:
+    """Seconds the current connection is behind its source; None if replication is stopped."""
+    for query in ("show replica status", "show slave status"):
+        try:
+            rows = frappe.db.sql(query, as_dict=True)
+        except Exception as e:
+            if frappe.db.is_syntax_error(e):
+                # Older servers only know one of the two spellings
+                continue
+            raise
+        if not rows:
+            return 0.0
+        lag = rows[0].get("Seconds_Behind_Source", rows[0].get("Seconds_Behind_Master"))
+        return None if lag is None else flt(lag)
+    return None
+
+
+def get_lag() -> Optional[float]:
+    """Lag of the replica, probed on the replica connection at most every `LAG_TTL` seconds."""
+    key = frappe.cache.make_key(LAG_KEY)
+    cached = frappe.cache.get(key)
+    if cached is not None:
+        cached = cached.decode() if isinstance(cached, bytes) else cached
+        return None if cached == STOPPED else flt(cached)
+
+    try:
+        lag = query_lag()
+    except Exception as e:
+        # Unknown lag: read from the primary until the next probe
+        frappe.log_error(f"Error probing replica lag: {str(e)}", "Replica Lag Error")
+        frappe.cache.set(key, STOPPED, ex=ERROR_TTL)
+        return None
+    frappe.cache.set(key, STOPPED if lag is None else lag, ex=LAG_TTL)
+    if lag is not None:
+        metrics.observe("replica_lag", lag)
+    return lag
+
+
+def is_stopped() -> bool:
+    cached = frappe.cache.get(frappe.cache.make_key(LAG_KEY))
+    return (cached.decode() if isinstance(cached, bytes) else cached) == STOPPED
+
+
+def replica_read(max_lag: Optional[float] = None):
+    """Run the decorated read-only function on the replica when it is fresh enough.
+
+    `max_lag` overrides the `replica_max_lag` default, e.g. 0 for exports that
+    must see the last merge.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def routed(*args, **kwargs):
+            if not on_replica():
+                # Not configured, or already switched by an outer call
+                return func(*args, **kwargs)
+
+            limit = max_lag
+            if limit is None:
+                limit = flt(
+                    frappe.get_cached_doc("TV Data Settings").defaults.replica_max_lag
+                )
+                limit = limit or DEFAULT_MAX_LAG
+            lag = get_lag()
+            if lag is not None and lag <= limit:
+                metrics.inc("replica_reads")
+                return func(*args, **kwargs)
+
+            # Too far behind: run on the primary, then hand the replica back
+            # so Frappe's read-only mode closes it as usual
+            metrics.inc("replica_fallbacks")
+            replica, frappe.local.db = frappe.local.db, frappe.local.primary_db
+            try:
+                return func(*args, **kwargs)
+            finally:
+                frappe.local.db = replica
+
+        read_only = frappe.read_only()(routed)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # A stopped replica is not even connected to until the next probe
+            if not frappe.conf.read_from_replica or on_replica() or is_stopped():
+                return func(*args, **kwargs)
+            return read_only(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
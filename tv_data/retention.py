@@ -0,0 +1,202 @@
+import json
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+
+import frappe
+from frappe.utils import cint
+
+from tv_data.bar_cache import hot_bars
+from tv_data.indicators import reset_indicators
+from tv_data.metrics import metrics
+from tv_data.series import DATE_STRING_FORMAT
+from tv_data.tv_data.doctype.datafield.datafield import bump_change_counter
+
+REPORT_KEY = "tv_data:retention:last"
+DELETE_CHUNK = 1000
+
+# (name, date_string, open, high, low, close, volume)
+Row = Tuple[str, str, float, float, float, float, float]
+
+
+def bucket_date(date_string: str, resolution: str) -> str:
+    day = datetime.strptime(date_string, DATE_STRING_FORMAT)
+    if resolution == "Weekly":
+        day -= timedelta(days=day.weekday())
+    elif resolution == "Monthly":
+        day = day.replace(day=1)
+    return day.strftime(DATE_STRING_FORMAT)
+
+
+def fold_rows(rows: List[Row], resolution: str) -> Tuple[List[Row], List[str]]:
+    """Fold date-ordered rows into one bar per `resolution` bucket.
+
+    Returns the bars to write, each reusing the name of its bucket's first
+    row, and the names of the rows they replace. Buckets already holding a
+    single bar on the bucket date are left alone, so folding is idempotent.
+    """
+    updates, deletes = [], []
+    for bucket, group in groupby(rows, key=lambda row: bucket_date(row[1], resolution)):
+        group = list(group)
+        if len(group) == 1 and group[0][1] == bucket:
+            continue
+        updates.append(
+            (
+                group[0][0],
+                bucket,
+                group[0][2],
+                max(row[3] for row in group),
+                min(row[4] for row in group),
+                group[-1][5],
+                sum(row[6] for row in group),
+            )
+        )
+        deletes.extend(row[0] for row in group[1:])
+    return updates, deletes
+
+
+def get_windows(
+    rules: List[Tuple[int, str]], today: datetime
+) -> List[Tuple[Optional[str], str, str]]:
+    """Date ranges `(from, to, resolution)` of each rule, newest first.
+
+    A rule covers bars older than its `after_days` and not older than the
+    next rule's, so the coarsest resolution applies to the oldest bars.
+    """
+    rules = sorted(rules)
+    windows = []
+    for i, (after_days, resolution) in enumerate(rules):
+        end = (today - timedelta(days=after_days)).strftime(DATE_STRING_FORMAT)
+        start = (
+            (today - timedelta(days=rules[i + 1][0])).strftime(DATE_STRING_FORMAT)
+            if i + 1 < len(rules)
+            else None
+        )
+        windows.append((start, end, resolution))
+    return windows
+
+
+def get_policies() -> Dict[str, List[Tuple[int, str]]]:
+    policies = {}
+    for rule in frappe.get_single("TV Data Settings").retention_rules:
+        policies.setdefault(rule.datafield_type, []).append(
+            (cint(rule.after_days), rule.resolution)
+        )
+    return policies
+
+
+def get_rows(datafield: str, start: Optional[str], end: str) -> List[Row]:
+    conditions = "and date_string >= %(start)s" if start else ""
+    return frappe.db.sql(
+        f"""
+        select name, date_string, open, high, low, close, volume
+        from `tabDatafield Series`
+        where parent = %(parent)s and parentfield = 'datafield_series_table'
+            and date_string < %(end)s {conditions}
+        order by date_string, idx
+        """,
+        {"parent": datafield, "start": start, "end": end},
+    )
+
+
+def apply_retention(datafield: str, windows) -> Tuple[int, int]:
+    """Fold the bars of one Datafield; returns `(rows scanned, rows deleted)`."""
+    scanned = deleted = 0
+    try:
+        for start, end, resolution in windows:
+            rows = get_rows(datafield, start, end)
+            scanned += len(rows)
+            updates, deletes = fold_rows(rows, resolution)
+            for name, date_string, _open, _high, _low, _close, _volume in updates:
+                frappe.db.set_value(
+                    "Datafield Series",
+                    name,
+                    {
+                        "date_string": date_string,
+                        "open": _open,
+                        "high": _high,
+                        "low": _low,
+                        "close": _close,
+                        "volume": _volume,
+                    },
+                    update_modified=False,
+                )
+            for i in range(0, len(deletes), DELETE_CHUNK):
+                frappe.db.delete(
+                    "Datafield Series",
+                    {"name": ["in", deletes[i : i + DELETE_CHUNK]]},
+                )
+            deleted += len(deletes)
+        # Folded bars and their deleted originals must land together
+        frappe.db.commit()
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(
+            f"Error in retention of {datafield}: {str(e)}", "Datafield Retention Error"
+        )
+        return scanned, 0
+
+    if deleted:
+        hot_bars.invalidate(datafield)
+        reset_indicators(datafield)
+    return scanned, deleted
+
+
+def get_avg_row_length() -> int:
+    rows = frappe.db.sql(
+        """
+        select avg_row_length from information_schema.tables
+        where table_schema = database() and table_name = 'tabDatafield Series'
+        """
+    )
+    return cint(rows[0][0]) if rows else 0
+
+
+def run_retention() -> Dict:
+    """Apply the retention rules of TV Data Settings to every Datafield."""
+    start = time.perf_counter()
+    policies = get_policies()
+    today = datetime.now()
+    windows = {
+        datafield_type: get_windows(rules, today)
+        for datafield_type, rules in policies.items()
+    }
+    report = {"datafields": 0, "rows_scanned": 0, "rows_deleted": 0}
+
+    with metrics.timer("retention"):
+        for datafield in frappe.get_all("Datafield", fields=["name", "type"]):
+            if datafield.type not in windows:
+                continue
+            scanned, deleted = apply_retention(datafield.name, windows[datafield.type])
+            report["datafields"] += 1
+            report["rows_scanned"] += scanned
+            report["rows_deleted"] += deleted
+
+    if report["rows_deleted"]:
+        bump_change_counter()
+        metrics.inc("retention_rows_deleted", report["rows_deleted"])
+
+    report.update(
+        {
+            "bytes_reclaimed": report["rows_deleted"] * get_avg_row_length(),
+            "duration": time.perf_counter() - start,
+            "finished_at": datetime.now().isoformat(),
+        }
+    )
+    frappe.cache.set(frappe.cache.make_key(REPORT_KEY), json.dumps(report))
+    frappe.logger("tv_data").info(f"Retention: {report}")
+    return report
+
+
+@frappe.whitelist()
+def get_retention_report() -> Optional[Dict]:
+    frappe.only_for("System Manager")
+    report = frappe.cache.get(frappe.cache.make_key(REPORT_KEY))
+    return json.loads(report) if report else None
+
+
+@frappe.whitelist()
+def enqueue_retention() -> None:
+    frappe.only_for("System Manager")
+    frappe.enqueue("tv_data.retention.run_retention", queue="long", timeout=3600 * 4)
@@ -0,0 +1,131 @@
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Iterable, Optional
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+from tv_data.metrics import metrics
+
+MERGE_STAGES = ("merge",)
+EXPORT_STAGES = ("generate_files", "update_repository")
+SAMPLES_KEY = "tv_data:runtime:samples:{}"
+EWMA_KEY = "tv_data:runtime:ewma"
+ALERT_KEY = "tv_data:runtime:alert"
+MAX_SAMPLES = 100
+EWMA_ALPHA = 0.3
+PERCENTILE = 95
+HEADROOM = 1.2
+MIN_PRE_RUNTIME = 30
+
+
+class RuntimeEstimator:
+    """Predicts how long a cycle's merge and export take from past runs.
+
+    Each stage keeps an EWMA and its last `MAX_SAMPLES` durations in
+    `frappe.cache`; the stage estimate is the larger of the EWMA and the
+    95th percentile, so one slow run raises the estimate immediately while a
+    run of fast ones lowers it gradually.
+    """
+
+    def record(self, stage: str, seconds: float) -> None:
+        samples_key = frappe.cache.make_key(SAMPLES_KEY.format(stage))
+        ewma_key = frappe.cache.make_key(EWMA_KEY)
+        previous = frappe.cache.pipeline().hget(ewma_key, stage).execute()[0]
+        ewma = (
+            seconds
+            if previous is None
+            else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * float(previous)
+        )
+
+        pipe = frappe.cache.pipeline()
+        pipe.lpush(samples_key, seconds)
+        pipe.ltrim(samples_key, 0, MAX_SAMPLES - 1)
+        pipe.hset(ewma_key, stage, ewma)
+        pipe.execute()
+        metrics.observe(f"runtime_{stage}", seconds)
+
+    @contextmanager
+    def measure(self, stage: str):
+        # Failed and timed-out runs count too; they are often the slowest
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def get_stage_estimate(self, stage: str) -> Optional[Dict[str, float]]:
+        pipe = frappe.cache.pipeline()
+        pipe.hget(frappe.cache.make_key(EWMA_KEY), stage)
+        pipe.lrange(frappe.cache.make_key(SAMPLES_KEY.format(stage)), 0, -1)
+        ewma, samples = pipe.execute()
+        if ewma is None or not samples:
+            return None
+
+        samples = sorted(float(sample) for sample in samples)
+        index = min(len(samples) - 1, int(len(samples) * PERCENTILE / 100))
+        return {
+            "ewma": float(ewma),
+            "p95": samples[index],
+            "samples": len(samples),
+        }
+
+    def predict_runtime(self, stages: Iterable[str]) -> Optional[float]:
+        estimates = [self.get_stage_estimate(stage) for stage in stages]
+        if not any(estimates):
+            return None
+        return sum(max(e["ewma"], e["p95"]) for e in estimates if e)
+
+    def get_stages(self, settings) -> tuple:
+        return MERGE_STAGES + (EXPORT_STAGES if cint(settings.export_on_cycle) else ())
+
+    def get_pre_runtime(self, settings) -> timedelta:
+        """Effective pre-runtime for the next cycle.
+
+        Falls back to the static `scheduler_pre_runtime` until there are
+        measurements or when adaptive pre-runtime is disabled.
+        """
+        cycle_manager = settings.cycle_manager
+        static = cycle_manager.scheduler_pre_runtime
+        if not cint(settings.adaptive_pre_runtime):
+            return static
+
+        predicted = self.predict_runtime(self.get_stages(settings))
+        if predicted is None:
+            return static
+
+        cycle_seconds = cycle_manager.cycle_duration.total_seconds()
+        self.check_capacity(predicted, cycle_seconds)
+        seconds = min(max(predicted * HEADROOM, MIN_PRE_RUNTIME), cycle_seconds)
+        return timedelta(seconds=int(seconds))
+
+    def check_capacity(self, predicted: float, cycle_seconds: float) -> None:
+        if predicted <= cycle_seconds:
+            return
+
+        metrics.inc("runtime_over_cycle")
+        # Alert at most once per cycle
+        if frappe.cache.set(
+            frappe.cache.make_key(ALERT_KEY), 1, nx=True, ex=max(int(cycle_seconds), 60)
+        ):
+            frappe.log_error(
+                _(
+                    "Predicted merge and export runtime of {0}s exceeds the cycle duration of {1}s"
+                ).format(int(predicted), int(cycle_seconds)),
+                "TV Data Scheduler Warning",
+            )
+
+    def update_settings(self, settings) -> None:
+        predicted = self.predict_runtime(self.get_stages(settings))
+        if predicted is not None and cint(predicted) != cint(settings.runtime_cycle):
+            frappe.db.set_single_value(
+                "TV Data Settings",
+                "runtime_cycle",
+                cint(predicted),
+                update_modified=False,
+            )
+
+
+runtime_estimator = RuntimeEstimator()
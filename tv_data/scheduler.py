@@ -0,0 +1,165 @@
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Optional
+
+import frappe
+from frappe.utils import cint, get_datetime
+
+from tv_data.github import GithubManager
+from tv_data.runtime_estimator import runtime_estimator
+from tv_data.tv_data.doctype.datafield.datafield import extend_all_series
+from tv_data.tv_data.doctype.tv_data_cycle_log.tv_data_cycle_log import (
+    get_cycle_log_name,
+)
+
+CYCLE_LOCK_KEY = "tv_data:cycle:{}"
+RUN_LOCK_KEY = "tv_data:cycle:running"
+TICK_INTERVAL = timedelta(seconds=60)
+LATE_TOLERANCE = timedelta(seconds=60)
+
+
+def tick() -> None:
+    """Runs every minute; schedules the cycle whose trigger falls before the next tick.
+
+    A cycle is triggered its pre-runtime before its boundary (the static
+    `scheduler_pre_runtime`, or the adaptive estimate from past runs). The job
+    is enqueued on the last tick before the trigger and starts right away, so
+    the run starts up to one tick early rather than late; `frappe.enqueue`
+    cannot delay a job, and waiting for the trigger would hold a long-queue
+    worker.
+    """
+    settings = frappe.get_single("TV Data Settings")
+    cycle_manager = settings.cycle_manager
+    now = datetime.now()
+
+    next_cycle = cycle_manager.get_next_cycle(now)
+    pre_runtime = runtime_estimator.get_pre_runtime(settings)
+    trigger_at = next_cycle["datetime"] - pre_runtime
+    if trigger_at - now <= TICK_INTERVAL:
+        schedule_cycle(
+            next_cycle["index"],
+            next_cycle["datetime"],
+            trigger_at,
+            cycle_manager.cycle_duration,
+        )
+
+    previous_cycle = cycle_manager.get_previous_cycle(now)
+    record_missed_cycle(previous_cycle["index"], previous_cycle["datetime"])
+
+
+def schedule_cycle(
+    index: int, boundary: datetime, trigger_at: datetime, cycle_duration: timedelta
+) -> Optional[str]:
+    # The Redis lock keeps concurrent schedulers out; the log name is the durable guard
+    lock = frappe.cache.make_key(CYCLE_LOCK_KEY.format(int(boundary.timestamp())))
+    if not frappe.cache.set(
+        lock, 1, nx=True, ex=max(int(cycle_duration.total_seconds()), 60)
+    ):
+        return None
+    if frappe.db.exists("TV Data Cycle Log", get_cycle_log_name(boundary)):
+        return None
+
+    log = frappe.get_doc(
+        {
+            "doctype": "TV Data Cycle Log",
+            "cycle_index": index,
+            "cycle_boundary": boundary,
+            "trigger_at": trigger_at,
+            "pre_runtime": (boundary - trigger_at).total_seconds(),
+            "status": "Scheduled",
+        }
+    ).insert(ignore_permissions=True)
+    frappe.db.commit()
+
+    frappe.enqueue(
+        "tv_data.scheduler.run_cycle",
+        queue="long",
+        timeout=get_run_timeout(cycle_duration),
+        log_name=log.name,
+    )
+    return log.name
+
+
+def get_run_timeout(cycle_duration: timedelta) -> int:
+    return max(int(cycle_duration.total_seconds()), 1500)
+
+
+def record_missed_cycle(index: int, boundary: datetime) -> None:
+    if frappe.db.exists("TV Data Cycle Log", get_cycle_log_name(boundary)):
+        return
+    # Only cycles after the first scheduled one count as missed
+    if not frappe.db.exists("TV Data Cycle Log", {"cycle_boundary": ["<", boundary]}):
+        return
+
+    frappe.get_doc(
+        {
+            "doctype": "TV Data Cycle Log",
+            "cycle_index": index,
+            "cycle_boundary": boundary,
+            "status": "Missed",
+        }
+    ).insert(ignore_permissions=True)
+    frappe.db.commit()
+
+
+def run_cycle(log_name: str) -> None:
+    log = frappe.get_doc("TV Data Cycle Log", log_name)
+    if log.status != "Scheduled":
+        return
+
+    # Held for the whole run, so a cycle whose predecessor overran is skipped
+    # instead of merging alongside it; expires with the job's timeout
+    settings = frappe.get_single("TV Data Settings")
+    lock = frappe.cache.make_key(RUN_LOCK_KEY)
+    timeout = get_run_timeout(settings.cycle_manager.cycle_duration)
+    if not frappe.cache.set(lock, log_name, nx=True, ex=timeout):
+        running = frappe.safe_decode(frappe.cache.get(lock))
+        log.db_set(
+            {"status": "Skipped", "error": f"Cycle {running} was still running"},
+            commit=True,
+        )
+        return
+
+    try:
+        run_locked_cycle(log)
+    finally:
+        if frappe.safe_decode(frappe.cache.get(lock)) == log_name:
+            frappe.cache.delete(lock)
+
+
+def run_locked_cycle(log) -> None:
+    trigger_at = get_datetime(log.trigger_at)
+    started_at = datetime.now()
+    delay = max((started_at - trigger_at).total_seconds(), 0)
+    log.db_set(
+        {
+            "status": "Running",
+            "started_at": started_at,
+            "delay": delay,
+            "late": cint(delay > LATE_TOLERANCE.total_seconds()),
+        },
+        commit=True,
+    )
+
+    result = {"status": "Completed"}
+    try:
+        start = time.perf_counter()
+        extend_all_series()
+        result["merge_duration"] = time.perf_counter() - start
+
+        if cint(frappe.get_single("TV Data Settings").export_on_cycle):
+            start = time.perf_counter()
+            GithubManager.generate_files()
+            GithubManager.update_repository()
+            result["export_duration"] = time.perf_counter() - start
+    except Exception:
+        frappe.db.rollback()
+        result.update({"status": "Failed", "error": traceback.format_exc()})
+        frappe.log_error(f"Cycle {log.name} failed", "TV Data Scheduler Error")
+    finally:
+        result["finished_at"] = datetime.now()
+        log.db_set(result, commit=True)
+
+    runtime_estimator.update_settings(frappe.get_single("TV Data Settings"))
+    frappe.db.commit()
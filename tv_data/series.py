@@ -0,0 +1,155 @@
+import calendar
+import time
+from typing import Dict, List, Optional
+
+import frappe
+import numpy as np
+
+from tv_data.metrics import metrics
+
+DATE_STRING_FORMAT = "%Y%m%dT"
+BAR_COLUMNS = ("t", "o", "h", "l", "c", "v")
+
+
+def date_string_to_timestamp(date_string: str) -> int:
+    return calendar.timegm(time.strptime(date_string, DATE_STRING_FORMAT))
+
+
+def timestamp_to_date_string(timestamp: float) -> str:
+    return time.strftime(DATE_STRING_FORMAT, time.gmtime(timestamp))
+
+
+def empty_bars() -> Dict[str, List]:
+    return {column: [] for column in BAR_COLUMNS}
+
+
+def fold(values: List, combine, value) -> None:
+    """Fold `value` into the last entry of `values`; None on either side is a gap."""
+    if value is not None:
+        values[-1] = value if values[-1] is None else combine(values[-1], value)
+
+
+def rows_to_bars(rows: List[List]) -> Dict[str, List]:
+    """Fold `[date_string, open, high, low, close, volume]` rows into columns.
+
+    Rows must be ordered by date. Rows sharing a date_string (several merges on
+    the same day) are folded into one bar, so `t` is strictly increasing. NULL
+    values are skipped when folding; a bar is None only where all rows are.
+    """
+    bars = empty_bars()
+    t, o, h, l, c, v = (bars[column] for column in BAR_COLUMNS)
+    last_date = None
+
+    for date_string, _open, _high, _low, _close, _volume in rows:
+        if date_string == last_date:
+            fold(o, lambda first, _later: first, _open)
+            fold(h, max, _high)
+            fold(l, min, _low)
+            fold(c, lambda _earlier, last: last, _close)
+            fold(v, lambda a, b: a + b, _volume)
+            continue
+        last_date = date_string
+        t.append(date_string_to_timestamp(date_string))
+        o.append(_open)
+        h.append(_high)
+        l.append(_low)
+        c.append(_close)
+        v.append(_volume)
+
+    return bars
+
+
+def to_days(date_strings: List[str]) -> np.ndarray:
+    return np.array(
+        [f"{d[:4]}-{d[4:6]}-{d[6:8]}" for d in date_strings], dtype="datetime64[D]"
+    )
+
+
+def fill_gaps(rows: List[Dict], end: Optional[str] = None) -> List[Dict]:
+    """Add a flat, zero-volume bar for every day without rows, up to the day `end`.
+
+    Rows must be ordered by date_string. Each filler repeats the close of the
+    row before it, so exports cover every day of the schedule without filler
+    rows being stored.
+    """
+    if not rows:
+        return rows
+    days = to_days([row["date_string"] for row in rows])
+    last = max(days[-1], to_days([end])[0]) if end else days[-1]
+    schedule = np.arange(days[0], last + 1)
+    missing = schedule[~np.isin(schedule, days)]
+    if not len(missing):
+        return rows
+
+    closes = np.array([row["close"] for row in rows], dtype=float)
+    previous = closes[np.searchsorted(days, missing, side="right") - 1]
+    date_strings = np.char.add(
+        np.char.replace(np.datetime_as_string(missing), "-", ""), "T"
+    )
+    fillers = [
+        {
+            "date_string": str(date_string),
+            "open": close,
+            "high": close,
+            "low": close,
+            "close": close,
+            "volume": 0,
+        }
+        for date_string, close in zip(date_strings, previous.tolist())
+    ]
+    # Stable, so rows sharing a day keep their order
+    order = np.argsort(np.concatenate((days, missing)), kind="stable")
+    combined = rows + fillers
+    return [combined[i] for i in order]
+
+
+@metrics.timed()
+def get_bars(
+    datafield: str,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    countback: Optional[int] = None,
+) -> Dict[str, List]:
+    """Return the bars of a Datafield as columns `t/o/h/l/c/v` (epoch seconds, UTC).
+
+    `start`/`end` bound the range inclusively; `countback` keeps only the last
+    N bars up to `end`.
+    """
+    conditions = ["parent = %(datafield)s", "parentfield = 'datafield_series_table'"]
+    values = {"datafield": datafield}
+    if start is not None:
+        conditions.append("date_string >= %(start)s")
+        values["start"] = timestamp_to_date_string(start)
+    if end is not None:
+        conditions.append("date_string <= %(end)s")
+        values["end"] = timestamp_to_date_string(end)
+
+    rows = frappe.db.sql(
+        f"""
+        select date_string, open, high, low, close, volume
+        from `tabDatafield Series`
+        where {" and ".join(conditions)}
+        order by date_string asc, idx asc
+        """,
+        values,
+        as_list=True,
+    )
+    bars = rows_to_bars(rows)
+
+    if countback:
+        bars = {column: data[-int(countback) :] for column, data in bars.items()}
+
+    return bars
+
+
+def get_previous_bar_time(datafield: str, before: int) -> Optional[int]:
+    date_string = frappe.db.sql(
+        """
+        select max(date_string)
+        from `tabDatafield Series`
+        where parent = %s and parentfield = 'datafield_series_table'
+            and date_string < %s
+        """,
+        (datafield, timestamp_to_date_string(before)),
+    )[0][0]
+    return date_string_to_timestamp(date_string) if date_string else None
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data import backfill
+from tv_data.backfill import Backfill, parse_bar
+
+
+class StandInDB:
+    """`Datafield Series` rows of one Datafield, answering the backfill's queries."""
+
+    def __init__(self, date_strings):
+        self.rows = [
+            (date_string, idx) for idx, date_string in enumerate(date_strings, 1)
+        ]
+        self.lookups = []
+
+    def sql(self, query, values):
+        if "max(idx)" in query:
+            return [(max((idx for _d, idx in self.rows), default=None),)]
+        if "row_number()" in query:
+            self.rows = [(d, i) for i, (d, _idx) in enumerate(sorted(self.rows), 1)]
+            return []
+        self.lookups.append(len(values["date_strings"]))
+        wanted = set(values["date_strings"])
+        return [(d,) for d in {d for d, _idx in self.rows} & wanted]
+
+    def bulk_insert(self, doctype, fields, values):
+        for row in values:
+            row = dict(zip(fields, row))
+            self.rows.append((row["date_string"], row["idx"]))
+
+    def commit(self):
+        pass
+
+
+class TestBackfill(unittest.TestCase):
+    def test_parse_bar(self):
+        bar = ("20240805T", 1.0, 2.0, 0.5, 1.5, 10.0)
+        self.assertEqual(
+            parse_bar(
+                {
+                    "Date": "20240805T",
+                    "Open": "1",
+                    "High": "2",
+                    "Low": "0.5",
+                    "Close": "1.5",
+                    "Volume": "10",
+                }
+            ),
+            bar,
+        )
+        # Epoch seconds, milliseconds and short column names
+        self.assertEqual(
+            parse_bar('{"t": 1722816000, "o": 1, "h": 2, "l": 0.5, "c": 1.5, "v": 10}'),
+            bar,
+        )
+        self.assertEqual(
+            parse_bar(
+                {
+                    "time": 1722816000000,
+                    "open": 1,
+                    "high": 2,
+                    "low": 0.5,
+                    "close": 1.5,
+                    "volume": 10,
+                }
+            ),
+            bar,
+        )
+
+    def test_invalid_bars(self):
+        with self.assertRaises(ValueError):
+            parse_bar({"open": 1, "high": 2, "low": 0.5, "close": 1.5})
+        with self.assertRaises(ValueError):
+            parse_bar(
+                {"t": 1722816000, "open": 1, "high": 1.2, "low": 0.5, "close": 1.5}
+            )
+        with self.assertRaises(ValueError):
+            parse_bar('{"t": 1722816000, "open": 1')
+
+    def test_skips_duplicates_chunk_by_chunk(self):
+        lines = ["date_string,open,high,low,close"] + [
+            f"202408{day:02}T,1,2,0.5,1.5" for day in (1, 2, 3, 2, 4, 5, 1, 6)
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("\n".join(lines) + "\n")
+        self.addCleanup(os.unlink, f.name)
+
+        db = StandInDB(["20240803T"])
+        with (
+            patch.object(frappe, "db", db),
+            patch.object(frappe, "session", frappe._dict(user="Administrator")),
+            patch.object(frappe, "generate_hash", lambda length: "x"),
+            patch.object(frappe, "publish_realtime", lambda *args, **kwargs: None),
+            patch.object(backfill, "now_datetime", lambda: None),
+            patch.object(backfill, "CHUNK_SIZE", 2),
+            patch.object(backfill, "reset_indicators", lambda datafield: None),
+            patch.object(backfill, "bump_change_counter", lambda: None),
+            patch.object(backfill.hot_bars, "invalidate", lambda datafield: None),
+        ):
+            progress = Backfill("A", f.name).run()
+
+        self.assertEqual((progress["inserted"], progress["duplicates"]), (5, 3))
+        # Renumbered in date order, the existing bar included
+        self.assertEqual(
+            sorted(db.rows), [(f"202408{day:02}T", day) for day in range(1, 7)]
+        )
+        # One lookup of at most a chunk of date_strings per chunk
+        self.assertTrue(all(count <= 2 for count in db.lookups))
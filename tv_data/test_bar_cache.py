@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data import bar_cache
+from tv_data.bar_cache import HotBarCache, pack_bars, unpack_bars
+from tv_data.testing import StandInRedis
+
+
+def make_bars(count):
+    return {
+        "t": [86400 * i for i in range(count)],
+        "o": [float(i) for i in range(count)],
+        "h": [i + 1.0 for i in range(count)],
+        "l": [i - 1.0 for i in range(count)],
+        "c": [i + 0.5 for i in range(count)],
+        "v": [10.0] * count,
+    }
+
+
+class TestBarCache(unittest.TestCase):
+    def setUp(self):
+        self.series = make_bars(10)
+        self.reads = []
+
+        def get_bars(datafield, start=None, end=None, countback=None):
+            self.reads.append((start, end, countback))
+            keep = [
+                i
+                for i, t in enumerate(self.series["t"])
+                if (start is None or t >= start) and (end is None or t <= end)
+            ]
+            if countback:
+                keep = keep[-countback:]
+            return {c: [values[i] for i in keep] for c, values in self.series.items()}
+
+        settings = frappe._dict(defaults=frappe._dict(hot_bar_count=5))
+        patches = (
+            patch.object(frappe, "cache", StandInRedis()),
+            patch.object(frappe, "get_cached_doc", lambda doctype: settings),
+            patch.object(bar_cache, "get_bars", get_bars),
+        )
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.cache = HotBarCache()
+
+    def test_pack_keeps_nulls(self):
+        bars = make_bars(3)
+        bars["o"][1] = None
+        bars["v"][2] = None
+        unpacked, complete = unpack_bars(pack_bars(bars, True))
+        self.assertEqual(unpacked, bars)
+        self.assertTrue(complete)
+
+    def test_serves_tail_from_cache(self):
+        bars = self.cache.get_bars("A", countback=3)
+        self.assertEqual(bars["t"], self.series["t"][-3:])
+        self.assertEqual(bars["c"], self.series["c"][-3:])
+        # The second request is a local hit
+        self.cache.get_bars("A", start=self.series["t"][6])
+        self.assertEqual(len(self.reads), 1)
+
+        # Older than the cached tail: read through
+        bars = self.cache.get_bars("A", start=self.series["t"][2])
+        self.assertEqual(bars["t"], self.series["t"][2:])
+        self.assertEqual(len(self.reads), 2)
+
+    def test_whole_series_reads_through(self):
+        self.assertEqual(self.cache.get_bars("A"), self.series)
+        self.assertEqual(self.reads, [(None, None, 6), (None, None, None)])
+
+        # A series that fits the cache is served from it
+        self.series = make_bars(4)
+        self.cache.invalidate("A")
+        self.assertEqual(self.cache.get_bars("A"), self.series)
+        self.assertEqual(len(self.reads), 3)
+
+    def test_invalidate(self):
+        self.cache.get_bars("A", countback=5)
+        self.series = make_bars(11)
+        self.cache.invalidate("A")
+        bars = self.cache.get_bars("A", countback=5)
+        self.assertEqual(bars["t"], self.series["t"][-5:])
+        self.assertEqual(len(self.reads), 2)
@@ -0,0 +1,29 @@
+import unittest
+
+from tv_data.benchmark import compare, percentile, summarize
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_summarize(self):
+        summary = summarize([0.1] * 9 + [1.0])
+        self.assertEqual(summary["count"], 10)
+        self.assertEqual(summary["p50"], 0.1)
+        self.assertEqual(summary["p99"], 1.0)
+        self.assertAlmostEqual(summary["throughput"], 10 / 1.9)
+
+        # One call processing many items
+        self.assertAlmostEqual(summarize([2.0], items=100)["throughput"], 50)
+
+    def test_percentile(self):
+        self.assertEqual(percentile(list(range(100)), 95), 95)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+
+    def test_compare(self):
+        baseline = {"operations": {"merge_updates": summarize([0.1] * 10)}}
+        same = {"operations": {"merge_updates": summarize([0.11] * 10)}}
+        slower = {"operations": {"merge_updates": summarize([0.2] * 10)}}
+        new = {"operations": {"generate_files": summarize([5.0])}}
+
+        self.assertEqual(compare(same, baseline, 0.2), [])
+        self.assertEqual(len(compare(slower, baseline, 0.2)), 2)
+        self.assertEqual(compare(new, baseline, 0.2), [])
@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+
+from tv_data.capture import pack_record, read_log, read_logs
+
+
+class TestCapture(unittest.TestCase):
+    def write_log(self, directory, name, records):
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            for record in records:
+                f.write(pack_record(*record))
+        return path
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write_log(
+                directory,
+                "a.bin",
+                [("user@example.com", "BTC", 1.5, 3, False, 100.0)],
+            )
+            # A partially written record at the tail is ignored
+            with open(path, "ab") as f:
+                f.write(pack_record("u", "ETH", 2.0, None, True, 101.0)[:-2])
+
+            records = list(read_log(path))
+            self.assertEqual(len(records), 1)
+            self.assertEqual(records[0]["key"], "BTC")
+            self.assertEqual(records[0]["user"], "user@example.com")
+            self.assertEqual(records[0]["n"], 3)
+
+    def test_logs_merge_in_timestamp_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_log(
+                directory,
+                "a.bin",
+                [("u", "A", 1.0, None, False, 1.0), ("u", "A", 2.0, None, False, 3.0)],
+            )
+            self.write_log(directory, "b.bin", [("u", "B", 1.0, 1, True, 2.0)])
+
+            records = list(read_logs(os.path.join(directory, "*.bin")))
+            self.assertEqual([r["timestamp"] for r in records], [1.0, 2.0, 3.0])
+            self.assertIsNone(records[0]["n"])
+            self.assertTrue(records[1]["insert"])
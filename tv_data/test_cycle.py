@@ -0,0 +1,88 @@
+import unittest
+from datetime import datetime, timedelta
+from itertools import islice
+
+from tv_data.cycle import CycleManager
+
+
+class TestCycleManager(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2024, 8, 5, 10, 30)
+        # 4 cycles per 24h window: 00:00, 06:00, 12:00, 18:00
+        self.manager = CycleManager("24h", 4, 300, clock=lambda: self.now)
+
+    def test_next_and_previous_cycle(self):
+        self.assertEqual(
+            self.manager.get_next_cycle()["datetime"], datetime(2024, 8, 5, 12)
+        )
+        self.assertEqual(self.manager.get_next_cycle()["index"], 3)
+        self.assertEqual(
+            self.manager.get_previous_cycle()["datetime"], datetime(2024, 8, 5, 6)
+        )
+
+    def test_boundaries_are_exclusive(self):
+        self.now = datetime(2024, 8, 5, 12)
+        self.assertEqual(
+            self.manager.get_next_cycle()["datetime"], datetime(2024, 8, 5, 18)
+        )
+        self.assertEqual(
+            self.manager.get_previous_cycle()["datetime"], datetime(2024, 8, 5, 6)
+        )
+
+    def test_last_trigger(self):
+        # The 12:00 cycle was launched at 11:55
+        self.now = datetime(2024, 8, 5, 11, 56)
+        self.assertEqual(self.manager.get_last_trigger(), datetime(2024, 8, 5, 11, 55))
+        # The midnight cycle runs, and stamps its bars, on the day before
+        self.now = datetime(2024, 8, 5, 23, 57)
+        self.assertEqual(self.manager.get_last_trigger(), datetime(2024, 8, 5, 23, 55))
+
+    def test_cycles_roll_over_day_edges(self):
+        self.now = datetime(2024, 8, 5, 19)
+        self.assertEqual(
+            self.manager.get_next_cycle()["datetime"], datetime(2024, 8, 6)
+        )
+        self.now = datetime(2024, 8, 6)
+        self.assertEqual(
+            self.manager.get_previous_cycle()["datetime"], datetime(2024, 8, 5, 18)
+        )
+
+    def test_partial_window_is_truncated_at_midnight(self):
+        # Windows of 23.5h: the second window of the day only has its 23:30 cycle
+        manager = CycleManager(84600, 5, 300, clock=lambda: self.now)
+        cycles = list(islice(manager.iter_cycles(datetime(2024, 8, 5, 20)), 3))
+        self.assertEqual(
+            [cycle["datetime"] for cycle in cycles],
+            [
+                datetime(2024, 8, 5, 23, 30),
+                datetime(2024, 8, 6),
+                datetime(2024, 8, 6, 4, 42),
+            ],
+        )
+
+    def test_iter_cycles(self):
+        forward = [c["datetime"] for c in islice(self.manager.iter_cycles(), 5)]
+        self.assertEqual(forward[0], datetime(2024, 8, 5, 12))
+        self.assertEqual(forward[-1], datetime(2024, 8, 6, 12))
+
+        backward = [
+            c["datetime"] for c in islice(self.manager.iter_cycles(reverse=True), 3)
+        ]
+        self.assertEqual(
+            backward,
+            [datetime(2024, 8, 5, 6), datetime(2024, 8, 5), datetime(2024, 8, 4, 18)],
+        )
+
+    def test_many_cycles_per_day(self):
+        manager = CycleManager("1d", 1440, 0, clock=lambda: self.now)
+        self.assertEqual(
+            manager.get_next_cycle()["datetime"], self.now + timedelta(minutes=1)
+        )
+        self.assertEqual(manager.get_next_cycle()["index"], 632)
+
+    def test_get_cycles_uses_trigger_times(self):
+        cycles = self.manager.get_cycles()
+        self.assertEqual([c["time"] for c in cycles["past"]], ["23:55:00", "05:55:00"])
+        self.assertEqual(
+            [c["time"] for c in cycles["future"]], ["11:55:00", "17:55:00"]
+        )
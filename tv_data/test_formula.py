@@ -0,0 +1,45 @@
+import unittest
+from graphlib import CycleError
+
+from tv_data.formula import Formula, FormulaGraph
+
+
+class TestFormula(unittest.TestCase):
+    def test_evaluate(self):
+        formula = Formula("log(btc) - log(Eth) + 2 ** 2")
+        self.assertEqual(formula.inputs, ("BTC", "ETH"))
+        self.assertAlmostEqual(formula.evaluate({"BTC": 1.0, "ETH": 1.0}), 4.0)
+
+    def test_rejects_unsafe_expressions(self):
+        for expression in (
+            "__import__('os')",
+            "A.__class__",
+            "open('x')",
+            "[A for A in B]",
+            "'a' * 3",
+            "A if B else C",
+        ):
+            with self.assertRaises(ValueError):
+                Formula(expression)
+        with self.assertRaises(OverflowError):
+            Formula("9 ** 9 ** 9").evaluate({})
+
+    def test_graph_order(self):
+        derived = [
+            {"name": "D2", "user": "u", "formula": "D1 * 2"},
+            {"name": "D1", "user": "u", "formula": "A - B"},
+            {"name": "D3", "user": "u", "formula": "C"},
+        ]
+        names = {("u", k): k for k in ("A", "B", "C", "D1")}
+        graph = FormulaGraph(derived, names)
+        self.assertEqual(graph.affected(["A"]), ["D1", "D2"])
+        self.assertEqual(graph.affected(["D1"]), ["D2"])
+        self.assertEqual(graph.affected(["X"]), [])
+
+    def test_cycles_are_rejected(self):
+        derived = [
+            {"name": "A", "user": "u", "formula": "B + 1"},
+            {"name": "B", "user": "u", "formula": "A + 1"},
+        ]
+        with self.assertRaises(CycleError):
+            FormulaGraph(derived, {("u", "A"): "A", ("u", "B"): "B"})
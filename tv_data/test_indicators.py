@@ -0,0 +1,167 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+import numpy as np
+
+from tv_data import indicators
+from tv_data.indicators import (
+    Indicator,
+    align_indicators,
+    compute_indicator,
+    get_indicator_data,
+    parse_indicators,
+    smooth,
+    update_indicator,
+)
+
+
+def make_bars(count, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    spread = rng.uniform(0.1, 2.0, count)
+    return {
+        "t": list(range(count)),
+        "o": close.tolist(),
+        "h": (close + spread).tolist(),
+        "l": (close - spread).tolist(),
+        "c": close.tolist(),
+    }
+
+
+def select(bars, start=None):
+    keep = [i for i, t in enumerate(bars["t"]) if start is None or t >= start]
+    return {column: [values[i] for i in keep] for column, values in bars.items()}
+
+
+class StandInDB:
+    """Datafield Indicator records and value rows, with the calls the indicators make."""
+
+    def __init__(self):
+        self.records = {}
+        self.values = []
+        self.writes = 0
+
+    def matches(self, row, filters):
+        for field, condition in filters.items():
+            if isinstance(condition, list):
+                if row[field] in condition[1]:
+                    return False
+            elif row[field] != condition:
+                return False
+        return True
+
+    def exists(self, doctype, name):
+        return name in self.records
+
+    def insert(self, doc):
+        name = f"{doc['datafield']}-{doc['indicator']}"
+        self.records[name] = frappe._dict(doc, name=name)
+        return frappe._dict(insert=lambda ignore_permissions=False: None)
+
+    def get_value(self, doctype, name, fields, as_dict=False):
+        record = self.records.get(name)
+        return record and frappe._dict({field: record[field] for field in fields})
+
+    def set_value(self, doctype, filters, field, value=None):
+        self.writes += 1
+        if doctype == "Datafield Indicator":
+            self.records[filters].update(field)
+            return
+        for row in self.values:
+            if self.matches(row, filters):
+                row[field] = value
+
+    def bulk_insert(self, doctype, fields, values):
+        self.writes += len(values)
+        self.values.extend(dict(zip(fields, row)) for row in values)
+
+    def delete(self, doctype, filters):
+        self.values = [row for row in self.values if not self.matches(row, filters)]
+
+    def get_all(self, doctype, filters, fields, as_list=False, order_by=None):
+        if doctype == "Datafield Indicator":
+            rows = self.records.values()
+        else:
+            rows = sorted(self.values, key=lambda row: row["time"])
+        return [
+            [row[field] for field in fields]
+            for row in rows
+            if self.matches(row, filters)
+        ]
+
+
+class TestIndicators(unittest.TestCase):
+    def test_smooth_matches_recurrence(self):
+        values = np.random.default_rng(1).normal(0, 10, 20000)
+        for alpha in (0.5, 2 / 51, 1 / 200):
+            expected, y = [], 3.0
+            for value in values:
+                y = (1 - alpha) * y + alpha * value
+                expected.append(y)
+            np.testing.assert_allclose(smooth(values, alpha, 3.0), expected, rtol=1e-9)
+
+    def test_step_continues_compute(self):
+        bars = make_bars(301)
+        head = {column: values[:-1] for column, values in bars.items()}
+        bar = {column: values[-1] for column, values in bars.items()}
+        previous = {column: values[-2] for column, values in bars.items()}
+        for indicator in parse_indicators("sma:20, ema:50, rsi:14, atr:14"):
+            expected, _states = indicator.compute(bars)
+            values, states = indicator.compute(head)
+            # The state before the last bar reproduces it, the last one continues
+            value, _state = indicator.step(states[0], previous)
+            self.assertAlmostEqual(value, values[-1], places=8, msg=indicator.name)
+            value, _state = indicator.step(states[1], bar)
+            self.assertAlmostEqual(value, expected[-1], places=8, msg=indicator.name)
+
+    def test_warm_up(self):
+        values, states = Indicator("sma", 20).compute(make_bars(10))
+        self.assertIsNone(states)
+        self.assertTrue(np.isnan(values).all())
+
+    def test_parse_and_align(self):
+        names = [indicator.name for indicator in parse_indicators("SMA:20; ema 50\n")]
+        self.assertEqual(names, ["sma_20", "ema_50"])
+        with self.assertRaises(frappe.ValidationError):
+            parse_indicators("macd:12")
+
+        aligned = align_indicators(
+            {
+                "sma_2": {"t": [2, 3], "v": [1.5, 2.5]},
+                "ema_2": {"t": [3], "v": [1.0]},
+            }
+        )
+        self.assertEqual(aligned["t"], [2, 3])
+        self.assertEqual(aligned["ema_2"], [None, 1.0])
+
+    def test_update_writes_only_the_tail(self):
+        bars = make_bars(302)
+        head = {column: values[:300] for column, values in bars.items()}
+        db = StandInDB()
+        indicator = Indicator("ema", 20)
+        with (
+            patch.object(frappe, "db", db),
+            patch.object(frappe, "get_doc", db.insert),
+            patch.object(frappe, "get_all", db.get_all),
+            patch.object(frappe, "session", frappe._dict(user="Administrator")),
+            patch.object(frappe, "generate_hash", lambda length: str(len(db.values))),
+            patch.object(indicators, "now_datetime", lambda: None),
+        ):
+            with patch.object(indicators, "get_bars", lambda name: head):
+                compute_indicator("A", indicator, head)
+            # Warm-up values are not stored
+            self.assertEqual(len(db.values), 300 - 19)
+
+            db.writes = 0
+            with patch.object(
+                indicators, "get_bars", lambda name, start: select(bars, start)
+            ):
+                self.assertTrue(update_indicator("A", indicator))
+            # The last stored value, two new ones and the record
+            self.assertEqual(db.writes, 4)
+
+            data = get_indicator_data("A")["ema_20"]
+            expected, _states = indicator.compute(bars)
+            self.assertEqual(data["t"], bars["t"][19:])
+            np.testing.assert_allclose(data["v"], expected[19:], rtol=1e-9)
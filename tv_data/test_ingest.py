@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data import ingest
+from tv_data.ingest import drain_partition, enqueue_update, get_partition
+from tv_data.testing import StandInRedis
+
+
+class StandInDB:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def savepoint(self, name):
+        pass
+
+    def rollback(self, save_point=None):
+        pass
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.redis = StandInRedis()
+        self.jobs = []
+        self.applied = []
+        settings = frappe._dict(defaults=frappe._dict(ingest_partitions=4))
+
+        def process_update(user, key, value, n, insert, time_received):
+            if value < 0:
+                raise ValueError("rejected")
+            self.applied.append((key, value))
+
+        patches = (
+            patch.object(frappe, "cache", self.redis),
+            patch.object(frappe, "db", StandInDB()),
+            patch.object(frappe, "get_cached_doc", lambda doctype: settings),
+            patch.object(frappe, "enqueue", lambda method, **kw: self.jobs.append(kw)),
+            patch.object(frappe, "log_error", lambda *args: None),
+            patch.object(ingest, "process_update", process_update),
+        )
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_updates_of_a_key_apply_in_order(self):
+        partition = get_partition("u", "btc")
+        self.assertEqual(get_partition("u", "BTC", 4), partition)
+        for value in (1.0, -1.0, 2.0, 3.0):
+            self.assertEqual(enqueue_update("u", "btc", value, None, False), partition)
+        # One drain job per partition while it is scheduled
+        self.assertEqual(self.jobs, [{"queue": "default", "partition": partition}])
+
+        # A failing update is logged and skipped, the rest still apply
+        self.assertEqual(drain_partition(partition), 4)
+        self.assertEqual(self.applied, [("btc", 1.0), ("btc", 2.0), ("btc", 3.0)])
+        self.assertEqual(self.redis[ingest.QUEUE_KEY.format(partition)], [])
+
+        # The lock is released, so the next update schedules a new drain
+        enqueue_update("u", "btc", 4.0, None, False)
+        self.assertEqual(len(self.jobs), 2)
@@ -0,0 +1,52 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import frappe
+
+from tv_data.latest import LATEST_KEY, get_latest, set_latest
+from tv_data.testing import StandInCallbacks, StandInRedis
+
+
+class TestLatest(unittest.TestCase):
+    def setUp(self):
+        self.rows = [
+            frappe._dict(name="A", value=1.0, n=None, modified=datetime(2024, 8, 5)),
+            frappe._dict(name="B", value=2.0, n=3, modified=datetime(2024, 8, 5)),
+        ]
+        self.redis = StandInRedis()
+        self.after_commit = StandInCallbacks()
+        patches = (
+            patch.object(frappe, "cache", self.redis),
+            patch.object(frappe, "db", frappe._dict(after_commit=self.after_commit)),
+            patch.object(frappe, "get_all", lambda *args, **kwargs: self.rows),
+            patch.object(frappe, "has_permission", lambda *args, **kwargs: True),
+        )
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_get_latest_rebuilds_missing_map(self):
+        # Written by an update while the map was gone: newer than the table
+        set_latest("B", 5.0, 4, datetime(2024, 8, 6))
+        self.after_commit.run()
+
+        latest = get_latest("A,B,C")
+        self.assertEqual(latest["A"]["value"], 1.0)
+        self.assertEqual((latest["B"]["value"], latest["B"]["n"]), (5.0, 4))
+        self.assertIsNone(latest["C"])
+
+    def test_evicted_map_is_rebuilt(self):
+        get_latest("A")
+        del self.redis[LATEST_KEY]
+        # The next update recreates the hash with a single entry
+        set_latest("B", 5.0, 4)
+        self.after_commit.run()
+        self.assertEqual(get_latest("A")["A"]["value"], 1.0)
+
+    def test_rolled_back_write_is_dropped(self):
+        get_latest("A")
+        set_latest("A", 9.0, 1)
+        # Rollback
+        self.after_commit.clear()
+        self.assertEqual(get_latest("A")["A"]["value"], 1.0)
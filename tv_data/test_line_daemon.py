@@ -0,0 +1,94 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data.line_daemon import PointWriter, parse_line
+
+
+class DeadConnection:
+    def rollback(self):
+        raise ConnectionError("Lost connection to server during query")
+
+    def close(self):
+        pass
+
+
+class FlakyWriter(PointWriter):
+    """Fails the first `failures` writes, as a database that went away would."""
+
+    def __init__(self, failures):
+        super().__init__(batch_size=2, interval=1)
+        self.failures_left = failures
+        self.written = []
+
+    def write(self, points):
+        if self.failures_left:
+            self.failures_left -= 1
+            raise ConnectionError("MySQL server has gone away")
+        self.written.extend(points)
+        return len(points)
+
+
+class CommittedWriter(PointWriter):
+    """Commits every batch, then fails in an after-commit callback."""
+
+    def __init__(self):
+        super().__init__(batch_size=2, interval=1)
+        self.written = []
+
+    def write(self, points):
+        self.written.extend(points)
+        self.mark_committed()
+        raise ConnectionError("Redis is down")
+
+
+class TestLineDaemon(unittest.TestCase):
+    def test_parse_line(self):
+        self.assertEqual(
+            parse_line(b"user@example.com,btc 1.5 3 1722816000\n"),
+            ("user@example.com", "BTC", 1.5, 3, 1722816000.0),
+        )
+        # Millisecond timestamps
+        self.assertEqual(parse_line(b"u,k 2 1 1722816000000")[4], 1722816000.0)
+
+        user, key, value, n, _timestamp = parse_line(b"u,k 2")
+        self.assertEqual((user, key, value, n), ("u", "K", 2.0, None))
+
+    def test_invalid_lines(self):
+        for line in (b"u 1", b"u,k", b"u,k abc", b",k 1"):
+            with self.assertRaises(ValueError):
+                parse_line(line)
+
+    def flush_after_connection_loss(self, writer):
+        connections = []
+        with (
+            patch.object(frappe, "db", DeadConnection()),
+            patch.object(frappe, "connect", lambda: connections.append(1)),
+            patch.object(frappe, "log_error", lambda *args: None),
+        ):
+            for line in (b"u,a 1", b"u,b 2", b"u,c 3"):
+                writer.add(line)
+            return connections
+
+    def test_failed_batch_is_retried(self):
+        writer = FlakyWriter(failures=1)
+        connections = self.flush_after_connection_loss(writer)
+        self.assertEqual(connections, [1])
+        # Kept in order and held back until the retry is due
+        self.assertEqual([point[1] for point in writer.buffer], ["A", "B", "C"])
+        self.assertEqual(writer.flush(), 0)
+
+        self.assertEqual(writer.flush(force=True), 3)
+        self.assertEqual([point[1] for point in writer.written], ["A", "B", "C"])
+        self.assertEqual(writer.buffer, [])
+
+    def test_committed_batch_is_not_retried(self):
+        writer = CommittedWriter()
+        with patch.object(frappe, "log_error", lambda *args: None):
+            for line in (b"u,a 1", b"u,b 2", b"u,c 3"):
+                writer.add(line)
+            writer.flush()
+        self.assertEqual([point[1] for point in writer.written], ["A", "B", "C"])
+        self.assertEqual(writer.buffer, [])
+        self.assertEqual(writer.failures, 0)
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from tv_data import matrix
+from tv_data.matrix import align, fold_days, get_matrix, parse_symbols
+
+
+class TestMatrix(unittest.TestCase):
+    def test_fold_days(self):
+        columns = np.array([0, 0, 0, 1])
+        days = np.array([0, 1, 1, 1])
+        values = np.array([1.0, 2.0, 5.0, 3.0])
+        expected = {"open": [1, 2, 3], "close": [1, 5, 3], "high": [1, 5, 3]}
+        for field, folded in expected.items():
+            c, d, v = fold_days(columns, days, values, field)
+            self.assertEqual(c.tolist(), [0, 0, 1])
+            self.assertEqual(d.tolist(), [0, 1, 1])
+            self.assertEqual(v.tolist(), folded)
+        self.assertEqual(
+            fold_days(columns, days, values, "volume")[2].tolist(), [1, 7, 3]
+        )
+
+    def test_align(self):
+        columns = np.array([0, 0, 1, 1])
+        days = np.array([0, 2, 1, 2])
+        values = np.array([1.0, 3.0, 20.0, 30.0])
+
+        axis, matrix = align(2, columns, days, values, fill="nan")
+        self.assertEqual(axis.tolist(), [0, 1, 2])
+        np.testing.assert_array_equal(
+            matrix, [[1.0, np.nan], [np.nan, 20.0], [3.0, 30.0]]
+        )
+
+        _axis, matrix = align(2, columns, days, values)
+        np.testing.assert_array_equal(matrix, [[1.0, np.nan], [1.0, 20.0], [3.0, 30.0]])
+
+    def test_parse_symbols(self):
+        self.assertEqual(parse_symbols("A, B,A,"), ["A", "B"])
+        self.assertEqual(parse_symbols(["A", "B"]), ["A", "B"])
+
+    def test_nulls_are_gaps(self):
+        rows = [
+            ("A", "20240805T", 1.0),
+            ("A", "20240806T", None),
+            ("B", "20240805T", None),
+            ("B", "20240806T", 4.0),
+        ]
+        with patch.object(matrix, "get_rows", lambda *args: rows):
+            result = get_matrix("A,B", fill="nan")
+            self.assertEqual(result["values"], [[1.0, None], [None, 4.0]])
+            result = get_matrix("A,B")
+            self.assertEqual(result["values"], [[1.0, None], [1.0, 4.0]])
@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data.metrics import MetricsRegistry
+from tv_data.testing import StandInRedis
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.redis = StandInRedis()
+        self.warnings = []
+        logger = frappe._dict(warning=self.warnings.append)
+        patches = (
+            patch.object(frappe, "cache", self.redis),
+            patch.object(frappe, "logger", lambda *args: logger),
+        )
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_workers_aggregate_into_one_total(self):
+        for _ in range(2):
+            registry = MetricsRegistry(buckets=(0.1, 1.0))
+            registry.inc("ingested", 3)
+            registry.observe("drain", 0.05)
+            registry.observe("drain", 5.0)
+            registry.flush()
+
+        data = registry.collect()
+        self.assertEqual(data["counters"], {"ingested": 6})
+        self.assertEqual(
+            data["histograms"]["drain"],
+            {"count": 4, "sum": 10.1, "buckets": {"0.1": 2, "+Inf": 2}},
+        )
+
+        text = registry.to_prometheus(data)
+        self.assertIn("tv_data_ingested_total 6", text)
+        self.assertIn('tv_data_drain_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('tv_data_drain_seconds_bucket{le="+Inf"} 4', text)
+
+    def test_failed_flush_keeps_the_deltas(self):
+        registry = MetricsRegistry()
+        registry.inc("ingested")
+        self.redis.down = True
+        registry.flush()
+        self.assertEqual(len(self.warnings), 1)
+
+        registry.inc("ingested")
+        self.redis.down = False
+        self.assertEqual(registry.collect()["counters"], {"ingested": 2})
+
+    def test_timer_counts_errors(self):
+        registry = MetricsRegistry()
+        with self.assertRaises(ValueError):
+            with registry.timer("drain"):
+                raise ValueError
+
+        data = registry.collect()
+        self.assertEqual(data["counters"], {"drain_errors": 1})
+        self.assertEqual(data["histograms"]["drain"]["count"], 1)
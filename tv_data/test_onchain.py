@@ -0,0 +1,147 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tv_data.onchain import (
+    DATA_POINT_ADDED_TOPIC,
+    Bridge,
+    RpcClient,
+    RpcError,
+    address_topic,
+    get_points,
+    get_windows,
+)
+
+CONTRACT = "0x00000000000000000000000000000000000000c0"
+ALICE = "0x00000000000000000000000000000000000000a1"
+BOB = "0x00000000000000000000000000000000000000b0"
+
+
+def word(value: int) -> str:
+    return format(value % 2**256, "064x")
+
+
+def make_log(block: int, index: int, address: str, integer: int, fixed: int):
+    return {
+        "address": CONTRACT,
+        "blockNumber": hex(block),
+        "logIndex": hex(index),
+        "topics": [DATA_POINT_ADDED_TOPIC, address_topic(address)],
+        "data": "0x" + word(integer) + word(fixed) + word(1722816000 + block),
+    }
+
+
+class StubNode(BaseHTTPRequestHandler):
+    """JSON-RPC node answering `eth_blockNumber` and `eth_getLogs` from `logs`."""
+
+    head = 1000
+    logs = []
+    max_results = 3
+    posts = []
+    error = None
+
+    def do_POST(self):
+        batch = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StubNode.posts.append(len(batch))
+        # Answer in reverse to check replies are matched by id
+        body = json.dumps([self.answer(request) for request in reversed(batch)])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def answer(self, request):
+        reply = {"jsonrpc": "2.0", "id": request["id"]}
+        if request["method"] == "eth_blockNumber":
+            reply["result"] = hex(self.head)
+            return reply
+
+        if self.error:
+            reply["error"] = self.error
+            return reply
+
+        query = request["params"][0]
+        start, end = int(query["fromBlock"], 16), int(query["toBlock"], 16)
+        logs = [
+            log
+            for log in self.logs
+            if start <= int(log["blockNumber"], 16) <= end
+            and log["topics"][0] == query["topics"][0]
+            and log["topics"][1] in query["topics"][1]
+        ]
+        if len(logs) > self.max_results:
+            reply["error"] = {"code": -32005, "message": "query returned too many logs"}
+        else:
+            reply["result"] = logs
+        return reply
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOnchain(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubNode)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubNode.posts = []
+        StubNode.error = None
+        StubNode.logs = [
+            make_log(10, 0, ALICE, 1, 15 * 10**17),
+            make_log(10, 1, BOB, 2, -(10**18)),
+            make_log(60, 0, ALICE, 3, 10**18),
+            make_log(61, 0, ALICE, 4, 10**18),
+            make_log(500, 0, ALICE, 5, 2 * 10**18),
+        ]
+
+    def test_get_windows(self):
+        self.assertEqual(get_windows(1, 10, 4), [(1, 4), (5, 8), (9, 10)])
+        self.assertEqual(get_windows(5, 5, 4), [(5, 5)])
+
+    def test_fetch_logs(self):
+        bridge = Bridge(
+            RpcClient(self.url),
+            CONTRACT,
+            [ALICE, BOB],
+            window=100,
+            batch_size=4,
+            concurrency=2,
+        )
+        self.assertEqual(bridge.get_head(), 1000)
+
+        logs = bridge.fetch_logs(0, 999)
+        # 10 windows in batches of 4, plus the halves of the window with 4 logs
+        self.assertEqual(sorted(StubNode.posts[1:]), [2, 2, 4, 4])
+        self.assertEqual(
+            [(int(log["blockNumber"], 16), int(log["logIndex"], 16)) for log in logs],
+            [(10, 0), (10, 1), (60, 0), (61, 0), (500, 0)],
+        )
+
+        points = get_points(logs, {ALICE: ("u@example.com", "ALICE")})
+        self.assertEqual(len(points), 4)
+        self.assertEqual(points[0], ("u@example.com", "ALICE", 1.5, 1, 1722816010.0))
+
+    def test_negative_values(self):
+        bridge = Bridge(RpcClient(self.url), CONTRACT, [BOB])
+        logs = bridge.fetch_logs(0, 100)
+        self.assertEqual(get_points(logs, {BOB: ("u", "BOB")})[0][2:4], (-1.0, 2))
+
+    def test_other_errors_are_not_split(self):
+        bridge = Bridge(RpcClient(self.url), CONTRACT, [ALICE], window=100)
+        StubNode.error = {
+            "code": -32005,
+            "message": "daily request count exceeded, request rate limited",
+        }
+        with self.assertRaises(RpcError) as context:
+            bridge.fetch_logs(0, 99)
+        self.assertEqual(context.exception.code, -32005)
+        self.assertEqual(StubNode.posts, [1])
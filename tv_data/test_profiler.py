@@ -0,0 +1,53 @@
+import time
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data.profiler import SamplingProfiler, start_profiling, stop_profiling
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiler(unittest.TestCase):
+    def test_samples_the_target_thread(self):
+        profiler = SamplingProfiler(interval=0.001).start()
+        busy(0.05)
+        stacks = profiler.stop()
+        self.assertTrue(stacks)
+        self.assertTrue(any("busy (" in stack for stack in stacks))
+
+    def test_delay_skips_fast_calls(self):
+        profiler = SamplingProfiler(interval=0.001).start(delay=1.0)
+        busy(0.01)
+        self.assertFalse(profiler.stop())
+
+    def profile(self, seconds):
+        settings = frappe._dict(
+            enable_profiling=1,
+            profiling_sample_rate=0,
+            profiling_threshold=0.05,
+            profiling_interval=1,
+        )
+        jobs = []
+        with (
+            patch.object(frappe, "local", frappe._dict()),
+            patch.object(frappe, "get_cached_doc", lambda doctype: settings),
+            patch.object(
+                frappe, "enqueue", lambda *args, **kwargs: jobs.append(kwargs)
+            ),
+        ):
+            start_profiling("tv_data.api.update")
+            busy(seconds)
+            stop_profiling()
+        return jobs
+
+    def test_only_slow_calls_are_saved_outside_the_sample(self):
+        self.assertEqual(self.profile(0.01), [])
+        (job,) = self.profile(0.15)
+        self.assertEqual(job["target"], "tv_data.api.update")
+        self.assertGreaterEqual(job["duration_ms"], 150)
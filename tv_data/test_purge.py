@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data import purge
+from tv_data.purge import Purge
+
+
+class StandInDB:
+    """Tables of `(name, datafield)` rows with the calls a purge makes."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.commits = 0
+
+    def get_all(self, doctype, filters, pluck, limit_page_length):
+        ((field, datafield),) = filters.items()
+        rows = [name for name, owner in self.tables[doctype] if owner == datafield]
+        return rows[:limit_page_length]
+
+    def delete(self, doctype, filters):
+        names = set(filters["name"][1])
+        self.tables[doctype] = [
+            row for row in self.tables[doctype] if row[0] not in names
+        ]
+
+    def exists(self, doctype, name):
+        return any(row[0] == name for row in self.tables[doctype])
+
+    def delete_doc(self, doctype, name, ignore_permissions=False):
+        self.delete(doctype, {"name": ["in", [name]]})
+
+    def commit(self):
+        self.commits += 1
+
+
+class TestPurge(unittest.TestCase):
+    def test_resumes_in_chunks(self):
+        db = StandInDB(
+            {
+                "Datafield": [("A", None), ("B", None)],
+                "Datafield Merged Update": [(f"M{i}", "B") for i in range(5)],
+                "Datafield Indicator Value": [],
+                "Datafield Indicator": [],
+                "Datafield Update Table": [("U1", "A"), ("U2", "B")],
+                "Datafield Series": [(f"S{i}", "B") for i in range(4)],
+            }
+        )
+        states = {
+            "job": {
+                "status": "Running",
+                "user": "Administrator",
+                "datafields": ["A", "B"],
+                # Interrupted after A
+                "done": ["A"],
+                "current": "B",
+                "deleted": {},
+            }
+        }
+        settings = frappe._dict(defaults=frappe._dict(purge_chunk_size=2))
+        with (
+            patch.object(frappe, "get_cached_doc", lambda doctype: settings),
+            patch.object(frappe, "get_all", db.get_all),
+            patch.object(frappe, "delete_doc", db.delete_doc),
+            patch.object(frappe, "db", db),
+            patch.object(frappe, "publish_realtime", lambda *args, **kwargs: None),
+            patch.object(purge, "get_state", states.get),
+            patch.object(purge, "set_state", states.__setitem__),
+            patch.object(purge.time, "sleep", lambda seconds: None),
+        ):
+            state = Purge("job").run()
+
+        self.assertEqual(state["status"], "Completed")
+        self.assertEqual(state["done"], ["A", "B"])
+        self.assertEqual(
+            state["deleted"],
+            {
+                "Datafield Merged Update": 5,
+                "Datafield Update Table": 1,
+                "Datafield Series": 4,
+            },
+        )
+        self.assertEqual(db.tables["Datafield"], [("A", None)])
+        self.assertEqual(db.tables["Datafield Update Table"], [("U1", "A")])
+        # One transaction per chunk of at most 2 rows, plus the Datafield
+        # itself, and the start and end of the job
+        self.assertEqual(db.commits, 3 + 1 + 2 + 1 + 2)
+
+    def test_missing_state(self):
+        with patch.object(purge, "get_state", lambda purge_id: None):
+            with self.assertRaises(frappe.DoesNotExistError):
+                Purge("gone")
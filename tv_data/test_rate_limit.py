@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data.rate_limit import TOKEN_BUCKET_SCRIPT, RateLimiter
+from tv_data.testing import StandInRedis
+
+
+class ScriptedRedis(StandInRedis):
+    """Runs the token bucket script in Python, against a clock the test controls."""
+
+    def __init__(self):
+        super().__init__()
+        self.now = 1000.0
+        self.registered = 0
+
+    def register_script(self, source):
+        assert source == TOKEN_BUCKET_SCRIPT
+        self.registered += 1
+        return self.run
+
+    def run(self, keys, args):
+        tokens, retry_after = [], 0.0
+        for i, key in enumerate(keys):
+            rate, burst = args[2 * i], args[2 * i + 1]
+            available, ts = self.get(key, (burst, self.now))
+            available = min(burst, available + max(0.0, self.now - ts) * rate)
+            tokens.append(available)
+            if available < 1:
+                retry_after = max(retry_after, (1 - available) / rate)
+        if retry_after > 0:
+            return [0, str(retry_after)]
+        for key, available in zip(keys, tokens):
+            self[key] = (available - 1, self.now)
+        return [1, "0"]
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.redis = ScriptedRedis()
+        defaults = frappe._dict(
+            rate_limit_user=10, rate_limit_user_burst=3, rate_limit_key=1
+        )
+        settings = frappe._dict(defaults=defaults)
+        patches = (
+            patch.object(frappe, "cache", self.redis),
+            patch.object(frappe, "get_cached_doc", lambda doctype: settings),
+        )
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.limiter = RateLimiter()
+
+    def test_user_bucket(self):
+        # The burst, then one token per 1/rate seconds
+        self.assertEqual([self.limiter.check("u") for _ in range(3)], [0.0] * 3)
+        self.assertAlmostEqual(self.limiter.check("u"), 0.1)
+        self.redis.now += 0.1
+        self.assertEqual(self.limiter.check("u"), 0.0)
+        # The script is registered once, not on every check
+        self.assertEqual(self.redis.registered, 1)
+
+    def test_buckets_are_debited_together(self):
+        self.assertEqual(self.limiter.check("u", "btc"), 0.0)
+        self.assertAlmostEqual(self.limiter.check("u", "BTC"), 1.0)
+        # The rejected update took no token from the user bucket
+        self.assertEqual(self.limiter.check("u", "eth"), 0.0)
+        self.assertEqual(self.limiter.check("u"), 0.0)
+        self.assertGreater(self.limiter.check("u"), 0)
+
+    def test_disabled_without_rate(self):
+        frappe.get_cached_doc("TV Data Settings").defaults.rate_limit_user = 0
+        for _ in range(10):
+            self.assertEqual(self.limiter.check("u"), 0.0)
+        self.assertEqual(self.redis.registered, 0)
@@ -0,0 +1,77 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data.realtime import (
+    FLUSH_LOCK_KEY,
+    TRAILING_LOCK_KEY,
+    flush_updates,
+    queue_update,
+)
+from tv_data.testing import StandInCallbacks, StandInRedis
+
+
+class TestRealtime(unittest.TestCase):
+    def test_bursts_are_pushed_once_per_tick(self):
+        redis = StandInRedis()
+        after_commit = StandInCallbacks()
+        jobs, messages = [], []
+        settings = frappe._dict(defaults=frappe._dict(realtime_interval=1))
+        with (
+            patch.object(frappe, "cache", redis),
+            patch.object(frappe, "db", frappe._dict(after_commit=after_commit)),
+            patch.object(frappe, "get_cached_doc", lambda doctype: settings),
+            patch.object(
+                frappe,
+                "enqueue",
+                lambda method, **kwargs: jobs.append((method, kwargs.get("wait"))),
+            ),
+            patch.object(
+                frappe,
+                "publish_realtime",
+                lambda event, message, **kwargs: messages.append(
+                    (event, message, kwargs)
+                ),
+            ),
+        ):
+            for value in (1.0, 2.0, 3.0):
+                queue_update("A", value, 1)
+            queue_update("B", 5.0, 2)
+            # Nothing is pushed before the commit
+            self.assertEqual(jobs, [])
+            after_commit.run()
+            # Only the first update of the tick enqueues a flush, which never sleeps
+            # and the second one a trailing flush at the end of the tick
+            self.assertEqual(
+                jobs,
+                [
+                    ("tv_data.realtime.flush_updates", None),
+                    ("tv_data.realtime.flush_trailing", 0.5),
+                ],
+            )
+
+            self.assertEqual(flush_updates(), 2)
+            pushed = {m["doc_name"]: m["value"] for e, m, _ in messages[:2]}
+            self.assertEqual(pushed, {"A": 3.0, "B": 5.0})
+            event, message, kwargs = messages[2]
+            self.assertEqual(event, "datafield_updates")
+            self.assertEqual(len(message["updates"]), 2)
+            self.assertEqual(kwargs["room"], "doctype:Datafield")
+
+            # Nothing pending: the scheduler's flush publishes nothing
+            self.assertEqual(flush_updates(), 0)
+            self.assertEqual(len(messages), 3)
+
+            # Still within the tick: the trailing flush will push the value
+            queue_update("A", 4.0, 1)
+            after_commit.run()
+            self.assertEqual(len(jobs), 2)
+            del redis[FLUSH_LOCK_KEY], redis[TRAILING_LOCK_KEY]
+            queue_update("A", 6.0, 1)
+            after_commit.run()
+            self.assertEqual(len(jobs), 3)
+            self.assertEqual(
+                json.loads(redis["tv_data:realtime:pending"][b"A"])["value"], 6.0
+            )
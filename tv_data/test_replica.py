@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data.replica import replica_read
+
+
+class StandInDB:
+    """Stand-in connection answering the replication status query with `lag`."""
+
+    def __init__(self, name, lag=None, replicating=True, privileged=True):
+        self.name = name
+        self.lag = lag
+        self.replicating = replicating
+        self.privileged = privileged
+        self.closed = False
+
+    def sql(self, query, as_dict=False):
+        if not self.privileged:
+            raise Exception("Access denied; you need the REPLICATION CLIENT privilege")
+        if query == "show replica status":
+            raise Exception("You have an error in your SQL syntax")
+        return [{"Seconds_Behind_Master": self.lag}] if self.replicating else []
+
+    def is_syntax_error(self, e):
+        return "SQL syntax" in str(e)
+
+    def close(self):
+        self.closed = True
+
+
+class StandInCache(dict):
+    def make_key(self, key):
+        return key
+
+    def set(self, key, value, ex=None):
+        self[key] = str(value).encode()
+
+
+class LocalDB:
+    """`frappe.db`, which proxies the connection in `frappe.local.db`."""
+
+    def __getattr__(self, name):
+        return getattr(frappe.local.db, name)
+
+
+def read_only():
+    """Frappe's read-only mode: swap in the replica connection for the call."""
+
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            frappe.local.primary_db = frappe.local.db
+            frappe.local.db = frappe.local.replica_db
+            try:
+                return func(*args, **kwargs)
+            finally:
+                frappe.local.db.close()
+                frappe.local.db = frappe.local.primary_db
+
+        return wrapper
+
+    return decorator
+
+
+class TestReplica(unittest.TestCase):
+    def route(self, replica, read_from_replica=True, max_lag=None):
+        self.errors = []
+        primary = StandInDB("primary")
+        local = frappe._dict(db=primary, replica_db=replica)
+        settings = frappe._dict(defaults=frappe._dict(replica_max_lag=5))
+        with (
+            patch.object(frappe, "local", local),
+            patch.object(frappe, "db", LocalDB()),
+            patch.object(
+                frappe, "conf", frappe._dict(read_from_replica=read_from_replica)
+            ),
+            patch.object(frappe, "cache", StandInCache()),
+            patch.object(frappe, "read_only", read_only),
+            patch.object(frappe, "get_cached_doc", lambda doctype: settings),
+            patch.object(
+                frappe, "log_error", lambda message, title: self.errors.append(message)
+            ),
+        ):
+
+            @replica_read(max_lag)
+            def read():
+                return frappe.local.db.name
+
+            used = read()
+            self.assertIs(frappe.local.db, primary)
+            return used
+
+    def test_reads_from_fresh_replica(self):
+        replica = StandInDB("replica", lag=2)
+        self.assertEqual(self.route(replica), "replica")
+        self.assertTrue(replica.closed)
+
+    def test_falls_back_to_primary(self):
+        # Lagging, stopped, or not configured
+        self.assertEqual(self.route(StandInDB("replica", lag=30)), "primary")
+        self.assertEqual(self.route(StandInDB("replica", lag=None)), "primary")
+        self.assertEqual(self.route(StandInDB("replica", lag=2), False), "primary")
+        self.assertEqual(self.route(StandInDB("replica", lag=2), max_lag=0), "primary")
+
+    def test_server_that_is_not_replicating(self):
+        replica = StandInDB("replica", replicating=False)
+        self.assertEqual(self.route(replica), "replica")
+
+    def test_probe_without_privilege(self):
+        replica = StandInDB("replica", lag=2, privileged=False)
+        self.assertEqual(self.route(replica), "primary")
+        self.assertEqual(len(self.errors), 1)
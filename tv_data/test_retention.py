@@ -0,0 +1,36 @@
+import unittest
+from datetime import datetime
+
+from tv_data.retention import bucket_date, fold_rows, get_windows
+
+
+class TestRetention(unittest.TestCase):
+    def test_bucket_date(self):
+        # 2024-08-07 is a Wednesday
+        self.assertEqual(bucket_date("20240807T", "Daily"), "20240807T")
+        self.assertEqual(bucket_date("20240807T", "Weekly"), "20240805T")
+        self.assertEqual(bucket_date("20240807T", "Monthly"), "20240801T")
+
+    def test_fold_rows(self):
+        rows = [
+            ("a", "20240805T", 1, 3, 1, 2, 5),
+            ("b", "20240805T", 2, 4, 0.5, 3, 5),
+            ("c", "20240806T", 3, 3, 3, 3, 1),
+        ]
+        updates, deletes = fold_rows(rows, "Daily")
+        self.assertEqual(updates, [("a", "20240805T", 1, 4, 0.5, 3, 10)])
+        self.assertEqual(deletes, ["b"])
+
+        updates, deletes = fold_rows(rows, "Weekly")
+        self.assertEqual(updates, [("a", "20240805T", 1, 4, 0.5, 3, 11)])
+        self.assertEqual(deletes, ["b", "c"])
+
+        # Already folded
+        self.assertEqual(fold_rows(updates, "Weekly"), ([], []))
+
+    def test_get_windows(self):
+        windows = get_windows([(365, "Monthly"), (30, "Daily")], datetime(2024, 8, 5))
+        self.assertEqual(
+            windows,
+            [("20230806T", "20240706T", "Daily"), (None, "20230806T", "Monthly")],
+        )
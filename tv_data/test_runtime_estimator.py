@@ -0,0 +1,29 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from tv_data.runtime_estimator import RuntimeEstimator
+from tv_data.testing import StandInRedis
+
+
+class TestRuntimeEstimator(unittest.TestCase):
+    def test_failed_runs_are_recorded(self):
+        estimator = RuntimeEstimator()
+        clock = iter([0.0, 2.0, 10.0, 40.0])
+        with (
+            patch.object(frappe, "cache", StandInRedis()),
+            patch("tv_data.runtime_estimator.time.perf_counter", lambda: next(clock)),
+        ):
+            with estimator.measure("merge"):
+                pass
+            with self.assertRaises(TimeoutError):
+                with estimator.measure("merge"):
+                    raise TimeoutError
+
+            estimate = estimator.get_stage_estimate("merge")
+            self.assertEqual(estimate["samples"], 2)
+            # The slow failure sets the p95 and pulls up the EWMA
+            self.assertEqual(estimate["p95"], 30.0)
+            self.assertAlmostEqual(estimate["ewma"], 0.3 * 30.0 + 0.7 * 2.0)
+            self.assertEqual(estimator.predict_runtime(["merge"]), 30.0)
@@ -0,0 +1,49 @@
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+import frappe
+
+from tv_data import scheduler
+from tv_data.scheduler import RUN_LOCK_KEY, run_cycle
+from tv_data.testing import StandInRedis
+
+
+class StandInLog(frappe._dict):
+    def db_set(self, values, commit=False):
+        self.update(values)
+
+
+class TestScheduler(unittest.TestCase):
+    def test_cycles_do_not_overlap(self):
+        redis = StandInRedis()
+        logs = {
+            name: StandInLog(name=name, status="Scheduled")
+            for name in ("CYCLE-1", "CYCLE-2", "CYCLE-3")
+        }
+        settings = frappe._dict(
+            cycle_manager=frappe._dict(cycle_duration=timedelta(minutes=5))
+        )
+        runs = []
+
+        def run_locked_cycle(log):
+            runs.append(log.name)
+            if log.name == "CYCLE-1":
+                # The next cycle is triggered while this one still merges
+                run_cycle("CYCLE-2")
+
+        with (
+            patch.object(frappe, "cache", redis),
+            patch.object(frappe, "get_doc", lambda doctype, name: logs[name]),
+            patch.object(frappe, "get_single", lambda doctype: settings),
+            patch.object(scheduler, "run_locked_cycle", run_locked_cycle),
+        ):
+            run_cycle("CYCLE-1")
+            self.assertEqual(runs, ["CYCLE-1"])
+            self.assertEqual(logs["CYCLE-2"].status, "Skipped")
+            self.assertIn("CYCLE-1", logs["CYCLE-2"].error)
+
+            # Released once the run is over
+            self.assertNotIn(RUN_LOCK_KEY, redis)
+            run_cycle("CYCLE-3")
+            self.assertEqual(runs, ["CYCLE-1", "CYCLE-3"])
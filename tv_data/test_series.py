@@ -0,0 +1,85 @@
+import unittest
+
+from tv_data.series import date_string_to_timestamp, fill_gaps, rows_to_bars
+
+
+def bar(date_string, close, volume=1):
+    return {
+        "date_string": date_string,
+        "open": close,
+        "high": close,
+        "low": close,
+        "close": close,
+        "volume": volume,
+    }
+
+
+class TestFillGaps(unittest.TestCase):
+    def test_fills_missing_days_with_previous_close(self):
+        rows = [
+            bar("20240805T", 1.0),
+            bar("20240805T", 2.0),
+            bar("20240808T", 3.0),
+        ]
+        filled = fill_gaps(rows, "20240810T")
+        self.assertEqual(
+            [row["date_string"] for row in filled],
+            [
+                "20240805T",
+                "20240805T",
+                "20240806T",
+                "20240807T",
+                "20240808T",
+                "20240809T",
+                "20240810T",
+            ],
+        )
+        # Rows sharing a day keep their order; fillers carry the last close
+        self.assertEqual(filled[:2], rows[:2])
+        self.assertEqual(filled[2], bar("20240806T", 2.0, volume=0))
+        self.assertEqual(filled[6], bar("20240810T", 3.0, volume=0))
+
+    def test_nothing_to_fill(self):
+        rows = [bar("20240805T", 1.0), bar("20240806T", 2.0)]
+        self.assertIs(fill_gaps(rows, "20240801T"), rows)
+        self.assertEqual(fill_gaps([], "20240801T"), [])
+
+
+class TestRowsToBars(unittest.TestCase):
+    def test_folds_rows_of_a_day(self):
+        bars = rows_to_bars(
+            [
+                ["20240805T", 1, 2, 0.5, 1.5, 3],
+                ["20240805T", 1.5, 4, 1, 3, 2],
+                ["20240806T", 3, 3, 3, 3, 1],
+            ]
+        )
+        self.assertEqual(
+            bars["t"],
+            [
+                date_string_to_timestamp("20240805T"),
+                date_string_to_timestamp("20240806T"),
+            ],
+        )
+        self.assertEqual(
+            [bars[c][0] for c in ("o", "h", "l", "c", "v")], [1, 4, 0.5, 3, 5]
+        )
+
+    def test_nulls_are_skipped(self):
+        bars = rows_to_bars(
+            [
+                ["20240805T", 1, 2, 0.5, 1.5, 3],
+                ["20240805T", None, None, None, None, None],
+                ["20240806T", None, None, None, None, None],
+                ["20240806T", 2, 2, 2, 2, 1],
+            ]
+        )
+        self.assertEqual(
+            [bars[c][0] for c in ("o", "h", "l", "c", "v")], [1, 2, 0.5, 1.5, 3]
+        )
+        self.assertEqual(
+            [bars[c][1] for c in ("o", "h", "l", "c", "v")], [2, 2, 2, 2, 1]
+        )
+
+        bars = rows_to_bars([["20240805T", None, None, None, None, None]] * 2)
+        self.assertEqual(bars["c"], [None])
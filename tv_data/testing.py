@@ -0,0 +1,162 @@
+"""Stand-ins for `frappe.cache` and `frappe.db.after_commit` shared by the unit tests."""
+
+from typing import Any, List
+
+
+def encode(value: Any) -> bytes:
+    # Redis hands back bytes whatever was written
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+def span(items: List, start: int, end: int) -> List:
+    """`items[start..end]`, both inclusive and counted from the end when negative."""
+    end = len(items) + end if end < 0 else end
+    return items[start : end + 1]
+
+
+class StandInRedis(dict):
+    """The `frappe.cache` calls of the app, on a dict.
+
+    Keys never expire; `pttl` reports `ttl` milliseconds left for any key
+    that exists. Set `down` to fail every pipeline like a lost connection.
+    """
+
+    def __init__(self, ttl: int = 500):
+        super().__init__()
+        self.ttl = ttl
+        self.down = False
+
+    def make_key(self, key):
+        return key
+
+    def set(self, key, value, nx=False, ex=None, px=None):
+        if nx and key in self:
+            return False
+        self[key] = value
+        return True
+
+    def delete(self, key):
+        self.pop(key, None)
+
+    def incr(self, key):
+        self[key] = int(self[key]) + 1
+        return self[key]
+
+    def pttl(self, key):
+        return self.ttl if key in self else -2
+
+    def pipeline(self):
+        return StandInPipeline(self)
+
+
+class StandInPipeline:
+    """Collects hash and list commands and applies them on `execute`.
+
+    Like redis-py, `execute` returns one result per command, in order.
+    """
+
+    def __init__(self, redis: StandInRedis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, command):
+        if command.startswith("do_"):
+            raise AttributeError(f"StandInPipeline does not support {command[3:]}")
+
+        def stage(*args):
+            self.commands.append((command, args))
+            return self
+
+        return stage
+
+    def execute(self):
+        if self.redis.down:
+            raise ConnectionError("Redis is down")
+        return [
+            getattr(self, f"do_{command}")(key, *args)
+            for command, (key, *args) in self.commands
+        ]
+
+    # Hash commands store fields and values as bytes, as Redis returns them
+
+    def table(self, key):
+        return self.redis.setdefault(key, {})
+
+    def do_hset(self, key, field, value):
+        fields = self.table(key)
+        added = encode(field) not in fields
+        fields[encode(field)] = encode(value)
+        return int(added)
+
+    def do_hsetnx(self, key, field, value):
+        fields = self.table(key)
+        if encode(field) in fields:
+            return 0
+        fields[encode(field)] = encode(value)
+        return 1
+
+    def do_hdel(self, key, field):
+        return int(self.table(key).pop(encode(field), None) is not None)
+
+    def do_hget(self, key, field):
+        return self.redis.get(key, {}).get(encode(field))
+
+    def do_hmget(self, key, fields):
+        return [self.do_hget(key, field) for field in fields]
+
+    def do_hgetall(self, key):
+        return dict(self.redis.get(key, {}))
+
+    def do_hincrby(self, key, field, value):
+        fields = self.table(key)
+        total = int(fields.get(encode(field), b"0")) + value
+        fields[encode(field)] = encode(total)
+        return total
+
+    def do_hincrbyfloat(self, key, field, value):
+        fields = self.table(key)
+        total = float(fields.get(encode(field), b"0")) + value
+        fields[encode(field)] = encode(total)
+        return total
+
+    # List commands
+
+    def do_rpush(self, key, value):
+        items = self.redis.setdefault(key, [])
+        items.append(encode(value))
+        return len(items)
+
+    def do_lpush(self, key, value):
+        items = self.redis.setdefault(key, [])
+        items.insert(0, encode(value))
+        return len(items)
+
+    def do_lrange(self, key, start, end):
+        return span(self.redis.get(key, []), start, end)
+
+    def do_ltrim(self, key, start, end):
+        self.redis[key] = span(self.redis.get(key, []), start, end)
+        return True
+
+    def do_llen(self, key):
+        return len(self.redis.get(key, []))
+
+    def do_expire(self, key, seconds):
+        return key in self.redis
+
+    def do_delete(self, key):
+        return int(self.redis.pop(key, None) is not None)
+
+
+class StandInCallbacks(list):
+    """`frappe.db.after_commit`: callbacks run on commit and dropped on rollback."""
+
+    def add(self, callback):
+        self.append(callback)
+
+    def run(self):
+        while self:
+            self.pop(0)()
+
+    def reset(self):
+        self.clear()
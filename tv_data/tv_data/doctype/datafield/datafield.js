@@ -4,6 +4,11 @@ frappe.ui.form.on("Datafield", {
     frm.add_custom_button("Merge Updates", function () {
       frm.events.merge_updates(frm);
     });
+    if (!frm.is_new()) {
+      frm.add_custom_button("Backfill", function () {
+        frm.events.backfill(frm);
+      });
+    }
   },
   onload: function (frm) {
     frm.events.render_chart(frm);
@@ -28,6 +33,38 @@ frappe.ui.form.on("Datafield", {
       },
     });
   },
+  backfill: function (frm) {
+    let dialog = new frappe.ui.Dialog({
+      title: "Backfill Series",
+      fields: [
+        {
+          fieldname: "file_url",
+          fieldtype: "Attach",
+          label: "CSV or NDJSON file",
+          reqd: 1,
+        },
+      ],
+      primary_action_label: "Start",
+      primary_action: function (values) {
+        dialog.hide();
+        frappe.call({
+          method: "tv_data.backfill.enqueue_backfill",
+          args: {
+            datafield: frm.doc.name,
+            file_url: values.file_url,
+          },
+          callback: function (r) {
+            frm.backfill_job = r.message;
+            frappe.show_alert({
+              message: "Backfill queued",
+              indicator: "blue",
+            });
+          },
+        });
+      },
+    });
+    dialog.show();
+  },
   render_chart: function (frm) {
     let wrapper = frm.get_field("chart_html").$wrapper;
 
@@ -47,9 +84,22 @@ frappe.ui.form.on("Datafield", {
 
     wrapper.empty();
 
-    let data = frm.events.get_chart_data(frm);
+    if (frm.is_new()) {
+      wrapper.html(
+        '<div class="alert alert-warning">No data available for the chart.</div>'
+      );
+      return;
+    }
 
-    if (data.labels.length === 0) {
+    frm.events.get_chart_data(frm, wrapper.width()).then((data) => {
+      frm.events.draw_chart(frm, wrapper, data);
+    });
+  },
+
+  draw_chart: function (frm, wrapper, data) {
+    wrapper.empty();
+
+    if (!data || data.labels.length === 0) {
       wrapper.html(
         '<div class="alert alert-warning">No data available for the chart.</div>'
       );
@@ -86,44 +136,67 @@ frappe.ui.form.on("Datafield", {
     }
   },
 
-  get_chart_data: function (frm) {
-    let labels = [];
-    let datasets = [
-      { name: "Open", values: [], chartType: "line" },
-      { name: "High", values: [], chartType: "line" },
-      { name: "Low", values: [], chartType: "line" },
-      { name: "Close", values: [], chartType: "line" },
-      { name: "Volume", values: [], chartType: "bar" },
-    ];
-
-    (frm.doc.datafield_series_table || []).forEach(function (row) {
-      labels.push(row.date_string);
-      datasets[0].values.push(row.open);
-      datasets[1].values.push(row.high);
-      datasets[2].values.push(row.low);
-      datasets[3].values.push(row.close);
-      datasets[4].values.push(row.volume);
-    });
-
-    return {
-      labels: labels,
-      datasets: datasets,
-    };
+  get_chart_data: function (frm, width) {
+    // Downsampled on the server to roughly one point per pixel
+    return frappe
+      .call({
+        method: "tv_data.tv_data.doctype.datafield.datafield.get_chart_data",
+        args: {
+          doc_name: frm.doc.name,
+          width: Math.round(width) || 800,
+        },
+      })
+      .then((r) => r.message);
   },
 });
 
+frappe.realtime.on("tv_data_backfill_progress", function (data) {
+  if (!cur_frm || cur_frm.backfill_job !== data.job_id) {
+    return;
+  }
+
+  frappe.show_progress(
+    "Backfill",
+    data.percent,
+    100,
+    `${data.inserted} bars inserted, ${data.duplicates} duplicates, ${data.invalid} invalid`
+  );
+  if (data.status !== "Running") {
+    frappe.hide_progress();
+    cur_frm.backfill_job = null;
+    frappe.msgprint({
+      title: `Backfill ${data.status}`,
+      message: [
+        `${data.inserted} bars inserted from ${data.rows} rows.`,
+        ...data.errors,
+      ].join("<br>"),
+      indicator: data.status === "Completed" ? "green" : "red",
+    });
+    cur_frm.events.render_chart(cur_frm);
+  }
+});
+
 frappe.realtime.on("datafield_update", function (data) {
-  console.log("Datafield Update", data);
+  // Pushed at most once per realtime tick per Datafield, see tv_data/realtime.py
   if (
-    frappe.get_route_str() === `Form/${frappe.router.slug(data.doc_name)}` ||
-    data.doc_name == cur_frm.doc.name
+    !cur_frm ||
+    cur_frm.doctype !== "Datafield" ||
+    data.doc_name !== cur_frm.doc.name
   ) {
-    frappe.show_alert({
-      message: data.message,
-      indicator: "green",
-    });
+    return;
+  }
+
+  frappe.show_alert({
+    message: data.message,
+    indicator: "green",
+  });
 
-    // Refresh the form
-    cur_frm.reload_doc();
+  if (cur_frm.is_dirty()) {
+    return;
   }
+
+  // Reflect the pushed value without a full reload of the document
+  cur_frm.doc.value = data.value;
+  cur_frm.doc.n = data.n;
+  cur_frm.refresh_fields(["value", "n"]);
 });
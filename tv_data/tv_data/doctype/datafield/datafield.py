@@ -1,14 +1,49 @@
 import frappe
 from frappe.model.document import Document
 import datetime
-from typing import Dict, Optional, Union
+from typing import Dict, Iterable, List, Optional, Union
 from frappe import _
+from frappe.utils import cint
 import os
 import csv
 import json
+import hashlib
+import numpy as np
 import requests
 
-
+from tv_data.bar_cache import hot_bars
+from tv_data.capture import capture
+from tv_data.downsample import lttb
+from tv_data.formula import bump_graph_version, check_formula, get_graph
+from tv_data.indicators import delete_indicators, parse_indicators, update_indicators
+from tv_data.latest import delete_latest, set_latest
+from tv_data.metrics import metrics
+from tv_data.rate_limit import rate_limiter
+from tv_data.realtime import queue_update
+from tv_data.replica import on_replica, replica_read
+from tv_data.runtime_estimator import runtime_estimator
+from tv_data.series import get_bars, timestamp_to_date_string
+from tv_data.utils import json_response
+
+CHANGE_COUNTER_KEY = "tv_data:datafield:changes"
+LIST_CACHE_KEY = "tv_data:datafield:list"
+LIST_FIELDS = (
+    "name",
+    "key",
+    "value",
+    "user",
+    "type",
+    "status",
+    "scale",
+    "n",
+    "modified",
+)
+DEFAULT_LIST_FIELDS = ("name", "key", "value", "user", "type")
+MAX_LIST_LIMIT = 1000
+MAX_CHART_POINTS = 5000
+
+
+@metrics.timed()
 def get_doc_from_user_key(user: str, df: object = None) -> Optional[Document]:
     query = {"key": df.key.upper(), "user": user}
     try:
@@ -27,6 +62,108 @@ def get_doc_from_user_key(user: str, df: object = None) -> Optional[Document]:
         return None
 
 
+@metrics.timed()
+def append_update(
+    datafield: str,
+    value: float,
+    n: Optional[int] = None,
+    time_received: Optional[datetime.datetime] = None,
+    propagate: bool = True,
+) -> None:
+    """Record an update row and the latest value without saving the whole Datafield.
+
+    Loading and saving the parent document for every update makes concurrent
+    updates to the same Datafield collide on its `modified` timestamp; here
+    the row is inserted directly and the parent only gets a column update.
+    """
+    time_received = time_received or datetime.datetime.now()
+    idx = frappe.db.sql(
+        """
+        select ifnull(max(idx), 0) + 1
+        from `tabDatafield Update Table`
+        where parent = %s and parentfield = 'datafield_update_table'
+        """,
+        datafield,
+    )[0][0]
+
+    frappe.get_doc(
+        {
+            "doctype": "Datafield Update Table",
+            "date_string": get_series_date(),
+            "time_received": time_received,
+            "value": value,
+            "n": n,
+            "idx": idx,
+            "parent": datafield,
+            "parenttype": "Datafield",
+            "parentfield": "datafield_update_table",
+        }
+    ).db_insert()
+
+    values = {"value": value}
+    if n is not None:
+        values["n"] = n
+    # Leaving `modified` alone keeps a concurrent merge or form save valid
+    frappe.db.set_value("Datafield", datafield, values, update_modified=False)
+
+    bump_change_counter()
+    queue_update(datafield, value, n, time_received)
+    if propagate:
+        propagate_formulas([datafield], time_received)
+
+
+@metrics.timed()
+def propagate_formulas(
+    changed: Iterable[str], time_received: Optional[datetime.datetime] = None
+) -> List[str]:
+    """Recompute the derived Datafields downstream of `changed`, inputs first.
+
+    Each derived value is recorded as an ordinary update, so its bars come
+    out of the same merge pass as those of its inputs.
+    """
+    graph = get_graph()
+    affected = graph.affected(changed)
+    if not affected:
+        return []
+
+    inputs = {name for d in affected for name in graph.inputs[d].values()}
+    values = dict(
+        frappe.get_all(
+            "Datafield",
+            filters={"name": ["in", list(inputs)]},
+            fields=["name", "value"],
+            as_list=True,
+        )
+    )
+    for derived in affected:
+        try:
+            value = graph.formulas[derived].evaluate(
+                {key: values[name] for key, name in graph.inputs[derived].items()}
+            )
+        except (ArithmeticError, ValueError, TypeError) as e:
+            metrics.inc("formula_errors")
+            frappe.log_error(
+                f"Error evaluating formula of {derived}: {str(e)}",
+                "Datafield Formula Error",
+            )
+            continue
+        values[derived] = value
+        append_update(derived, value, time_received=time_received, propagate=False)
+    return affected
+
+
+def get_change_counter() -> int:
+    key = frappe.cache.make_key(CHANGE_COUNTER_KEY)
+    # Seed with the current time so a lost counter never reuses an old ETag
+    frappe.cache.set(key, int(datetime.datetime.now().timestamp() * 1000), nx=True)
+    return int(frappe.cache.get(key))
+
+
+def bump_change_counter() -> None:
+    get_change_counter()
+    frappe.cache.incr(frappe.cache.make_key(CHANGE_COUNTER_KEY))
+
+
 def get_series_date(days: int = 0) -> str:
     return (datetime.datetime.now() + datetime.timedelta(days=days)).strftime("%Y%m%dT")
 
@@ -65,11 +202,34 @@ class Datafield(Document):
     def before_save(self) -> None:
         if not self.is_new():
             self._original_value = frappe.db.get_value("Datafield", self.name, "value")
+            # Value updates over REST share the ingestion limits
+            if frappe.request and self.value != self._original_value:
+                rate_limiter.enforce(self.user, self.key)
+
+    def after_insert(self) -> None:
+        set_latest(self.name, self.value, self.n)
 
     def on_update(self) -> None:
+        bump_change_counter()
+        # New Datafields without a formula cannot be part of the graph yet
+        if self.has_value_changed("formula") and (
+            self.formula or self.get_doc_before_save()
+        ):
+            bump_graph_version()
         if hasattr(self, "_original_value") and self.value != self._original_value:
+            capture(self.user, self.key, self.value, self.n)
             self.insert_update(self.value, self.n)
 
+    def on_trash(self) -> None:
+        # Derived data; without this the link check refuses the delete
+        delete_indicators(self.name)
+
+    def after_delete(self) -> None:
+        bump_change_counter()
+        bump_graph_version()
+        hot_bars.invalidate(self.name)
+        delete_latest(self.name)
+
     def autoname(self) -> None:
         if self.is_new():
             self.name = generate_unique_name(self.key)
@@ -86,6 +246,31 @@ class Datafield(Document):
             frappe.throw(
                 f"A Datafield with key '{self.key}' already exists for user '{self.user}'"
             )
+        if self.indicators:
+            parse_indicators(self.indicators)
+        if self.formula:
+            self.set_formula_value()
+        if not self.is_new():
+            # Ingestion, merges and backfills write these rows directly; a save
+            # must not delete the rows that were not loaded into the form
+            self.flags.ignore_children_type = (
+                "Datafield Update Table",
+                "Datafield Series",
+            )
+
+    def set_formula_value(self) -> None:
+        formula = check_formula(self)
+        try:
+            self.value = formula.evaluate(
+                {
+                    key: frappe.db.get_value(
+                        "Datafield", {"user": self.user, "key": key}, "value"
+                    )
+                    for key in formula.inputs
+                }
+            )
+        except (ArithmeticError, ValueError, TypeError) as e:
+            frappe.throw(_("Formula cannot be evaluated: {0}").format(e))
 
     def set_scale(self) -> None:
         if self.value is None:
@@ -142,6 +327,7 @@ class Datafield(Document):
     #         frappe.log_error(f"Error in extend_doc_series: {str(e)}", "Datafield Error")
     #         raise
 
+    @metrics.timed()
     def insert_update(self, value: float, n: Optional[int]) -> None:
         try:
             new_entry = {
@@ -154,6 +340,8 @@ class Datafield(Document):
                 "parentfield": "datafield_update_table",
             }
             self.append("datafield_update_table", new_entry)
+            queue_update(self.name, value, n, new_entry["time_received"])
+            propagate_formulas([self.name], new_entry["time_received"])
 
         except Exception as e:
             frappe.log_error(
@@ -161,21 +349,48 @@ class Datafield(Document):
             )
             raise
 
+    @metrics.timed()
     def merge_updates(self, day: int = 0) -> Dict[str, Union[int, float]]:
+        """Merge the pending update rows of this Datafield into one series bar.
+
+        The bar is inserted and the merged update rows are deleted by name
+        instead of saving the document, so rows that other writers append
+        meanwhile stay pending for the next merge.
+        """
         try:
-            if not self.datafield_update_table:
-                return (
-                    self.datafield_series_table[-1].as_dict()
-                    if self.datafield_series_table
-                    else {}
+            updates = frappe.get_all(
+                "Datafield Update Table",
+                filters={"parent": self.name, "parentfield": "datafield_update_table"},
+                fields=["name", "value"],
+                order_by="idx asc, creation asc",
+            )
+            if not updates:
+                # By date, not idx: a running backfill appends older bars after it
+                latest = frappe.get_all(
+                    "Datafield Series",
+                    filters={
+                        "parent": self.name,
+                        "parentfield": "datafield_series_table",
+                    },
+                    fields=["*"],
+                    order_by="date_string desc, idx desc",
+                    limit_page_length=1,
                 )
+                return latest[0] if latest else {}
 
-            updates = self.datafield_update_table
             _open, _close = updates[0].value, updates[-1].value
             _high = max(update.value for update in updates)
             _low = min(update.value for update in updates)
             _volume = len(updates)
 
+            idx = frappe.db.sql(
+                """
+                select ifnull(max(idx), 0) + 1
+                from `tabDatafield Series`
+                where parent = %s and parentfield = 'datafield_series_table'
+                """,
+                self.name,
+            )[0][0]
             merged_data = {
                 "doctype": "Datafield Series",
                 "open": _open,
@@ -184,18 +399,15 @@ class Datafield(Document):
                 "close": _close,
                 "volume": _volume,
                 "date_string": get_series_date(day),
+                "idx": idx,
                 "parent": self.name,
                 "parenttype": "Datafield",
                 "parentfield": "datafield_series_table",
             }
 
-            # frappe.db.begin()
             try:
-                # First, append the new series entry
-                self.append("datafield_series_table", merged_data)
-                self.save()
+                frappe.get_doc(merged_data).db_insert()
 
-                # Only after successful save, process the updates
                 for update in updates:
                     merged_update = frappe.get_doc(
                         {
@@ -206,9 +418,13 @@ class Datafield(Document):
                         }
                     )
                     merged_update.insert(ignore_permissions=True)
-                    update.delete()
+                frappe.db.delete(
+                    "Datafield Update Table",
+                    {"name": ["in", [update.name for update in updates]]},
+                )
 
                 frappe.db.commit()
+                hot_bars.invalidate(self.name)
             except Exception as e:
                 frappe.db.rollback()
                 frappe.log_error(
@@ -216,6 +432,17 @@ class Datafield(Document):
                 )
                 raise
 
+            # Indicators are derived data; a failure must not undo the merge
+            try:
+                update_indicators(self.name)
+                frappe.db.commit()
+            except Exception as e:
+                frappe.db.rollback()
+                frappe.log_error(
+                    f"Error updating indicators of {self.name}: {str(e)}",
+                    "Datafield Indicator Error",
+                )
+
         except Exception as e:
             frappe.log_error(f"Error in merge_updates: {str(e)}", "Datafield Error")
             raise
@@ -224,11 +451,14 @@ class Datafield(Document):
 @frappe.whitelist(allow_guest=True)
 def extend_all_series() -> None:
     try:
-        for doc_name in frappe.get_all("Datafield", pluck="name"):
-            doc = frappe.get_doc("Datafield", doc_name)
-            doc.merge_updates()
-            doc.save(ignore_permissions=True)
-        frappe.db.commit()
+        with metrics.timer("extend_all_series"), runtime_estimator.measure("merge"):
+            for doc_name in frappe.get_all("Datafield", pluck="name"):
+                try:
+                    frappe.get_doc("Datafield", doc_name).merge_updates()
+                except Exception:
+                    # Already rolled back and logged; merge the other Datafields
+                    continue
+            frappe.db.commit()
     except Exception as e:
         frappe.db.rollback()
         frappe.log_error(
@@ -240,9 +470,7 @@ def extend_all_series() -> None:
 @frappe.whitelist(allow_guest=True)
 def merge_updates(doc_name: str) -> None:
     try:
-        doc = frappe.get_doc("Datafield", doc_name)
-        doc.merge_updates()
-        doc.save(ignore_permissions=True)
+        frappe.get_doc("Datafield", doc_name).merge_updates()
         frappe.db.commit()
     except Exception as e:
         frappe.db.rollback()
@@ -256,10 +484,114 @@ def merge_updates(doc_name: str) -> None:
 
 
 @frappe.whitelist(allow_guest=True)
-def get_list():
+@replica_read()
+def get_list(
+    fields: Optional[Union[str, list]] = None,
+    user: Optional[str] = None,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = 500,
+    paginate: bool = False,
+):
+    """List Datafields by name, at most `limit` of them.
+
+    Returns the rows, or with `paginate` set a `{data, next_cursor}` page;
+    pass `next_cursor` as `after` to get the next page.
+    """
     if not frappe.has_permission("Datafield", "read"):
         frappe.throw(_("No permission for Datafield"), frappe.PermissionError)
-    return frappe.get_list("Datafield", fields=["name", "key", "value", "user", "type"])
+
+    fields = parse_list_fields(fields)
+    if "name" not in fields:
+        fields.insert(0, "name")
+    limit = min(max(cint(limit), 1), MAX_LIST_LIMIT)
+    paginate = bool(cint(paginate))
+
+    # The ETag changes whenever any Datafield is written, and is scoped to the
+    # session user because frappe.get_list applies their permissions
+    params = frappe.as_json(
+        [frappe.session.user, fields, user, type, status, after, limit, paginate],
+        indent=None,
+    )
+    digest = hashlib.sha1(params.encode()).hexdigest()[:16]
+    etag = f'W/"{get_change_counter()}-{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if frappe.get_request_header("If-None-Match") == etag:
+        return json_response(None, status=304, headers=headers)
+
+    cache_key = f"{LIST_CACHE_KEY}:{etag}"
+    page = frappe.cache.get_value(cache_key)
+    if page is None:
+        filters = {
+            k: v for k, v in {"user": user, "type": type, "status": status}.items() if v
+        }
+        if after:
+            filters["name"] = [">", after]
+
+        data = frappe.get_list(
+            "Datafield",
+            fields=fields,
+            filters=filters,
+            order_by="name asc",
+            limit_page_length=limit,
+        )
+        page = {
+            "data": data,
+            "next_cursor": data[-1]["name"] if len(data) == limit else None,
+        }
+        if on_replica():
+            # A lagging replica may miss the writes counted in the ETag, so
+            # the page must neither be cached nor revalidated against it
+            headers = {"Cache-Control": "no-store"}
+        else:
+            frappe.cache.set_value(cache_key, page, expires_in_sec=300)
+
+    return json_response(page if paginate else page["data"], headers=headers)
+
+
+def parse_list_fields(fields: Optional[Union[str, list]]) -> List[str]:
+    if not fields:
+        return list(DEFAULT_LIST_FIELDS)
+    if isinstance(fields, str):
+        try:
+            fields = json.loads(fields)
+        except ValueError:
+            fields = None
+    if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+        frappe.throw(_("Fields must be a JSON list of field names"))
+
+    invalid = set(fields) - set(LIST_FIELDS)
+    if invalid:
+        frappe.throw(_("Invalid fields: {0}").format(", ".join(sorted(invalid))))
+    return fields
+
+
+@frappe.whitelist()
+@replica_read()
+def get_chart_data(doc_name: str, width: int = 800) -> Dict:
+    frappe.has_permission("Datafield", "read", doc=doc_name, throw=True)
+
+    bars = get_bars(doc_name)
+    t = np.asarray(bars["t"], dtype=np.float64)
+    close = np.asarray(bars["c"], dtype=np.float64)
+    indices = lttb(t, close, min(max(cint(width), 3), MAX_CHART_POINTS))
+
+    def pick(column: str) -> list:
+        return np.asarray(bars[column], dtype=np.float64)[indices].tolist()
+
+    return {
+        "labels": [timestamp_to_date_string(t[i]) for i in indices],
+        "datasets": [
+            {"name": "Open", "values": pick("o"), "chartType": "line"},
+            {"name": "High", "values": pick("h"), "chartType": "line"},
+            {"name": "Low", "values": pick("l"), "chartType": "line"},
+            {"name": "Close", "values": pick("c"), "chartType": "line"},
+            {"name": "Volume", "values": pick("v"), "chartType": "bar"},
+        ],
+        "total": len(t),
+    }
 
 
 @staticmethod
@@ -0,0 +1,10 @@
+# Copyright (c) 2024, cryptolinx <jango_blockchained> and contributors
+# For license information, please see license.txt
+
+# import frappe
+from frappe.model.document import Document
+
+
+class DatafieldIndicator(Document):
+	def autoname(self):
+		self.name = f"{self.datafield}-{self.indicator}"
@@ -0,0 +1,9 @@
+# Copyright (c) 2024, cryptolinx <jango_blockchained> and Contributors
+# See license.txt
+
+# import frappe
+from frappe.tests.utils import FrappeTestCase
+
+
+class TestDatafieldIndicator(FrappeTestCase):
+	pass
@@ -161,9 +161,14 @@
 #     return series_data
 
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class DatafieldSeries(Document):
-    pass
\ No newline at end of file
+    pass
+
+
+def on_doctype_update():
+    # Bars of one Datafield by day, e.g. the duplicate checks of backfills
+    frappe.db.add_index("Datafield Series", ["parent", "date_string"])
@@ -0,0 +1,11 @@
+from frappe.model.document import Document
+from frappe.utils import get_datetime
+
+
+class TVDataCycleLog(Document):
+    def autoname(self) -> None:
+        self.name = get_cycle_log_name(get_datetime(self.cycle_boundary))
+
+
+def get_cycle_log_name(cycle_boundary) -> str:
+    return f"CYCLE-{cycle_boundary:%Y%m%d-%H%M%S}"
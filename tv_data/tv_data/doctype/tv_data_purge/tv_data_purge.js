@@ -0,0 +1,8 @@
+// Copyright (c) 2024, cryptolinx <jango_blockchained> and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("TV Data Purge", {
+// 	refresh(frm) {
+
+// 	},
+// });
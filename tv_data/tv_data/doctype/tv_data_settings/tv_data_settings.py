@@ -3,7 +3,8 @@ from frappe.model.document import Document
 from frappe.utils import cint, flt
 from typing import List, Union, Optional, Any
 from datetime import datetime, timedelta
-from tv_data.cycle import CycleManager
+from tv_data.cycle import CycleManager, get_cycle_manager
+from tv_data.replica import replica_read
 
 
 class TVDataSettingsDefaults:
@@ -45,10 +46,8 @@ class TVDataSettings(Document):
     @property
     def cycle_manager(self):
         if self._cycle_manager is None:
-            self._cycle_manager = CycleManager(
-                timeframe=self.timeframe,
-                daily_updates=self.daily_updates,
-                scheduler_pre_runtime=self.scheduler_pre_runtime,
+            self._cycle_manager = get_cycle_manager(
+                self.timeframe, self.daily_updates, self.scheduler_pre_runtime
             )
         return self._cycle_manager
 
@@ -86,13 +85,11 @@ class TVDataSettings(Document):
 
     @property
     def next_cycle(self) -> datetime:
-        next_cycle = self.cycle_manager.get_next_cycle()
-        return next_cycle["datetime"] if next_cycle else None
+        return self.cycle_manager.get_next_cycle()["datetime"]
 
     @property
     def last_cycle(self) -> datetime:
-        prev_cycle = self.cycle_manager.get_previous_cycle()
-        return prev_cycle["datetime"] if prev_cycle else None
+        return self.cycle_manager.get_previous_cycle()["datetime"]
 
     def validate(self):
         for attr in ["fork_data_type_name", "repo_owner", "repo_name", "fork_owner"]:
@@ -106,12 +103,7 @@ class TVDataSettings(Document):
         return f"{hours:02}:{minutes:02}:{seconds:02}"
 
     def get_cycles(self):
-        cycle_manager = CycleManager(
-            timeframe=self.timeframe,
-            daily_updates=self.daily_updates,
-            scheduler_pre_runtime=self.scheduler_pre_runtime,
-        )
-        return cycle_manager.get_cycles()
+        return self.cycle_manager.get_cycles()
 
     @frappe.whitelist()
     def get_cycle_timeline_html(self):
@@ -145,10 +137,12 @@ def dev_log(message: str) -> None:
 
 
 @frappe.whitelist()
+@replica_read()
 def _get_cycle_timeline_html():
     return frappe.get_doc("TV Data Settings").get_cycle_timeline_html()
 
 
 @frappe.whitelist()
+@replica_read()
 def _get_horizontal_timeline_html():
     return frappe.get_doc("TV Data Settings").get_horizontal_timeline_html()
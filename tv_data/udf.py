@@ -0,0 +1,140 @@
+"""TradingView UDF datafeed served straight from `Datafield Series`.
+
+Endpoints answer with bare UDF payloads (no `{"message": ...}` envelope), so
+a UDF client can be pointed at `/api/method/tv_data.udf` through a proxy rule
+that maps `/<endpoint>` to `.<endpoint>`.
+"""
+
+from typing import Optional
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+from tv_data.bar_cache import hot_bars
+from tv_data.replica import replica_read
+from tv_data.series import get_previous_bar_time
+from tv_data.utils import json_response
+
+SUPPORTED_RESOLUTIONS = ["1D"]
+SYMBOL_TYPE = "index"
+
+
+def _check_symbol(symbol: str) -> dict:
+    datafield = frappe.db.get_value(
+        "Datafield", symbol, ["name", "key", "scale", "type"], as_dict=True
+    )
+    if not datafield:
+        frappe.throw(_("Unknown symbol {0}").format(symbol), frappe.DoesNotExistError)
+    if not frappe.has_permission("Datafield", "read", doc=symbol):
+        frappe.throw(_("No permission for Datafield"), frappe.PermissionError)
+    return datafield
+
+
+@frappe.whitelist(allow_guest=True)
+def config():
+    return json_response(
+        {
+            "supported_resolutions": SUPPORTED_RESOLUTIONS,
+            "supports_group_request": False,
+            "supports_marks": False,
+            "supports_search": True,
+            "supports_timescale_marks": False,
+            "supports_time": True,
+            "exchanges": [],
+            "symbols_types": [{"name": SYMBOL_TYPE, "value": SYMBOL_TYPE}],
+        },
+        envelope=False,
+    )
+
+
+@frappe.whitelist(allow_guest=True)
+def symbols(symbol: str):
+    datafield = _check_symbol(symbol)
+    return json_response(
+        {
+            "name": datafield.name,
+            "ticker": datafield.name,
+            "description": datafield.key,
+            "type": SYMBOL_TYPE,
+            "session": "24x7",
+            "timezone": "Etc/UTC",
+            "exchange": "",
+            "listed_exchange": "",
+            "minmov": 1,
+            "pricescale": datafield.scale or 1,
+            "has_intraday": False,
+            "has_daily": True,
+            "supported_resolutions": SUPPORTED_RESOLUTIONS,
+            "volume_precision": 0,
+            "data_status": "streaming",
+        },
+        envelope=False,
+    )
+
+
+@frappe.whitelist(allow_guest=True)
+@replica_read()
+def search(
+    query: str = "",
+    type: Optional[str] = None,
+    exchange: Optional[str] = None,
+    limit: int = 30,
+):
+    if not frappe.has_permission("Datafield", "read"):
+        frappe.throw(_("No permission for Datafield"), frappe.PermissionError)
+
+    datafields = frappe.get_list(
+        "Datafield",
+        fields=["name", "key"],
+        or_filters={"name": ["like", f"%{query}%"], "key": ["like", f"%{query}%"]},
+        order_by="name asc",
+        limit_page_length=min(max(cint(limit), 1), 100),
+    )
+    return json_response(
+        [
+            {
+                "symbol": datafield.name,
+                "full_name": datafield.name,
+                "description": datafield.key,
+                "exchange": "",
+                "ticker": datafield.name,
+                "type": SYMBOL_TYPE,
+            }
+            for datafield in datafields
+        ],
+        envelope=False,
+    )
+
+
+@frappe.whitelist(allow_guest=True)
+def history(
+    symbol: str,
+    resolution: str = "1D",
+    countback: Optional[int] = None,
+    **kwargs,
+):
+    # `from` is a keyword in Python, so the range bounds come in through kwargs
+    start, end = cint(kwargs.get("from")) or None, cint(kwargs.get("to")) or None
+    if resolution not in SUPPORTED_RESOLUTIONS:
+        return json_response(
+            {"s": "error", "errmsg": f"Unsupported resolution {resolution}"},
+            envelope=False,
+        )
+
+    _check_symbol(symbol)
+    bars = hot_bars.get_bars(
+        symbol,
+        start=None if countback else start,
+        end=end,
+        countback=cint(countback) or None,
+    )
+
+    if not bars["t"]:
+        next_time = get_previous_bar_time(symbol, start) if start else None
+        payload = {"s": "no_data"}
+        if next_time:
+            payload["nextTime"] = next_time
+        return json_response(payload, envelope=False)
+
+    return json_response({"s": "ok", **bars}, envelope=False)
@@ -0,0 +1,23 @@
+from typing import Any, Dict, Optional
+
+import frappe
+from werkzeug.wrappers import Response
+
+
+def json_response(
+    data: Any,
+    status: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+    envelope: bool = True,
+) -> Response:
+    """Build a JSON response with custom status/headers.
+
+    By default the body uses Frappe's `{"message": ...}` envelope; pass
+    `envelope=False` for clients that expect a bare payload.
+    """
+    body = None
+    if status != 304:
+        body = frappe.as_json({"message": data} if envelope else data, indent=None)
+    return Response(
+        body, status=status, mimetype="application/json", headers=headers or {}
+    )